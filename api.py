@@ -0,0 +1,318 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import date
+from urllib.parse import parse_qs
+
+from lessons import day_dict
+from snapshot import MappedBody, SnapshotError, SnapshotReader
+
+logger = logging.getLogger(__name__)
+
+STATUS_LINES = {
+    200: '200 OK',
+    304: '304 Not Modified',
+    400: '400 Bad Request',
+    404: '404 Not Found',
+    500: '500 Internal Server Error',
+    503: '503 Service Unavailable',
+}
+
+
+def is_number(value):
+    """Параметр запроса из одних ASCII-цифр: номер недели или дня"""
+    return value.isascii() and value.isdigit()
+
+
+def schedule_key(week, day=None):
+    """Ключ готового ответа /api/schedule"""
+    return f"schedule/{week}/{'' if day is None else day}"
+
+
+def sheet_key(sheet, key):
+    """Ключ ответа для листа потока; лист по умолчанию без префикса"""
+    return f"{sheet}|{key}" if sheet else key
+
+
+def sheets_payload(schedules, default):
+    """Список листов потоков с временем разбора"""
+    version = schedules[default]['version']
+    return {
+        'version': version,
+        'default': default,
+        'sheets': [
+            {
+                'sheet': sheet,
+                'weeks': len(data['weeks']),
+                'parse_ms': round((data['parse_seconds'] or 0) * 1000, 1),
+            }
+            for sheet, data in schedules.items()
+        ],
+    }
+
+
+def build_payload(key, data):
+    """Собрать объект ответа из скомпилированного расписания"""
+    weeks = data['weeks']
+    if key == 'weeks':
+        return {
+            'version': data['version'],
+            'weeks': [
+                {field: info[field] for field in ('week', 'type', 'description', 'date_range')}
+                for _, info in sorted(weeks.items(), key=lambda x: int(x[0]))
+            ],
+        }
+
+    _, week, day = key.split('/')
+    info = weeks.get(week)
+    if info is None:
+        return None
+    payload = {
+        'version': data['version'],
+        'week': week,
+        'type': info['type'],
+        'description': info['description'],
+    }
+    if day == '':
+        payload['days'] = [day_dict(day_info) for day_info in info['days']]
+    else:
+        if int(day) >= len(info['days']):
+            return None
+        payload['day'] = day_dict(info['days'][int(day)])
+    return payload
+
+
+def serialize(payload, version):
+    """Сериализовать ответ и посчитать ETag"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = f'"{version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+    return etag, body
+
+
+def snapshot_bodies(schedules, default):
+    """Все тела ответов для снимка: листы, недели, каждая неделя и каждый день"""
+    bodies = {'sheets': serialize(sheets_payload(schedules, default), schedules[default]['version'])}
+    for sheet, data in schedules.items():
+        prefix = None if sheet == default else sheet
+        keys = ['weeks']
+        for week, info in data['weeks'].items():
+            keys.append(schedule_key(week))
+            keys.extend(schedule_key(week, day['day']) for day in info['days'])
+        for key in keys:
+            bodies[sheet_key(prefix, key)] = serialize(build_payload(key, data), data['version'])
+    return bodies
+
+
+class ScheduleAPI:
+    """JSON API расписания поверх уже разобранных данных бота.
+
+    Тела ответов сериализуются один раз на версию данных и отдаются
+    готовыми байтами вместе с ETag и Cache-Control.
+    """
+
+    def __init__(self, bot, max_age=60):
+        self.bot = bot
+        self.max_age = max_age
+        self._data = None
+        self._bodies = {}
+        self._today = {}
+        self._lock = threading.Lock()
+
+    def respond(self, route, args=None, if_none_match=None):
+        """Ответ на /api/<route>: (статус, заголовки, тело в байтах)"""
+        args = args or {}
+
+        try:
+            if not self._ready():
+                return self._error(503, "Данные не загружены")
+        except Exception as e:
+            logger.error(f"❌ Ошибка API: {e}")
+            return self._error(500, "Ошибка загрузки данных")
+
+        sheet = args.get('sheet') or None
+        if sheet == self._default_sheet():
+            sheet = None
+
+        if route == 'sheets':
+            key, sheet = 'sheets', None
+        elif route == 'weeks':
+            key = 'weeks'
+        elif route == 'schedule':
+            week = args.get('week') or self._current_week()
+            if not is_number(week):
+                return self._error(400, "Параметр week должен быть номером недели")
+            day = args.get('day')
+            if day not in (None, ''):
+                if not is_number(day) or int(day) > 5:
+                    return self._error(400, "Параметр day должен быть числом от 0 до 5")
+                day = int(day)
+            else:
+                day = None
+            key = schedule_key(week, day)
+        elif route == 'today':
+            key = schedule_key(*self._current_week_and_day())
+        else:
+            return self._error(404, "Неизвестный метод API")
+
+        entry = self._entry(key, sheet)
+        if entry is None:
+            return self._error(404, "Неделя или лист не найдены")
+
+        etag, body = entry
+        headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={self.max_age}',
+        }
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return 304, headers, b''
+        return 200, headers, body
+
+    def wsgi_middleware(self, app):
+        """Обернуть WSGI-приложение: /api/* обслуживается здесь, остальное — app"""
+        def middleware(environ, start_response):
+            path = environ.get('PATH_INFO', '')
+            if not path.startswith('/api/'):
+                return app(environ, start_response)
+
+            args = {key: values[0] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+            status, headers, body = self.respond(path[5:], args, environ.get('HTTP_IF_NONE_MATCH'))
+            headers = list(headers.items())
+            headers.append(('Content-Length', str(len(body))))
+            start_response(STATUS_LINES[status], headers)
+            return self._iterable(environ, body)
+
+        return middleware
+
+    def _iterable(self, environ, body):
+        """Тело ответа для сервера WSGI"""
+        return [body]
+
+    def _ready(self):
+        """Данные доступны; при смене версии сбрасываем готовые ответы"""
+        if not self.bot.data_loaded:
+            return False
+        data = self.bot.get_schedule_data()
+        with self._lock:
+            if self._data is not data:
+                self._bodies = {}
+                self._today = {}
+                self._data = data
+        return True
+
+    def _default_sheet(self):
+        return self._data['sheet']
+
+    def _current_week(self):
+        return self.bot.get_current_academic_week()
+
+    def _current_week_and_day(self):
+        today = date.today()
+        result = self._today.get(today)
+        if result is None:
+            result = self._today[today] = self.bot.get_current_week_and_day()
+        return result
+
+    def _entry(self, key, sheet=None):
+        full_key = sheet_key(sheet, key)
+        entry = self._bodies.get(full_key)
+        if entry is None:
+            if key == 'sheets':
+                payload = sheets_payload(self.bot.get_sheet_schedules(), self._data['sheet'])
+            else:
+                data = self.bot.get_sheet_schedules().get(sheet) if sheet else self._data
+                if data is None:
+                    return None
+                payload = build_payload(key, data)
+            if payload is None:
+                return None
+            entry = self._bodies[full_key] = serialize(payload, self._data['version'])
+        return entry
+
+    def _error(self, status, message):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'Cache-Control': 'no-store',
+        }
+        return status, headers, body
+
+
+class SnapshotAPI(ScheduleAPI):
+    """Тот же JSON API, но ответы берутся из отображенного в память снимка"""
+
+    def __init__(self, reader, max_age=60):
+        super().__init__(None, max_age)
+        self.reader = reader
+
+    def _ready(self):
+        try:
+            self.reader.refresh()
+        except (OSError, SnapshotError) as e:
+            # Битый новый снимок: отдаем прежнее поколение, если оно есть
+            logger.error(f"❌ Снимок не прочитан: {e}")
+        return self.reader.generation > 0
+
+    def _default_sheet(self):
+        return self.reader.index['sheet']
+
+    def _dates(self):
+        index = self.reader.index
+        today = date.today()
+        return index, today, index['dates'].get(today.isoformat())
+
+    def _current_week(self):
+        index, _, entry = self._dates()
+        return entry[0] if entry else index['fallback'][0]
+
+    def _current_week_and_day(self):
+        index, today, entry = self._dates()
+        if entry:
+            return entry[1], entry[2]
+        if today.weekday() == 6:
+            return index['fallback'][1], 0
+        return index['fallback'][0], today.weekday()
+
+    def _entry(self, key, sheet=None):
+        return self.reader.mapped_body(sheet_key(sheet, key))
+
+    def _iterable(self, environ, body):
+        """Срез снимка: через wsgi.file_wrapper (gunicorn отправит его sendfile), иначе копией"""
+        if not isinstance(body, MappedBody):
+            return [body]
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            body_file = body.open()
+            if body_file is not None:
+                return file_wrapper(body_file)
+        return [body.view.tobytes()]
+
+
+def create_snapshot_app(path=None):
+    """WSGI-приложение процесса-читателя: /api/* и health-check из снимка"""
+    reader = SnapshotReader(path or os.environ['SNAPSHOT_PATH'])
+    schedule_api = SnapshotAPI(reader)
+
+    def app(environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        status = '200 OK'
+        if path == '/ping':
+            body = b'pong'
+        elif path in ('/', '/health'):
+            try:
+                reader.refresh(force=True)
+                body = f"generation {reader.generation}"
+            except (OSError, SnapshotError) as e:
+                body = f"generation {reader.generation}, new snapshot rejected: {e}"
+            if reader.generation == 0:
+                status, body = '503 Service Unavailable', f"no snapshot at {reader.path}"
+            body = body.encode('utf-8')
+        else:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'not found']
+        start_response(status, [('Content-Type', 'text/plain; charset=utf-8')])
+        return [body]
+
+    return schedule_api.wsgi_middleware(app)
@@ -0,0 +1,885 @@
+"""Бенчмарки бота расписания на синтетической книге.
+
+Запуск: python bench.py <имя> [--weeks N]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+logging.basicConfig(level=logging.WARNING)
+
+PAIR_TIMES = ['8:30-10:00', '10:10-11:40', '12:00-13:30', '13:45-15:15', '15:25-16:55', '17:05-18:35']
+
+
+def make_sample_frame(weeks=4, first_monday=date(2025, 9, 1)):
+    """DataFrame с той же раскладкой, что и лист «1 поток» на сайте"""
+    import pandas as pd
+
+    rows, cols = 135, 2 + 6 * weeks
+    grid = [[None] * cols for _ in range(rows)]
+    for week in range(weeks):
+        col = 2 + 6 * week
+        monday = first_monday + timedelta(weeks=week)
+        saturday = monday + timedelta(days=5)
+        week_type = 'нечетная' if week % 2 == 0 else 'четная'
+        grid[3][col] = f"Неделя ({week + 1}) {week_type} {monday:%d.%m.%Y} - {saturday:%d.%m.%Y}"
+        for day in range(6):
+            for pair in range(6):
+                if (pair + day + week) % 3 == 2:
+                    continue
+                row = 89 + 7 * pair
+                grid[row][col + day] = PAIR_TIMES[pair]
+                grid[row + 1][col + day] = f"Предмет {pair}{day}"
+                grid[row + 2][col + day] = f"Преподаватель {pair}"
+                grid[row + 3][col + day] = f"ауд. {100 + pair + day}"
+                if pair % 2:
+                    grid[row + 4][col + day] = f"Предмет Б{pair}"
+                    grid[row + 5][col + day] = "Преподаватель Б"
+                    grid[row + 6][col + day] = f"ауд. {200 + pair}"
+    return pd.DataFrame(grid)
+
+
+def make_sample_workbook(weeks=4, sheets=('1 поток',)):
+    """Записать синтетическую книгу во временный файл и вернуть путь"""
+    import pandas as pd
+
+    df = make_sample_frame(weeks)
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    with pd.ExcelWriter(path) as writer:
+        for sheet in sheets:
+            df.to_excel(writer, sheet_name=sheet, header=False, index=False)
+    return path
+
+
+def make_loaded_bot(weeks=4, path=None):
+    """ScheduleBot с загруженной синтетической книгой, без сети"""
+    from bot import ScheduleBot
+
+    os.environ['EXCEL_FILE_PATH'] = path or make_sample_workbook(weeks)
+    bot = ScheduleBot()
+    bot.data_loaded = True
+    bot.get_dataframe()
+    return bot
+
+
+def measure(func, seconds=1.0):
+    """Выполнять func в течение seconds, вернуть число вызовов в секунду"""
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            func()
+        count += 100
+    return count / (time.perf_counter() - start)
+
+
+def bench_api(args):
+    """JSON API: готовые тела ответов напрямую и через Flask"""
+    from flask import Flask
+    from api import ScheduleAPI
+
+    bot = make_loaded_bot(args.weeks)
+    schedule_api = ScheduleAPI(bot)
+
+    start = time.perf_counter()
+    schedule_api.respond('weeks')
+    print(f"первая компиляция: {(time.perf_counter() - start) * 1000:.1f} мс")
+
+    day_args = {'week': '1', 'day': '2'}
+    status, headers, _ = schedule_api.respond('schedule', day_args)
+    etag = headers['ETag']
+    print(f"respond(schedule):     {measure(lambda: schedule_api.respond('schedule', day_args)):>10.0f} rps")
+    print(f"respond(today):        {measure(lambda: schedule_api.respond('today')):>10.0f} rps")
+    print(f"respond(304):          {measure(lambda: schedule_api.respond('schedule', day_args, etag)):>10.0f} rps")
+
+    app = Flask('bench')
+    app.wsgi_app = schedule_api.wsgi_middleware(app.wsgi_app)
+    environ = {'PATH_INFO': '/api/schedule', 'QUERY_STRING': 'week=1&day=2', 'REQUEST_METHOD': 'GET'}
+    print(f"wsgi /api/schedule:    {measure(lambda: app.wsgi_app(environ, lambda status, headers: None)):>10.0f} rps")
+    client = app.test_client()
+    print(f"test_client /api/today:{measure(lambda: client.get('/api/today')):>10.0f} rps")
+
+
+def bench_snapshot(args):
+    """Снимок: запись загрузчиком и подключение читателя против разбора книги"""
+    from api import SnapshotAPI
+    from snapshot import SnapshotReader
+
+    fd, path = tempfile.mkstemp(suffix='.snapshot')
+    os.close(fd)
+    os.unlink(path)
+    os.environ['SNAPSHOT_PATH'] = path
+
+    workbook = make_sample_workbook(args.weeks)
+    start = time.perf_counter()
+    bot = make_loaded_bot(path=workbook)
+    bot.get_schedule_data()
+    print(f"разбор книги в процессе: {(time.perf_counter() - start) * 1000:.1f} мс")
+
+    start = time.perf_counter()
+    bot.publish_snapshot()
+    print(f"запись снимка:           {(time.perf_counter() - start) * 1000:.1f} мс, {os.path.getsize(path)} байт")
+
+    reader = SnapshotReader(path)
+    start = time.perf_counter()
+    reader.refresh()
+    print(f"подключение читателя:    {(time.perf_counter() - start) * 1000:.1f} мс")
+
+    schedule_api = SnapshotAPI(reader)
+    day_args = {'week': '1', 'day': '2'}
+    print(f"respond(schedule):       {measure(lambda: schedule_api.respond('schedule', day_args)):>10.0f} rps")
+    print(f"respond(today):          {measure(lambda: schedule_api.respond('today')):>10.0f} rps")
+    os.unlink(path)
+
+
+def bench_sheets(args):
+    """Разбор всех листов потоков: последовательно и пулом процессов"""
+    from bot import ScheduleBot
+
+    sheets = tuple(f"{i} поток" for i in range(1, args.sheets + 1))
+    os.environ['EXCEL_FILE_PATH'] = make_sample_workbook(args.weeks, sheets)
+    for workers in sorted({1, min(os.cpu_count() or 1, len(sheets)), len(sheets)}):
+        bot = ScheduleBot()
+        bot.sheet_workers = workers
+        bot.load_sheets()  # прогрев пула
+        start = time.perf_counter()
+        bot.load_sheets()
+        total = time.perf_counter() - start
+        per_sheet = ', '.join(f"{sheet}: {elapsed * 1000:.0f}" for sheet, elapsed in bot.sheet_timings.items())
+        print(f"процессов {workers}: {total * 1000:.0f} мс ({per_sheet})")
+
+
+def per_cell_time_cells(bot, day_col):
+    """Прежний поиск времени: обход строк 89–130 по одной ячейке"""
+    import pandas as pd
+    from bot import TIME_RE
+
+    df = bot.get_dataframe()
+    time_cells = []
+    for row in range(89, 131):
+        cell_value = df.iloc[row, day_col]
+        if pd.notna(cell_value):
+            cell_str = str(cell_value).strip()
+            match = TIME_RE.search(cell_str) if cell_str not in ('(пусто)', 'nan') else None
+            if match:
+                time_cells.append((row, cell_str, int(match.group(1)) * 60 + int(match.group(2))))
+    time_cells.sort(key=lambda x: x[2])
+    pair_times = {1: 510, 2: 620, 3: 720, 4: 835, 5: 940, 6: 1045}
+    pairs = [min(pair_times.items(), key=lambda x: abs(x[1] - tc[2]))[0] for tc in time_cells]
+    return [(row, text, minutes, pair) for (row, text, minutes), pair in zip(time_cells, pairs)]
+
+
+def bench_timegrid(args):
+    """Сетка времени: векторно по всему блоку против обхода по ячейкам"""
+    bot = make_loaded_bot(args.weeks)
+    week_info = bot.get_week_info()
+    columns = [col for info in week_info.values() for col in info['columns']]
+
+    def vectorized():
+        bot.time_grid_cache = None
+        return bot._get_time_grid()
+
+    grid = vectorized()
+    for col in columns:
+        c = grid['columns'][col]
+        expected = per_cell_time_cells(bot, col)
+        rows = [row - 89 for row, _, _, _ in expected]
+        assert [grid['text'][r, c] for r in rows] == [text for _, text, _, _ in expected]
+        assert [grid['pairs'][r, c] for r in rows] == [pair for _, _, _, pair in expected]
+
+    loop_rate = measure(lambda: [per_cell_time_cells(bot, col) for col in columns])
+    grid_rate = measure(vectorized)
+    print(f"столбцов: {len(columns)}")
+    print(f"по ячейкам: {1000 / loop_rate:8.2f} мс на все столбцы")
+    print(f"векторно:   {1000 / grid_rate:8.2f} мс на все столбцы ({grid_rate / loop_rate:.1f}x)")
+
+
+def bench_layout(args):
+    """Раскладка листа: полный поиск против отпечатка и проверки из кэша"""
+    from layout import LayoutCache, detect_layout, fingerprint
+
+    df = make_sample_frame(args.weeks)
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    os.unlink(path)
+    cache = LayoutCache(path)
+    cache.get(df)
+    print(f"поиск раскладки: {1000 / measure(lambda: detect_layout(df)):8.2f} мс")
+    print(f"отпечаток:       {1000 / measure(lambda: fingerprint(df)):8.2f} мс")
+    print(f"из кэша:         {1000 / measure(lambda: cache.get(df)):8.2f} мс")
+    os.unlink(path)
+
+
+def bench_google(args):
+    """Google Таблица: один лист в CSV против всей книги xlsx через локальную подмену"""
+    import threading
+    import requests
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+    sheets = tuple(f"{i} поток" for i in range(1, args.sheets + 1))
+    workbook = make_sample_workbook(args.weeks, sheets)
+    with open(workbook, 'rb') as f:
+        xlsx = f.read()
+    csv = make_sample_frame(args.weeks).to_csv(header=False, index=False).encode('utf-8')
+    buttons = ''.join(f'<li id="sheet-button-{100 + i}"><a href="#">{sheet}</a></li>' for i, sheet in enumerate(sheets))
+    htmlview = f'<html><body><ul id="sheet-menu">{buttons}</ul></body></html>'.encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.endswith('/htmlview'):
+                body, content_type = htmlview, 'text/html; charset=utf-8'
+            elif 'format=csv&gid=100' in self.path:
+                body, content_type = csv, 'text/csv'
+            elif 'format=xlsx' in self.path:
+                body, content_type = xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    import bot as bot_module
+    from lessons import day_dict
+    bot_module.GOOGLE_DOCS_BASE = f"http://127.0.0.1:{server.server_port}"
+    link = f"{bot_module.GOOGLE_DOCS_BASE}/spreadsheets/d/bench/edit"
+
+    results = {}
+    for mode in ('xlsx', 'csv'):
+        bot = bot_module.ScheduleBot()
+        bot.google_export = mode
+        session = requests.Session()
+        session.trust_env = False
+        start = time.perf_counter()
+        result = bot.fetch_google_sheet(session, link)
+        if result is None:
+            path, digest, _ = bot_module.stream_workbook(session, bot.convert_google_docs_to_excel(link))
+            result = (path, digest, None)
+        bot._use_downloaded_file(*result)
+        fetched = time.perf_counter() - start
+        size = os.path.getsize(bot.excel_file)
+        bot.get_dataframe()
+        parsed = time.perf_counter() - start - fetched
+        results[mode] = {week: [day_dict(day) for day in info['days']]
+                         for week, info in bot.get_schedule_data()['weeks'].items()}
+        print(f"{mode}: {size:>8} байт, загрузка {fetched * 1000:6.1f} мс, разбор {parsed * 1000:7.1f} мс"
+              f" (листов {len(bot.sheet_cache)})")
+        os.unlink(bot.excel_file)
+    server.shutdown()
+    assert results['csv'] == results['xlsx'], "расписание из CSV отличается от xlsx"
+    print("расписание листа совпадает")
+
+
+class SiteStandIn:
+    """Подмена сайта колледжа и Google: страница со ссылкой и книга xlsx по обоим адресам.
+
+    delay — задержка ответа страницы сайта, с (меняется на ходу).
+    """
+
+    def __init__(self, workbook, delay=0.05):
+        import threading
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        with open(workbook, 'rb') as f:
+            xlsx = f.read()
+        self.delay = delay
+        html_page = '<html><body><a href="/files/schedule.xlsx">1 поток</a></body></html>'.encode('utf-8')
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/timetable.html':
+                    time.sleep(site.delay)
+                    body, content_type = html_page, 'text/html; charset=utf-8'
+                elif self.path == '/files/schedule.xlsx' or 'format=xlsx' in self.path:
+                    body, content_type = xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                else:
+                    self.send_error(404)
+                    return
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def env(self):
+        """Переменные окружения, направляющие загрузку бота на подмену"""
+        return {'SCHEDULE_SITE_URL': f"{self.url}/timetable.html", 'GOOGLE_DOCS_BASE': self.url,
+                'GOOGLE_EXPORT': 'xlsx'}
+
+    def close(self):
+        self.server.shutdown()
+
+
+def bench_hedge(args):
+    """Гонка источников: сайт зависает, известная ссылка Google отвечает; хеджирование против очереди"""
+    import bot as bot_module
+
+    site = SiteStandIn(make_sample_workbook(args.weeks))
+    bot_module.SITE_URL = f"{site.url}/timetable.html"
+    bot_module.GOOGLE_DOCS_BASE = site.url
+    bot_module.KNOWN_LINKS = [f"{site.url}/spreadsheets/d/bench/export?format=xlsx"]
+
+    def fetch(bot):
+        start = time.perf_counter()
+        assert bot.download_schedule_from_website(), "расписание не скачано"
+        return time.perf_counter() - start
+
+    bot = bot_module.ScheduleBot()
+    bot.google_export = 'xlsx'
+    for _ in range(5):
+        fetch(bot)
+    print("сайт отвечает за 50 мс, задержки хеджирования после 5 загрузок:")
+    for source, (delay, samples, wins, failures) in bot.source_latency.summary().items():
+        print(f"  {source:<12} {delay * 1000:6.0f} мс  замеров {samples}, побед {wins}, ошибок {failures}")
+
+    sequential = bot_module.ScheduleBot()
+    # Задержка больше любого ответа: следующий источник стартует только после ошибки
+    sequential.source_latency.default = 10 ** 6
+    cases = [("по очереди", sequential), ("хеджирование без истории", bot_module.ScheduleBot()),
+             ("хеджирование по истории", bot)]
+    site.delay = args.hang
+    for title, case_bot in cases:
+        case_bot.google_export = 'xlsx'
+        print(f"сайт завис на {args.hang:.0f} с, {title}: {fetch(case_bot) * 1000:.0f} мс")
+    site.close()
+
+
+def bench_find(args):
+    """Поиск /find: построение индекса, пересборка одного дня и запросы"""
+    import copy
+    from search import ScheduleIndex
+
+    sheets = tuple(f"{i} поток" for i in range(1, args.sheets + 1))
+    bot = make_loaded_bot(path=make_sample_workbook(args.weeks, sheets))
+    schedules = bot.get_sheet_schedules()
+
+    index = ScheduleIndex()
+    start = time.perf_counter()
+    index.update(schedules, 1)
+    print(f"построение: {(time.perf_counter() - start) * 1000:.1f} мс, слов {len(index)}")
+
+    changed = copy.deepcopy(schedules)
+    day = changed[sheets[0]]['weeks']['1']['days'][2]
+    day['pairs'][0].lessons[0].teacher = 'Новиков Н.'
+    start = time.perf_counter()
+    rebuilt = index.update(changed, 2)
+    print(f"обновление: {(time.perf_counter() - start) * 1000:.1f} мс, дней пересобрано {rebuilt}")
+
+    for query in ('новик', 'преподаватель б', 'ауд 10', 'предмет'):
+        found = len(index.search(query))
+        print(f"{query!r:20} найдено {found:4}: {1000 / measure(lambda: index.search(query)):.3f} мс")
+
+
+def bench_memory(args):
+    """Память tracemalloc: разобранная книга с DataFrame против компактных записей"""
+    import gc
+    import tracemalloc
+    from bot import ScheduleBot
+    from lessons import day_dict
+
+    sheets = tuple(f"{i} поток" for i in range(1, args.sheets + 1))
+    os.environ['EXCEL_FILE_PATH'] = make_sample_workbook(args.weeks, sheets)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    bot = ScheduleBot()
+    bot.data_loaded = True
+    bot.sheet_workers = 1
+    schedules = bot.get_sheet_schedules()
+    gc.collect()
+    loaded = tracemalloc.get_traced_memory()[0] - base
+
+    as_dicts = {sheet: [day_dict(day) for info in data['weeks'].values() for day in info['days']]
+                for sheet, data in schedules.items()}
+    gc.collect()
+    dicts = tracemalloc.get_traced_memory()[0] - base - loaded
+    del as_dicts
+
+    bot.compact()
+    gc.collect()
+    compacted = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    print(f"листов {len(sheets)}, недель {args.weeks}, строк в таблице: {len(bot.strings)}")
+    print(f"с DataFrame:          {loaded / 1024:8.0f} КБ")
+    print(f"после compact():      {compacted / 1024:8.0f} КБ")
+    print(f"те же пары словарями: {dicts / 1024:8.0f} КБ дополнительно")
+
+
+HEAVY_MODULES = ('pandas', 'numpy', 'bs4', 'requests', 'flask')
+
+
+def import_report(statement):
+    """Разобрать вывод -X importtime: (всего мкс, [(мкс, модуль)] прямых импортов, все модули)"""
+    import subprocess
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    total, top, modules = 0, [], set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.add(name.strip())
+        if depth == 0:
+            total += int(cumulative)
+        elif depth == 1:
+            top.append((int(cumulative), name.strip()))
+    return total, sorted(top, reverse=True), modules
+
+
+def command_update(update_id, command, chat_id=1):
+    """Обновление Bot API с командой от пользователя chat_id в личном чате"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': command,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'bench'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+        },
+    }
+
+
+def callback_update(update_id, data, chat_id=1):
+    """Обновление Bot API: нажатие кнопки data под сообщением бота в личном чате"""
+    chat = {'id': chat_id, 'type': 'private'}
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'bench'}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': str(chat_id), 'data': data,
+            'message': {'message_id': 2, 'date': int(time.time()), 'chat': chat, 'text': 'menu',
+                        'from': {'id': 1, 'is_bot': True, 'first_name': 'bench'}},
+        },
+    }
+
+
+def decode_body(data):
+    """Тело запроса бота: JSON или форма"""
+    import json
+    from urllib.parse import parse_qs
+
+    try:
+        return json.loads(data)
+    except ValueError:
+        return {key: values[0] for key, values in parse_qs(data.decode('utf-8')).items()}
+
+
+class FakeBotAPI:
+    """Подмена Bot API: отдает обновления (по умолчанию одну команду) и запоминает ответы бота.
+
+    latency — задержка каждого ответа на sendMessage/editMessageText, как у
+    настоящего Bot API по сети.
+    """
+
+    def __init__(self, command='/menu', updates=None, latency=0.0):
+        import json
+        import threading
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        self.replied = threading.Event()
+        self.polling = threading.Event()
+        self.updates_ready = threading.Condition()
+        self.replies = []
+        self.calls = []  # (время, метод, чат, текст)
+        self.delivered = None
+        self.pending = list(updates) if updates is not None else [command_update(1, command)]
+        self.latency = latency
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                method = self.path.rsplit('/', 1)[-1]
+                if method == 'getMe':
+                    result = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+                elif method == 'getUpdates':
+                    api.polling.set()
+                    with api.updates_ready:
+                        # Длинный опрос: новые обновления отдаются сразу, как появились
+                        if not api.pending:
+                            api.updates_ready.wait(0.2)
+                        result, api.pending = api.pending, []
+                    if result:
+                        api.delivered = time.perf_counter()
+                elif method in ('sendMessage', 'editMessageText'):
+                    time.sleep(api.latency)
+                    body = decode_body(data)
+                    api.calls.append((time.perf_counter(), method, str(body.get('chat_id')), body.get('text', '')))
+                    api.replies.append(data)
+                    api.replied.set()
+                    chat_id = int(body.get('chat_id') or 1)
+                    result = {'message_id': 2, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'}}
+                else:
+                    result = True
+                body = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except BrokenPipeError:
+                    pass  # бот уже остановлен
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def push(self, updates):
+        """Добавить обновления для следующего getUpdates"""
+        with self.updates_ready:
+            self.pending = self.pending + list(updates)
+            self.updates_ready.notify_all()
+
+    def reply_text(self, i):
+        """Текст i-го сообщения бота"""
+        return decode_body(self.replies[i]).get('text', '')
+
+    def close(self):
+        self.server.shutdown()
+
+
+def free_port():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def bench_startup(args):
+    """Запуск: импорты по -X importtime и время до ответа на первое обновление"""
+    import subprocess
+    import statistics
+
+    for statement in ('import bot', 'import api'):
+        total, top, modules = import_report(statement)
+        heavy = [name for name in HEAVY_MODULES if name in modules]
+        print(f"{statement}: {total / 1000:.0f} мс, тяжелые модули: {', '.join(heavy) or 'нет'}")
+        for us, name in top[:args.top]:
+            print(f"  {us / 1000:8.1f} мс  {name}")
+
+    # Команде с расписанием нужна книга: берем локальную, сеть не нужна
+    env = dict(os.environ, BOT_TOKEN='1:bench', SCHEDULE_TTL=str(10 ** 6))
+    if args.command != '/menu':
+        env['EXCEL_FILE_PATH'] = make_sample_workbook(args.weeks)
+
+    timings = []
+    for _ in range(args.runs):
+        api = FakeBotAPI(args.command)
+        env.update(TELEGRAM_API_URL=api.url, PORT=str(free_port()))
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, 'main.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not api.replied.wait(60):
+                raise RuntimeError("бот не ответил за 60 с")
+            timings.append(time.perf_counter() - start)
+            if 'Данные не загружены' in api.reply_text(0):
+                print("⚠️ бот ответил до загрузки расписания")
+        finally:
+            process.terminate()
+            process.wait()
+            api.close()
+    print(f"до первого ответа на {args.command}: медиана {statistics.median(timings) * 1000:.0f} мс"
+          f" (мин {min(timings) * 1000:.0f}, макс {max(timings) * 1000:.0f}, запусков {len(timings)})")
+
+
+def bench_updates(args):
+    """Утренний пик: --chats чатов шлют по команде на каждый день недели, Bot API отвечает с задержкой"""
+    import subprocess
+
+    days = ['/monday', '/tuesday', '/wednesday', '/thursday', '/friday', '/saturday']
+    requests = [(command, 1000 + chat) for command in days for chat in range(args.chats)]
+    updates = [command_update(i + 1, command, chat_id) for i, (command, chat_id) in enumerate(requests)]
+    expected = len(updates) * 2  # «Загружаю...» и правка этого сообщения
+    # Меряется обработка обновлений, а не лимит Telegram на чат (его держит планировщик отправки)
+    env = dict(os.environ, BOT_TOKEN='1:bench', SCHEDULE_TTL=str(10 ** 6),
+               EXCEL_FILE_PATH=make_sample_workbook(args.weeks), SEND_CHAT_RATE='1000', SEND_RATE='1000')
+
+    for concurrency in (1, args.concurrency):
+        api = FakeBotAPI(updates=list(updates), latency=args.latency)
+        env.update(TELEGRAM_API_URL=api.url, PORT=str(free_port()), UPDATE_CONCURRENCY=str(concurrency))
+        process = subprocess.Popen([sys.executable, 'main.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.perf_counter() + 300
+            while len(api.calls) < expected and time.perf_counter() < deadline:
+                time.sleep(0.05)
+        finally:
+            process.terminate()
+            process.wait()
+            api.close()
+
+        calls = api.calls
+        if len(calls) < expected:
+            print(f"⚠️ {concurrency}: ответов {len(calls)} из {expected}")
+            continue
+        elapsed = calls[-1][0] - api.delivered
+
+        # Порядок в чате: каждая команда целиком (ответ и правка) раньше следующей
+        ordered = True
+        by_chat = {}
+        for _, method, chat, text in calls:
+            by_chat.setdefault(chat, []).append((method, text))
+        for chat_calls in by_chat.values():
+            methods = [method for method, _ in chat_calls]
+            loading = [text for method, text in chat_calls if method == 'sendMessage']
+            if methods != ['sendMessage', 'editMessageText'] * len(days) or \
+                    [text.split()[-1].rstrip('.') for text in loading] != \
+                    ['понедельник', 'вторник', 'среду', 'четверг', 'пятницу', 'субботу']:
+                ordered = False
+        print(f"параллельно {concurrency:>3}: {len(updates)} обновлений за {elapsed:.2f} с "
+              f"({len(updates) / elapsed:.0f} обн/с), порядок в чатах {'сохранен' if ordered else 'НАРУШЕН'}")
+
+
+def bench_sends(args):
+    """Всплеск ответов: Telegram-подмена с лимитом 30/с и 429; напрямую против планировщика отправки"""
+    import asyncio
+    from telegram.error import RetryAfter
+    from sending import SendScheduler
+
+    class FloodLimitedAPI:
+        """Принимает не больше 30 вызовов за скользящую секунду, дальше — 429 с retry_after=1"""
+
+        def __init__(self):
+            self.accepted = []
+            self.rejected = 0
+            self.texts = {}  # (чат, сообщение) -> последний текст
+
+        async def call(self, chat_id, message_id, text):
+            await asyncio.sleep(args.latency)
+            now = time.perf_counter()
+            self.accepted = [moment for moment in self.accepted if now - moment < 1.0]
+            if len(self.accepted) >= 30:
+                self.rejected += 1
+                raise RetryAfter(1)
+            self.accepted.append(now)
+            self.texts[chat_id, message_id] = text
+            return {'chat': chat_id, 'text': text}
+
+    async def burst(scheduler):
+        api = FloodLimitedAPI()
+        lost = 0
+
+        async def send(endpoint, chat_id, message_id, text):
+            data = {'chat_id': chat_id, 'message_id': message_id, 'text': text}
+            if scheduler is None:
+                return await api.call(chat_id, message_id, text)
+            return await scheduler.process_request(api.call, (chat_id, message_id, text), {}, endpoint, data, None)
+
+        async def user(chat_id):
+            nonlocal lost
+            # Сообщение «Загружаю...» и три правки прогресса без ожидания, последняя — итоговый текст
+            try:
+                await send('sendMessage', chat_id, 1, 'загрузка')
+                await asyncio.gather(*(send('editMessageText', chat_id, 1, f'правка {i}') for i in range(3)))
+            except RetryAfter:
+                lost += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(chat) for chat in range(args.chats)))
+        elapsed = time.perf_counter() - start
+        final = sum(text == 'правка 2' for text in api.texts.values())
+        return elapsed, lost, api.rejected, final
+
+    elapsed, lost, rejected, final = asyncio.run(burst(None))
+    print(f"напрямую:      {elapsed:5.2f} с, 429: {rejected}, пользователей без ответа {lost}, "
+          f"итоговый текст у {final} из {args.chats}")
+
+    async def scheduled():
+        scheduler = SendScheduler(rate=25, chat_rate=1, chat_burst=3)
+        return scheduler, await burst(scheduler)
+
+    scheduler, (elapsed, lost, rejected, final) = asyncio.run(scheduled())
+    metrics = scheduler.metrics()
+    print(f"планировщик:   {elapsed:5.2f} с, 429: {rejected}, пользователей без ответа {lost}, "
+          f"итоговый текст у {final} из {args.chats}; правок слито {metrics['coalesced']}, "
+          f"ожидание в очереди p50 {metrics['wait_p50_ms']:.0f} мс, p95 {metrics['wait_p95_ms']:.0f} мс")
+
+
+# Аргументы команд вместо текста пользователя, который в запись не попадает
+REPLAY_ARGS = {'find': 'Предмет', 'teacher': 'Преподаватель', 'free': 'завтра', 'history': 'завтра', 'remind': 'off'}
+
+
+def synthetic_recording(path, chats=40, seconds=20.0, seed=1):
+    """Запись в формате traffic.py: утренний шторм /start, затем кнопки дней и недель, изредка /refresh"""
+    import gzip
+    import json
+    import random
+
+    rng = random.Random(seed)
+    events = []
+    for chat in range(1, chats + 1):
+        offset = rng.uniform(0, seconds * 0.2) * 1000
+        events.append([round(offset, 1), chat, 'c', 'start', 0, 0])
+        for _ in range(rng.randint(2, 6)):
+            offset += rng.expovariate(1 / 3.0) * 1000
+            week = rng.randint(1, 4)
+            data = rng.choice(['quick_today', 'quick_tomorrow', 'quick_days', 'select_week', 'back_to_menu',
+                               f'week_{week}', f'day_{week}_{rng.randint(0, 5)}', f'all_days_{week}'])
+            events.append([round(offset, 1), chat, 'q', data, 0, 0])
+        if rng.random() < 0.1:
+            events.append([round(offset + 500, 1), chat, 'c', 'refresh', 0, 0])
+    events.sort()
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'format': 1, 'recorded': 'synthetic'}) + '\n')
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+
+def replay_update(update_id, event):
+    """Обновление Bot API для события записи; чат n становится чатом 1000 + n"""
+    _, chat, kind, value, n_args, _ = event
+    chat_id = 1000 + chat
+    if kind == 'q':
+        return callback_update(update_id, value, chat_id)
+    if kind == 'c':
+        args = f" {REPLAY_ARGS.get(value, '1')}" if n_args else ''
+        return command_update(update_id, f"/{value}{args}", chat_id)
+    update = command_update(update_id, 'привет', chat_id)
+    del update['message']['entities']
+    return update
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] if ordered else 0.0
+
+
+def bench_replay(args):
+    """Воспроизвести запись трафика (TRAFFIC_RECORD) на подменах Bot API и сайта со скоростями --speeds"""
+    import subprocess
+    from traffic import load_recording
+
+    path = args.recording
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.jsonl.gz')
+        os.close(fd)
+        synthetic_recording(path, chats=args.chats)
+        print(f"запись не задана (--recording), синтетическая: {args.chats} чатов")
+    events = load_recording(path)
+    if not events:
+        print("⚠️ в записи нет событий")
+        return
+    first = events[0][0]
+    span = (events[-1][0] - first) / 1000
+    print(f"событий {len(events)} за {span:.1f} с, чатов {len({event[1] for event in events})}")
+
+    workbook = make_sample_workbook(args.weeks)
+    site = SiteStandIn(workbook)
+    for speed in [float(value) for value in args.speeds.split(',')]:
+        fd, output = tempfile.mkstemp(suffix='.jsonl.gz')
+        os.close(fd)
+        os.unlink(output)
+        api = FakeBotAPI(updates=[], latency=args.latency)
+        env = dict(os.environ, BOT_TOKEN='1:bench', SCHEDULE_TTL=str(10 ** 6), EXCEL_FILE_PATH=workbook,
+                   TELEGRAM_API_URL=api.url, PORT=str(free_port()), TRAFFIC_RECORD=output,
+                   HISTORY_PATH=f"{output}.history.gz", REMINDERS_PATH=f"{output}.reminders.json", **site.env())
+        process = subprocess.Popen([sys.executable, 'main.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not api.polling.wait(60):
+                raise RuntimeError("бот не начал опрос за 60 с")
+            start = time.perf_counter()
+            for update_id, event in enumerate(events, 1):
+                if speed > 0:
+                    delay = start + (event[0] - first) / 1000 / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                api.push([replay_update(update_id, event)])
+            fed = time.perf_counter() - start
+            # Ответы закончились: ни одного вызова Bot API за 2 с
+            seen, quiet_since = -1, time.perf_counter()
+            while time.perf_counter() - quiet_since < 2 and time.perf_counter() - start < fed + 300:
+                if len(api.calls) != seen:
+                    seen, quiet_since = len(api.calls), time.perf_counter()
+                time.sleep(0.1)
+        finally:
+            # SIGTERM: бот останавливается штатно и дописывает запись
+            process.terminate()
+            process.wait()
+            api.close()
+
+        replayed = load_recording(output) if os.path.exists(output) else []
+        handled = [event[5] for event in replayed if event[5] >= 0]
+        shed = len(replayed) - len(handled)
+        throttled = sum('Подождите' in text for _, _, _, text in api.calls)
+        title = f"{speed:g}×" if speed > 0 else "макс."
+        if not handled:
+            print(f"{title:>6}: ни одного обработанного обновления")
+            continue
+        print(f"{title:>6}: обработано {len(handled)} из {len(events)} за {fed:.1f} с подачи, "
+              f"p50 {percentile(handled, 0.5):.0f} мс, p90 {percentile(handled, 0.9):.0f} мс, "
+              f"p99 {percentile(handled, 0.99):.0f} мс, макс {max(handled):.0f} мс; "
+              f"отброшено {shed}, «подождите» {throttled}")
+    site.close()
+
+
+BENCHMARKS = {
+    'sends': bench_sends,
+    'replay': bench_replay,
+    'hedge': bench_hedge,
+    'updates': bench_updates,
+    'memory': bench_memory,
+    'find': bench_find,
+    'startup': bench_startup,
+    'google': bench_google,
+    'api': bench_api,
+    'snapshot': bench_snapshot,
+    'sheets': bench_sheets,
+    'timegrid': bench_timegrid,
+    'layout': bench_layout,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('name', choices=sorted(BENCHMARKS))
+    parser.add_argument('--weeks', type=int, default=4)
+    parser.add_argument('--sheets', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--command', default='/menu')
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--hang', type=float, default=8.0)
+    parser.add_argument('--recording', help="запись трафика TRAFFIC_RECORD для replay")
+    parser.add_argument('--speeds', default='1,10,0', help="скорости replay через запятую, 0 — максимальная")
+    args = parser.parse_args()
+    BENCHMARKS[args.name](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
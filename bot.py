@@ -1,44 +1,242 @@
 import os
-import pandas as pd
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, MenuButtonCommands, BotCommand
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
 from telegram.error import BadRequest
 from dotenv import load_dotenv
+from layout import LayoutCache, week_day_columns
+from breaker import CircuitBreaker
+from download import CACHE_PREFIX, DownloadCancelled, read_sheet_names, stream_workbook
+from hedge import HedgedRace, SourceLatency
+from lazy import LazyModule, is_loaded
+from search import ScheduleIndex
+from rooms import PAIRS, RoomOccupancy, parse_query
+from teachers import TeacherTimetable
+from lessons import StringTable, compile_pairs
+from updates import PROCESSORS, ChatOrderedUpdateProcessor
+from sending import SCHEDULERS, SendScheduler
+from looplag import LoopLagMonitor
+from traffic import get_recorder
+from reminders import SUBGROUPS, ReminderScheduler
+from history import ScheduleHistory, diff_day
+from weekimage import WeekImages, grid_key, week_grid
 import logging
 import asyncio
+import copy
 import re
-import requests
-from bs4 import BeautifulSoup
-import tempfile
+import html
+import json
+import hashlib
+import zipfile
+import threading
+from threading import Thread
 import time
-from functools import wraps
-from datetime import datetime, timedelta
+from functools import lru_cache, partial, wraps
+from urllib.parse import urljoin
+from datetime import date, datetime, timedelta
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
-def keep_alive(self):
-    """Запуск веб-сервера для поддержания активности"""
-    from flask import Flask
-    from threading import Thread
-    
-    app = Flask('')
-    
-    @app.route('/')
-    def home():
-        return "✅ Schedule Bot is running on Scalingo!"
-    
-    @app.route('/health')
-    def health():
-        return "🟢 Bot is healthy and running"
+
+# Тяжелые зависимости разбора и загрузки импортируются при первом обращении
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+requests = LazyModule('requests')
+bs4 = LazyModule('bs4')
+
+# Ключевые слова листа 1 потока (лист по умолчанию)
+STREAM_KEYWORDS = ['1 поток', '1_поток', 'kr', 'крд']
+
+# Начало пар в минутах от полуночи
+PAIR_TIMES = {1: 510, 2: 620, 3: 720, 4: 835, 5: 940, 6: 1045}
+
+# Предел текста сообщения Telegram в единицах UTF-16
+MESSAGE_LIMIT = 4096
+
+# Команды бота для меню команд Telegram и текста главного меню:
+# (команда, аргументы, подсказка в меню или None, описание для set_my_commands)
+COMMANDS = [
+    ("start", None, None, "🚀 Запустить бота"),
+    ("menu", None, "Главное меню", "📋 Главное меню"),
+    ("refresh", None, "Обновить расписание", "🔄 Обновить расписание"),
+    ("week", None, "Выбрать неделю", "📅 Выбрать неделю"),
+    ("today", None, "Сегодня", "📆 Расписание на сегодня"),
+    ("tomorrow", None, "Завтра", "📆 Расписание на завтра"),
+    ("monday", None, "Пн", "📆 Понедельник"),
+    ("tuesday", None, "Вт", "📆 Вторник"),
+    ("wednesday", None, "Ср", "📆 Среда"),
+    ("thursday", None, "Чт", "📆 Четверг"),
+    ("friday", None, "Пт", "📆 Пятница"),
+    ("saturday", None, "Сб", "📆 Суббота"),
+    ("find", "текст", "Поиск пар", "🔎 Поиск по предметам, преподавателям, аудиториям"),
+    ("free", "[дата] [пара]", "Свободные аудитории", "🏫 Свободные аудитории"),
+    ("teacher", "фамилия [неделя]", "Расписание преподавателя", "👨‍🏫 Расписание преподавателя"),
+    ("remind", "[1|2|обе|off]", "Напоминания о парах", "⏰ Напоминания о парах"),
+    ("history", "[дата] [пара]", "Изменения расписания дня", "📜 Изменения расписания дня"),
+    ("debug", None, None, "🐛 Отладочная информация"),
+]
+
+TIME_PATTERN = r'(\d{1,2}):(\d{2})'
+TIME_RE = re.compile(TIME_PATTERN)
+
+
+@lru_cache(maxsize=None)
+def _pair_lookup():
+    """Номер ближайшей пары для каждой минуты, которую можно записать как ЧЧ:ММ"""
+    return np.array([
+        min(PAIR_TIMES.items(), key=lambda x: abs(x[1] - minute))[0]
+        for minute in range(99 * 60 + 100)
+    ], dtype=np.int8)
+
+# Адрес Google Таблиц; в бенчмарке подменяется локальным сервером
+GOOGLE_DOCS_BASE = os.getenv('GOOGLE_DOCS_BASE', 'https://docs.google.com')
+GOOGLE_DOC_RE = re.compile(r'/spreadsheets/d/([a-zA-Z0-9-_]+)')
+SITE_URL = os.getenv('SCHEDULE_SITE_URL', 'https://ktmu-sutd.ru/timetable.html')
+KNOWN_LINKS = [
+    f"{GOOGLE_DOCS_BASE}/spreadsheets/d/1zyuQ2Z1tXrTh3mU3JX4bZMonwsQFruf3/export?format=xlsx",
+]
+DOWNLOAD_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+# Кнопки листов на странице htmlview: id="sheet-button-<gid>" и имя листа в ссылке
+GOOGLE_SHEET_RE = re.compile(r'id="sheet-button-(\d+)"[^>]*>(?:\s*<[^>]+>)*\s*([^<]+?)\s*<')
+
+_sheet_pool = None
+
+
+def _utf16_len(text):
+    """Длина текста так, как ее считает Telegram"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+_HTML_TOKEN = re.compile(r'<[^>]*>|&#?\w+;|.', re.S)
+
+
+def _cut_html_line(line, limit):
+    """Начало строки HTML не длиннее limit единиц UTF-16 и остаток.
     
-    @app.route('/ping')
-    def ping():
-        return "pong"
+    Режем только между тегами и сущностями; открытые теги закрываются
+    в начале и открываются заново в остатке.
+    """
+    head, opened = '', []
+    tokens = _HTML_TOKEN.findall(line)
+    for taken, token in enumerate(tokens):
+        closing = ''.join(f"</{tag.strip('<>').split()[0]}>" for tag in reversed(opened))
+        if head and _utf16_len(head + token + closing) > limit:
+            break
+        head += token
+        if token.startswith('</'):
+            if opened:
+                opened.pop()
+        elif token.startswith('<') and token.endswith('>') and not token.endswith('/>'):
+            opened.append(token)
+    else:
+        return line, ''
+    closing = ''.join(f"</{tag.strip('<>').split()[0]}>" for tag in reversed(opened))
+    return head + closing, ''.join(opened) + ''.join(tokens[taken:])
+
+
+def _is_stream_sheet(sheet):
+    """Лист с расписанием потока"""
+    sheet = sheet.lower()
+    return 'поток' in sheet or any(keyword in sheet for keyword in STREAM_KEYWORDS)
+
+
+def _download_session():
+    """Сессия загрузки: у каждого источника гонки своя"""
+    session = requests.Session()
+    # КРИТИЧЕСКИ ВАЖНО: отключаем использование системного прокси
+    session.trust_env = False
+    return session
+
+
+def _has_first_stream_sheet(sheet_names):
+    """Есть ли в книге лист 1 потока"""
+    return any(any(keyword in sheet.lower() for keyword in STREAM_KEYWORDS) for sheet in sheet_names)
+
+
+def _parse_sheet(path, sheet):
+    """Разбор одного листа (выполняется в процессе пула)"""
+    start = time.perf_counter()
+    df = pd.read_excel(path, sheet_name=sheet, header=None)
+    return sheet, df, time.perf_counter() - start
+
+
+def _book_sheet_names(path):
+    """Имена листов книги xlsx без разбора листов; None, если так их не узнать (CSV, .xls)"""
+    try:
+        return read_sheet_names(path)
+    except (OSError, zipfile.BadZipFile, KeyError):
+        return None
+
+
+def _read_csv_sheet(path):
+    """Лист из CSV-выгрузки в том же виде, что и pd.read_excel(header=None)"""
+    return pd.read_csv(path, header=None, dtype=object, skip_blank_lines=False,
+                       keep_default_na=False, na_values=[''], encoding='utf-8')
+
+
+def _get_sheet_pool(workers):
+    """Общий пул процессов для разбора листов, pandas импортируется один раз"""
+    global _sheet_pool
+    if _sheet_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['pandas'])
+        _sheet_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return _sheet_pool
+
+
+def _reset_sheet_pool():
+    """Закрыть сломанный пул, следующий разбор создаст новый"""
+    global _sheet_pool
+    if _sheet_pool is not None:
+        _sheet_pool.shutdown(wait=False, cancel_futures=True)
+        _sheet_pool = None
+
+def keep_alive(self, ready=None):
+    """Запуск веб-сервера для поддержания активности"""
+    is_ready = ready or self.is_ready
     
     def run():
+        # Flask импортируется в потоке сервера и не задерживает запуск опроса
+        from flask import Flask
+        from api import ScheduleAPI
+        
+        app = Flask('')
+        # JSON API отдается до маршрутизации Flask готовыми байтами
+        app.wsgi_app = ScheduleAPI(self).wsgi_middleware(app.wsgi_app)
+        
+        @app.route('/')
+        def home():
+            return "✅ Schedule Bot is running on Scalingo!"
+        
+        @app.route('/health')
+        def health():
+            # Платформа направляет трафик только на прогретые экземпляры
+            if not is_ready():
+                return "🟡 Warming up schedule", 503
+            return "🟢 Bot is healthy and running"
+        
+        @app.route('/ping')
+        def ping():
+            return "pong"
+        
+        @app.route('/metrics')
+        def metrics():
+            # Очереди обновлений всех ботов процесса
+            return {
+                'updates': [processor.metrics() for processor in list(PROCESSORS)],
+                'sends': [scheduler.metrics() for scheduler in list(SCHEDULERS)],
+                'loop': self.loop_monitor.metrics(),
+                'reminders': self.reminders.metrics(),
+                'week_images': self.week_images.metrics(),
+                # Отложенные импорты: тронул ли их уже кто-нибудь после старта
+                'imported': {name: is_loaded(name) for name in ('pandas', 'numpy', 'requests', 'bs4')},
+            }
+        
         app.run(host='0.0.0.0', port=self.port)
     
     t = Thread(target=run)
@@ -64,12 +262,15 @@ def rate_limit(limit_seconds=2):
                 return await func(self, update, context, *args, **kwargs)
                 
             current_time = time.time()
+            # Боты одного процесса ограничивают пользователя независимо друг от друга
+            bot = getattr(context, 'bot', None)
+            key = (bot.id if bot is not None else None, user_id)
             
-            if user_id in last_called:
-                time_passed = current_time - last_called[user_id]
+            if key in last_called:
+                time_passed = current_time - last_called[key]
                 if time_passed < limit_seconds:
                     try:
-                        if hasattr(update, 'callback_query'):
+                        if getattr(update, 'callback_query', None) is not None:
                             await update.callback_query.answer(
                                 f"⏳ Подождите {limit_seconds - int(time_passed)} секунд", 
                                 show_alert=False
@@ -78,19 +279,19 @@ def rate_limit(limit_seconds=2):
                             await update.message.reply_text(
                                 f"⏳ Подождите {limit_seconds - int(time_passed)} секунд перед следующим действием"
                             )
-                    except:
-                        pass
+                    except Exception as e:
+                        logger.warning(f"⚠️ Не удалось ответить о лимите: {e}")
                     return
             
-            last_called[user_id] = current_time
+            last_called[key] = current_time
             return await func(self, update, context, *args, **kwargs)
         
         return wrapper
     return decorator
 
 class ScheduleBot:
-    def __init__(self):
-        self.token = os.getenv('BOT_TOKEN')
+    def __init__(self, token=None, group=None, sheet=None):
+        self.token = token or os.getenv('BOT_TOKEN')
         self.excel_file = os.getenv('EXCEL_FILE_PATH')
         self.user_data = {}
         self.week_info_cache = None
@@ -99,103 +300,509 @@ class ScheduleBot:
         self.data_loaded = False
         self.last_action_time = {}
         self.port = int(os.environ.get("PORT", 8080))
+        self.data_version = 0
+        self.schedule_cache = None
+        self.time_grid_cache = None
+        self.layout_cache = None
+        self.layouts = LayoutCache()
+        self.group_env = group or os.getenv('SCHEDULE_GROUP')
+        self.breakers = {}
+        # Время ответа источников задает задержку хеджирования загрузки
+        self.source_latency = SourceLatency()
+        self.excel_digest = None
+        # Лист, если excel_file — CSV-выгрузка одного листа
+        self.source_sheet = None
+        # CSV-выгрузка — только лист группы: /free, /teacher и разбор всех потоков
+        # работают по всей книге, поэтому по умолчанию качаем xlsx целиком
+        self.google_export = os.getenv('GOOGLE_EXPORT', 'xlsx')
+        self.google_sheets = {}
+        self.refresh_interval = int(os.getenv('SCHEDULE_TTL', 600))
+        self._refresh_lock = threading.Lock()
+        self._data_lock = threading.RLock()
+        self.snapshot_path = os.getenv('SNAPSHOT_PATH')
+        self.sheet_env = sheet or os.getenv('SCHEDULE_SHEET')
+        # Пул процессов для листов потоков — только если SHEET_WORKERS задан больше 1:
+        # на маленьких инстансах отдельные процессы с pandas стоят больше, чем экономят
+        self.sheet_workers = int(os.getenv('SHEET_WORKERS', 1))
+        self.sheet_name = None
+        self.sheet_cache = {}
+        self.sheet_timings = {}
+        self.sheet_schedules_cache = None
+        self.block_schedules_cache = None
+        self.render_cache = {}
+        self.page_cache = {}
+        self.date_index_cache = None
+        self.rooms_cache = None
+        # После компиляции DataFrame отпускается, данные живут в компактных записях
+        self.compact_frames = os.getenv('COMPACT_SCHEDULE', '1') != '0'
+        # Расписание восстановлено из снимка: книга еще не разобрана pandas
+        self.restored = False
+        self.strings = StringTable()
+        self.sheet_shape = None
+        # Индекс переживает смену версии: обновляются только изменившиеся дни
+        self.search_index = ScheduleIndex()
+        self.teachers = TeacherTimetable()
+        self.warmup_timeout = float(os.getenv('WARMUP_TIMEOUT', 25))
+        self.warmup_seconds = None
+        self.warmed = threading.Event()
+        # Обработчики не должны блокировать цикл событий дольше LOOP_LAG_MS
+        self.loop_monitor = LoopLagMonitor(threshold=float(os.getenv('LOOP_LAG_MS', 100)) / 1000)
+        # Несколько ботов в одном процессе: ведомые берут книгу у ведущего
+        self.upstream = None
+        self.followers = []
+        # Напоминания о парах: одна куча слотов на конфигурацию расписания
+        self.reminders = ReminderScheduler()
+        # Журнал версий расписания для /history
+        self.history = ScheduleHistory()
+        # Недели картинками (WEEK_IMAGES=1): file_id загруженных картинок по ботам
+        self.week_images = WeekImages()
+        
+    def _reset_caches(self):
+        """Сбросить кэши разобранных данных и увеличить версию данных.
+        
+        Идет под блокировкой данных: компиляция в другом потоке не смешает
+        кэши старой и новой версии. Переключение файла вызывающие делают
+        под той же блокировкой.
+        """
+        with self._data_lock:
+            self.df_cache = None
+            self.week_info_cache = None
+            self.schedule_cache = None
+            self.time_grid_cache = None
+            self.layout_cache = None
+            self.sheet_cache = {}
+            self.sheet_schedules_cache = None
+            self.block_schedules_cache = None
+            self.render_cache = {}
+            self.page_cache = {}
+            self.date_index_cache = None
+            self.rooms_cache = None
+            self.strings = StringTable()
+            self.restored = False
+            self.data_version += 1
+        
+    def _breaker(self, source):
+        """Автомат защиты для источника (страница сайта, ссылка на файл)"""
+        breaker = self.breakers.get(source)
+        if breaker is None:
+            breaker = self.breakers.setdefault(source, CircuitBreaker(source))
+        return breaker
+
+    def _use_downloaded_file(self, path, digest=None, sheet=None):
+        """Переключиться на успешно скачанный файл расписания"""
+        self.last_download_time = datetime.now()
+        if digest and digest == self.excel_digest and self.has_schedule():
+            # Тот же файл: разобранные данные остаются в силе
+            logger.info("✅ Расписание не изменилось")
+            if path != self.excel_file:
+                os.unlink(path)
+            for follower in self.followers:
+                follower.last_download_time = self.last_download_time
+            return
         
-    def download_schedule_from_website(self):
-        """Скачать расписание с сайта ktmu-sutd.ru"""
-        try:
-            logger.info("🔄 Загрузка расписания...")
-            
-            timetable_url = "https://ktmu-sutd.ru/timetable.html"
-            
-            session = requests.Session()
-            # КРИТИЧЕСКИ ВАЖНО: отключаем использование системного прокси
-            session.trust_env = False
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            # Быстрая загрузка страницы
-            response = session.get(timetable_url, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
+        previous = self.excel_file
+        with self._data_lock:
+            self.excel_file = path
+            self.excel_digest = digest
+            self.source_sheet = sheet
+            self._reset_caches()
+            self.data_loaded = True
+        self.publish_snapshot()
+        # Ведомые переходят на новый файл до удаления старого
+        self.sync_followers()
+        
+        # Старые скачанные файлы удаляем, локальный EXCEL_FILE_PATH и файл,
+        # на котором остался ведомый (его листа нет в новой книге), не трогаем
+        in_use = any(follower.excel_file == previous for follower in self.followers)
+        if previous and previous != path and not in_use and os.path.basename(previous).startswith(CACHE_PREFIX):
+            try:
+                os.unlink(previous)
+            except OSError:
+                pass
+
+    def follow(self, upstream):
+        """Брать книгу у ведущего бота того же процесса вместо собственной загрузки"""
+        self.upstream = upstream
+        upstream.followers.append(self)
+        # Снимок, файл макетов и расписание обновлений у процесса общие
+        self.snapshot_path = None
+        self.layouts = upstream.layouts
+        self.refresh_interval = upstream.refresh_interval
+        # Подписчики и история ведомого хранятся отдельно от ведущего
+        key = f"{self.sheet_env}|{self.group_env}".encode('utf-8')
+        name = hashlib.sha1(key).hexdigest()[:8]
+        self.reminders = ReminderScheduler(name=name)
+        self.history = ScheduleHistory(name=name)
+        self.week_images = upstream.week_images
+
+    def sync_followers(self):
+        """Перевести ведомых ботов на текущую книгу; листы разбираются один раз на всех"""
+        if not self.followers or not self.has_schedule():
+            return
+        with self._data_lock:
+            if self.df_cache is None and not self._is_compiled():
+                self.get_dataframe()
+            for follower in self.followers:
+                if follower.excel_file == self.excel_file and follower.has_schedule():
+                    continue
+                follower.adopt(self)
+
+    def adopt(self, upstream, compact=True):
+        """Перейти на книгу ведущего бота, не скачивая и по возможности не разбирая ее заново.
+        
+        Если заданного SCHEDULE_SHEET в книге нет, остается прежнее расписание
+        и возвращается False; первый лист потока берется, только когда лист не задан.
+        """
+        frames = upstream.sheet_cache
+        if self.sheet_env and self.sheet_env not in frames:
+            sheet_names = _book_sheet_names(upstream.excel_file)
+            if sheet_names is not None and self.sheet_env not in sheet_names:
+                logger.error(f"❌ Листа «{self.sheet_env}» нет в книге ведущего бота, остается прежнее расписание")
+                return False
+            # Лист в книге есть, но ведущий его не разбирал: ведомый разберет книгу сам
+            frames = {}
+        
+        with self._data_lock:
+            self.excel_file = upstream.excel_file
+            self.excel_digest = upstream.excel_digest
+            self.source_sheet = upstream.source_sheet
+            self.last_download_time = upstream.last_download_time
+            self._reset_caches()
+            self.data_loaded = True
+            if frames:
+                # DataFrame только читаются, поэтому листы ведущего берутся без копий
+                self.sheet_cache = dict(frames)
+                self.sheet_timings = dict(upstream.sheet_timings)
+                self.sheet_name = self._select_sheet(list(frames))
+                self.df_cache = frames[self.sheet_name]
+                self.sheet_shape = self.df_cache.shape
+            if compact:
+                self.get_schedule_data()
+                self.record_history()
+                self.compact()
+        logger.info(f"🔗 {self.sheet_name} / {self.group_env or 'группа по умолчанию'}: книга ведущего бота")
+        return True
+
+    def has_schedule(self):
+        """Есть ли уже загруженное расписание, которое можно показывать"""
+        return self.data_loaded and bool(self.excel_file) and os.path.exists(self.excel_file)
+
+    def load_saved_schedule(self):
+        """Подхватить книгу прошлого запуска по индексу снимка или EXCEL_FILE_PATH без сети"""
+        if self.has_schedule():
+            return True
+        if self.upstream is not None:
+            if not self.upstream.has_schedule():
+                return False
+            return self.adopt(self.upstream) and self.has_schedule()
+        
+        index = reader = None
+        if self.snapshot_path:
+            from snapshot import SnapshotError, SnapshotReader
             
-            # Быстрый поиск ссылок
-            schedule_links = []
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                text = link.get_text(strip=True)
+            reader = SnapshotReader(self.snapshot_path)
+            try:
+                reader.refresh(force=True)
+                index = reader.index
+            except (OSError, SnapshotError) as e:
+                logger.warning(f"⚠️ Снимок не прочитан: {e}")
+        
+        source = index.get('source') if index else None
+        found = bool(source) and os.path.exists(source)
+        if not found and not (self.excel_file and os.path.exists(self.excel_file)):
+            return False
+        
+        with self._data_lock:
+            if found:
+                self.excel_file = source
+                self.excel_digest = index.get('digest')
+                self.source_sheet = index.get('source_sheet')
+                if index.get('downloaded_at'):
+                    self.last_download_time = datetime.fromisoformat(index['downloaded_at'])
+            else:
+                index = None
+            self._reset_caches()
+            self.data_loaded = True
+            restored = index is not None and self._restore_snapshot(reader)
+        if restored:
+            logger.info(f"♻️ Расписание из снимка, книга {self.excel_file} разберется в фоне")
+        else:
+            logger.info(f"♻️ Расписание из сохраненного файла: {self.excel_file}")
+        return True
+
+    def _restore_snapshot(self, reader):
+        """Скомпилированные записи всех листов из тел снимка прошлого запуска, без pandas"""
+        from api import schedule_key, sheet_key
+        
+        index = reader.index
+        if not index.get('week_info') or index.get('group') != self.group_env:
+            return False
+        if self.sheet_env and self.sheet_env != index.get('sheet'):
+            return False
+        
+        def load(key):
+            entry = reader.body(key)
+            if entry is None:
+                raise KeyError(key)
+            return json.loads(bytes(entry[1]))
+        
+        try:
+            with self._data_lock:
+                version = self.data_version
+                listing = load('sheets')
+                schedules = {}
+                for entry in listing['sheets']:
+                    sheet = entry['sheet']
+                    prefix = None if sheet == listing['default'] else sheet
+                    weeks = {}
+                    for meta in load(sheet_key(prefix, 'weeks'))['weeks']:
+                        days = load(sheet_key(prefix, schedule_key(meta['week'])))['days']
+                        weeks[meta['week']] = dict(meta, days=[
+                            dict(day, pairs=compile_pairs(day['pairs'], self.strings)) for day in days
+                        ])
+                    schedules[sheet] = {
+                        'version': version,
+                        'sheet': sheet,
+                        'parse_seconds': entry['parse_ms'] / 1000,
+                        'weeks': weeks,
+                    }
                 
-                if href.startswith('/'):
-                    full_url = f"https://ktmu-sutd.ru{href}"
-                elif href.startswith('http'):
-                    full_url = href
+                self.sheet_name = listing['default']
+                self.sheet_timings = {sheet: data['parse_seconds'] for sheet, data in schedules.items()}
+                self.sheet_shape = tuple(index['shape'])
+                self.layout_cache = index['layout']
+                self.week_info_cache = index['week_info']
+                self.schedule_cache = schedules[self.sheet_name]
+                self.sheet_schedules_cache = (version, schedules)
+                self.date_index_cache = (version, index['dates'])
+                self.restored = True
+            return True
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ Снимок не подходит для восстановления: {e}")
+            self._reset_caches()
+            return False
+
+    def parse_restored(self):
+        """Разобрать книгу расписания, восстановленного из снимка: блоки всех групп для /free и /teacher"""
+        with self._data_lock:
+            if not self.restored:
+                return False
+            version = self.data_version
+        # Разбор идет вне блокировки: обработчики пока читают записи из снимка
+        parsed = copy.copy(self)
+        if parsed.load_sheets() is None:
+            return False
+        with self._data_lock:
+            if not self.restored or version != self.data_version:
+                return False
+            if parsed.sheet_name != self.sheet_name:
+                self._reset_caches()
+            self.sheet_cache = parsed.sheet_cache
+            self.sheet_timings = parsed.sheet_timings
+            self.df_cache = parsed.df_cache
+            self.sheet_shape = parsed.sheet_shape
+            self.restored = False
+            self.get_schedule_data()
+            self.get_block_schedules()
+            self.sync_followers()
+            self.compact()
+        logger.info(f"📚 Книга из снимка разобрана: листов {len(parsed.sheet_timings)}")
+        return True
+
+    def _finish_restore(self):
+        """Фон после старта из сохраненного: обновить книгу, если устарела, и разобрать ее"""
+        age = self.data_age()
+        if self.upstream is None and (age is None or age >= self.refresh_interval):
+            self.revalidate()
+        try:
+            self.parse_restored()
+        except Exception as e:
+            logger.error(f"❌ Ошибка разбора книги из снимка: {e}")
+
+    def warm_up(self):
+        """Загрузить расписание и заранее подготовить все, что читают обработчики"""
+        start = time.perf_counter()
+        try:
+            if self.load_saved_schedule():
+                # Сохраненное расписание сразу в работе, свежее догрузится и разберется в фоне
+                if self.restored:
+                    Thread(target=self._finish_restore, daemon=True).start()
                 else:
-                    continue
-                
-                url_lower = full_url.lower()
-                
-                # Быстрая проверка форматов
-                if any(ext in url_lower for ext in ['.xlsx', '.xls']):
-                    schedule_links.append((full_url, text, "EXCEL"))
-                elif any(domain in url_lower for domain in ['docs.google.com', 'drive.google.com']):
-                    schedule_links.append((full_url, text, "GOOGLE_DOCS"))
-            
-            if not schedule_links:
-                return self.download_schedule_alternative()
-            
-            # Пробуем скачать файлы
-            for file_url, file_name, file_type in schedule_links[:3]:  # Ограничиваем количество попыток
-                try:
-                    download_url = file_url
-                    if file_type == "GOOGLE_DOCS":
-                        excel_url = self.convert_google_docs_to_excel(file_url)
-                        if excel_url:
-                            download_url = excel_url
-                        else:
-                            continue
-                    
-                    file_response = session.get(download_url, headers=headers, timeout=30)
-                    
-                    if file_response.status_code == 200 and len(file_response.content) > 10000:
-                        # Быстрая проверка файла
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                            tmp_file.write(file_response.content)
-                            temp_excel_file = tmp_file.name
-                        
-                        # Проверяем только наличие нужных листов
-                        try:
-                            excel_file = pd.ExcelFile(temp_excel_file)
-                            sheet_names = excel_file.sheet_names
-                            
-                            if any(any(keyword in sheet.lower() for keyword in ['1 поток', '1_поток', 'kr', 'крд']) 
-                                  for sheet in sheet_names):
-                                logger.info(f"✅ Найден файл с листом 1 потока")
-                                self.excel_file = temp_excel_file
-                                self.df_cache = None
-                                self.week_info_cache = None
-                                self.data_loaded = True
-                                return True
-                            else:
-                                os.unlink(temp_excel_file)
-                                continue
-                                
-                        except Exception:
-                            try:
-                                os.unlink(temp_excel_file)
-                            except:
-                                pass
-                            continue
-                            
-                except Exception:
-                    continue
+                    self.revalidate_in_background()
+            else:
+                self.revalidate(wait=True)
             
-            return self.download_schedule_alternative()
-                
+            if self.has_schedule():
+                data = self.get_schedule_data()
+                self.record_history()
+                self.get_date_index()
+                self.get_search_index()
+                self.get_room_occupancy()
+                self.get_teacher_timetable()
+                for week_number, info in data['weeks'].items():
+                    for day in info['days']:
+                        self.get_1krd6_schedule(week_number, day['day'])
+                    # Неделя показывается страницами из текстов дней
+                    self.get_week_pages(week_number)
+                # Ведомые разбирают книгу из еще не отпущенных DataFrame ведущего;
+                # после старта из снимка это делает фоновый разбор книги
+                if not self.restored:
+                    self.sync_followers()
+                    self.compact()
+        except Exception as e:
+            logger.error(f"❌ Ошибка прогрева: {e}")
+        finally:
+            self.warmup_seconds = time.perf_counter() - start
+            self.warmed.set()
+        logger.info(f"🔥 Прогрев завершен за {self.warmup_seconds:.1f} с, сообщений готово: {len(self.render_cache)}")
+
+    def is_ready(self):
+        """Прогрев завершен и расписание есть: экземпляр можно выпускать под нагрузку"""
+        return self.warmed.is_set() and self.has_schedule()
+
+    def data_age(self):
+        """Возраст данных в секундах или None, если загрузок еще не было"""
+        if self.last_download_time is None:
+            return None
+        return (datetime.now() - self.last_download_time).total_seconds()
+
+    def revalidate(self, wait=False):
+        """Обновить расписание; пока идет загрузка, продолжает отдаваться прежнее.
+        
+        С wait=True дожидается уже идущего обновления и возвращает его результат.
+        """
+        if self.upstream is not None:
+            # Скачивает ведущий бот и сам переводит ведомых на новый файл
+            return self.upstream.revalidate(wait) and self.has_schedule()
+        started = self.last_download_time
+        if not self._refresh_lock.acquire(blocking=wait, timeout=120 if wait else -1):
+            logger.info("🔄 Обновление уже выполняется")
+            return False
+        try:
+            if wait and self.last_download_time != started:
+                return True
+            success = self.download_schedule_from_website()
+            if success:
+                # Разбираем новый файл сразу, а не в первом обработчике
+                self.get_schedule_data()
+                self.record_history()
+                self.compact()
+            return success
+        finally:
+            self._refresh_lock.release()
+
+    def revalidate_in_background(self, force=False):
+        """Запустить фоновое обновление, если данные устарели и оно еще не идет"""
+        if self.upstream is not None:
+            return self.upstream.revalidate_in_background(force)
+        age = self.data_age()
+        if not force and age is not None and age < self.refresh_interval:
+            return False
+        if self._refresh_lock.locked():
+            return False
+        Thread(target=self.revalidate, daemon=True).start()
+        return True
+
+    def download_schedule_from_website(self):
+        """Скачать расписание: сайт ktmu-sutd.ru и известные ссылки наперегонки"""
+        if self.upstream is not None:
+            # Сюда ведомый попадает и под своей блокировкой данных, поэтому загрузку
+            # ведущего не ждет: берет его книгу или просит обновить ее в фоне
+            if self.upstream.has_schedule():
+                return self.adopt(self.upstream, compact=False)
+            self.upstream.revalidate_in_background(force=True)
+            return False
+        try:
+            logger.info("🔄 Загрузка расписания...")
+            candidates = []
+            # Страница сайта, если он не отключен автоматом защиты
+            if self._breaker('site').allow():
+                candidates.append(('site', SITE_URL, self._fetch_site))
+            else:
+                logger.warning("⚠️ Сайт временно не опрашивается, пробуем известные ссылки")
+            # Известные ссылки стартуют, если сайт не ответил за задержку хеджирования
+            candidates += self._link_candidates(KNOWN_LINKS, 'known', timeout=15)
+            return self._race(candidates)
         except Exception as e:
             logger.error(f"❌ Ошибка загрузки: {e}")
-            return self.download_schedule_alternative()
+            return False
+
+    def _race(self, candidates):
+        """Запустить гонку источников и перейти на файл победителя"""
+        winner = HedgedRace(self.source_latency).run(candidates)
+        if winner is None:
+            logger.warning("⚠️ Ни один источник не отдал расписание")
+            return False
+        path, digest, sheet = winner[1]
+        self._use_downloaded_file(path, digest, sheet)
+        return True
+
+    def _link_candidates(self, links, origin, timeout=30):
+        """Кандидаты гонки по ссылкам: лист Google Таблицы в CSV, выгрузка xlsx, сам файл"""
+        candidates = []
+        for url in links:
+            url_lower = url.lower()
+            if any(ext in url_lower for ext in ['.xlsx', '.xls']):
+                candidates.append((f'{origin}-xlsx', url, partial(self._fetch_xlsx, url, timeout)))
+            elif any(domain in url_lower for domain in ['docs.google.com', 'drive.google.com', GOOGLE_DOCS_BASE]):
+                if self.google_export == 'csv' and GOOGLE_DOC_RE.search(url.replace('gooogle', 'google')):
+                    candidates.append(('google-csv', ('csv', url), partial(self._fetch_google_sheet, url)))
+                excel_url = self.convert_google_docs_to_excel(url)
+                if excel_url:
+                    candidates.append((f'{origin}-google', excel_url, partial(self._fetch_xlsx, excel_url, timeout)))
+        return candidates
+
+    def _fetch_site(self, race):
+        """Страница расписания: ссылки на файлы со страницы становятся кандидатами гонки"""
+        breaker = self._breaker('site')
+        try:
+            response = _download_session().get(SITE_URL, headers=DOWNLOAD_HEADERS, timeout=15)
+            response.raise_for_status()
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        breaker.record_success()
+        
+        soup = bs4.BeautifulSoup(response.content, 'html.parser')
+        links = []
+        for link in soup.find_all('a', href=True):
+            href = link['href']
+            if not href.startswith(('/', 'http')):
+                continue
+            full_url = urljoin(SITE_URL, href)
+            url_lower = full_url.lower()
+            if any(ext in url_lower for ext in ['.xlsx', '.xls', 'docs.google.com', 'drive.google.com']):
+                links.append(full_url)
+        
+        # Ограничиваем количество попыток
+        race.spawn(self._link_candidates(links[:3], 'site'))
+        return None
+
+    def _has_target_sheet(self, sheet_names):
+        """Есть ли в книге лист этого развертывания"""
+        return self.sheet_env in sheet_names or _has_first_stream_sheet(sheet_names)
+
+    def _fetch_xlsx(self, url, timeout, race):
+        """Скачать книгу по ссылке: (путь, sha256, None) или None"""
+        breaker = self._breaker(url)
+        if not breaker.allow():
+            return None
+        # Потоковая загрузка: HTML и книги без нужного листа отсекаются сразу
+        try:
+            path, digest, _ = stream_workbook(
+                _download_session(), url, headers=DOWNLOAD_HEADERS, timeout=timeout,
+                sheet_check=self._has_target_sheet, cancel=race.cancel
+            )
+        except DownloadCancelled:
+            return None
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        breaker.record_success()
+        return path, digest, None
+
+    def _fetch_google_sheet(self, url, race):
+        return self.fetch_google_sheet(_download_session(), url, DOWNLOAD_HEADERS, cancel=race.cancel)
 
     def convert_google_docs_to_excel(self, google_docs_url):
         """Быстрое преобразование Google Docs ссылки"""
@@ -205,7 +812,7 @@ class ScheduleBot:
             if '/spreadsheets/d/' in google_docs_url:
                 match = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', google_docs_url)
                 if match:
-                    return f"https://docs.google.com/spreadsheets/d/{match.group(1)}/export?format=xlsx"
+                    return f"{GOOGLE_DOCS_BASE}/spreadsheets/d/{match.group(1)}/export?format=xlsx"
             
             elif '/file/d/' in google_docs_url or 'drive.google.com' in google_docs_url:
                 patterns = [r'/file/d/([a-zA-Z0-9-_]+)', r'id=([a-zA-Z0-9-_]+)', r'/d/([a-zA-Z0-9-_]+)']
@@ -218,37 +825,68 @@ class ScheduleBot:
         except:
             return None
 
-    def download_schedule_alternative(self):
-        """Быстрая альтернативная загрузка"""
-        try:
-            known_links = [
-                "https://docs.google.com/spreadsheets/d/1zyuQ2Z1tXrTh3mU3JX4bZMonwsQFruf3/export?format=xlsx",
-            ]
-            
-            session = requests.Session()
-            # Отключаем прокси и для альтернативной загрузки
-            session.trust_env = False
-            
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            
-            for link in known_links:
-                try:
-                    response = session.get(link, headers=headers, timeout=15)
-                    if response.status_code == 200:
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                            tmp_file.write(response.content)
-                            self.excel_file = tmp_file.name
-                        
-                        self.df_cache = None
-                        self.week_info_cache = None
-                        self.data_loaded = True
-                        return True
-                except:
-                    continue
+    def discover_google_sheet(self, session, doc_id, headers=None):
+        """(gid, имя) листа этого развертывания в Google Таблице или None.
+
+        Страница htmlview со списком листов запрашивается один раз на таблицу.
+        """
+        if doc_id in self.google_sheets:
+            return self.google_sheets[doc_id]
+        
+        found = None
+        breaker = self._breaker('google-htmlview')
+        if breaker.allow():
+            try:
+                response = session.get(f"{GOOGLE_DOCS_BASE}/spreadsheets/d/{doc_id}/htmlview",
+                                       headers=headers, timeout=15)
+                response.raise_for_status()
+                breaker.record_success()
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось получить список листов таблицы: {e}")
+                breaker.record_failure(e)
+                return None
             
-            return False
-        except:
-            return False
+            sheets = {html.unescape(name): gid for gid, name in GOOGLE_SHEET_RE.findall(response.text)}
+            sheet = self._select_sheet(list(sheets))
+            if sheet and (sheet == self.sheet_env or _has_first_stream_sheet([sheet])):
+                found = (sheets[sheet], sheet)
+                logger.info(f"🔎 Лист {sheet} таблицы {doc_id}: gid={found[0]}")
+            else:
+                logger.info(f"🔎 В таблице {doc_id} не найден лист 1 потока: {list(sheets)}")
+        
+        self.google_sheets[doc_id] = found
+        return found
+
+    def fetch_google_sheet(self, session, url, headers=None, cancel=None):
+        """Скачать только нужный лист Google Таблицы в CSV вместо всей книги: (путь, sha256, лист) или None"""
+        if self.google_export != 'csv':
+            return None
+        match = GOOGLE_DOC_RE.search(url.replace('gooogle', 'google'))
+        if not match:
+            return None
+        
+        found = self.discover_google_sheet(session, match.group(1), headers)
+        if not found:
+            return None
+        gid, sheet = found
+        
+        csv_url = f"{GOOGLE_DOCS_BASE}/spreadsheets/d/{match.group(1)}/export?format=csv&gid={gid}"
+        breaker = self._breaker(csv_url)
+        if not breaker.allow():
+            return None
+        try:
+            path, digest, _ = stream_workbook(session, csv_url, headers=headers, timeout=30, fmt='csv', cancel=cancel)
+        except DownloadCancelled:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ {csv_url}: {e}")
+            breaker.record_failure(e)
+            # Лист могли пересоздать с другим gid: в следующий раз ищем заново
+            self.google_sheets.pop(match.group(1), None)
+            return None
+        
+        breaker.record_success()
+        return path, digest, sheet
 
     def get_dataframe(self, force_download=False):
         """Оптимизированное кэширование DataFrame"""
@@ -262,63 +900,212 @@ class ScheduleBot:
                     if self.excel_file and os.path.exists(self.excel_file):
                         logger.info("🔄 Используем локальный файл...")
                         try:
-                            excel_file = pd.ExcelFile(self.excel_file)
-                            sheet_names = excel_file.sheet_names
-                            
-                            target_sheet = None
-                            for sheet in sheet_names:
-                                if any(keyword in sheet.lower() for keyword in ['1 поток', '1_поток', 'kr', 'крд']):
-                                    target_sheet = sheet
-                                    break
-                            
-                            if not target_sheet and sheet_names:
-                                target_sheet = sheet_names[0]
-                            
-                            if target_sheet:
-                                self.df_cache = pd.read_excel(self.excel_file, sheet_name=target_sheet, header=None)
-                                self.data_loaded = True
-                                logger.info(f"✅ DataFrame загружен с локального файла: {target_sheet}")
-                                return self.df_cache
+                            with self._data_lock:
+                                self._reset_caches()
+                                if self.load_sheets() is not None:
+                                    self.data_loaded = True
+                                    logger.info(f"✅ DataFrame загружен с локального файла: {self.sheet_name}")
+                                    return self.df_cache
                         except Exception as e:
                             logger.error(f"❌ Ошибка загрузки локального файла: {e}")
                     return None
             
             if self.df_cache is None and self.excel_file and os.path.exists(self.excel_file):
-                # Быстрая загрузка с определением листа
-                excel_file = pd.ExcelFile(self.excel_file)
-                sheet_names = excel_file.sheet_names
-                
-                target_sheet = None
-                for sheet in sheet_names:
-                    if any(keyword in sheet.lower() for keyword in ['1 поток', '1_поток', 'kr', 'крд']):
-                        target_sheet = sheet
-                        break
-                
-                if not target_sheet and sheet_names:
-                    target_sheet = sheet_names[0]
-                
-                if target_sheet:
-                    self.df_cache = pd.read_excel(self.excel_file, sheet_name=target_sheet, header=None)
-                    logger.info(f"✅ DataFrame загружен с листа: {target_sheet}")
+                if self.load_sheets() is not None:
+                    logger.info(f"✅ DataFrame загружен с листа: {self.sheet_name}")
             
             return self.df_cache
         except Exception as e:
             logger.error(f"❌ Ошибка загрузки DataFrame: {e}")
             return None
 
+    def _select_sheet(self, sheet_names):
+        """Лист этого развертывания: SCHEDULE_SHEET, иначе первый лист 1 потока"""
+        if self.sheet_env in sheet_names:
+            return self.sheet_env
+        for sheet in sheet_names:
+            if any(keyword in sheet.lower() for keyword in STREAM_KEYWORDS):
+                return sheet
+        return sheet_names[0] if sheet_names else None
+
+    def load_sheets(self):
+        """Разобрать все листы потоков книги за один проход"""
+        if self.excel_file.endswith('.csv'):
+            return self._load_csv_sheet()
+        
+        excel_file = pd.ExcelFile(self.excel_file)
+        sheet_names = excel_file.sheet_names
+        
+        target_sheet = self._select_sheet(sheet_names)
+        if not target_sheet:
+            return None
+        
+        streams = [sheet for sheet in sheet_names if _is_stream_sheet(sheet)]
+        if target_sheet not in streams:
+            streams.insert(0, target_sheet)
+        
+        frames = {}
+        timings = {}
+        workers = min(self.sheet_workers, len(streams))
+        if workers > 1:
+            # openpyxl держит GIL, поэтому параллелим процессами
+            try:
+                pool = _get_sheet_pool(workers)
+                for sheet, df, elapsed in pool.map(_parse_sheet, [self.excel_file] * len(streams), streams):
+                    frames[sheet] = df
+                    timings[sheet] = elapsed
+            except Exception as e:
+                logger.warning(f"⚠️ Пул разбора листов недоступен, разбираем последовательно: {e}")
+                _reset_sheet_pool()
+                frames = {}
+        
+        if not frames:
+            for sheet in streams:
+                start = time.perf_counter()
+                frames[sheet] = excel_file.parse(sheet, header=None)
+                timings[sheet] = time.perf_counter() - start
+        
+        for sheet in streams:
+            logger.info(f"📄 Лист {sheet}: {timings[sheet] * 1000:.0f} мс")
+        
+        self.sheet_cache = frames
+        self.sheet_timings = timings
+        self.sheet_name = target_sheet
+        self.df_cache = frames[target_sheet]
+        self.sheet_shape = self.df_cache.shape
+        return self.df_cache
+
+    def _load_csv_sheet(self):
+        """Разобрать CSV-выгрузку одного листа"""
+        sheet = self.source_sheet or self.sheet_env or os.path.splitext(os.path.basename(self.excel_file))[0]
+        start = time.perf_counter()
+        df = _read_csv_sheet(self.excel_file)
+        elapsed = time.perf_counter() - start
+        logger.info(f"📄 Лист {sheet} (CSV): {elapsed * 1000:.0f} мс")
+        
+        self.sheet_cache = {sheet: df}
+        self.sheet_timings = {sheet: elapsed}
+        self.sheet_name = sheet
+        self.df_cache = df
+        self.sheet_shape = df.shape
+        return df
+
+    def _sheet_view(self, sheet):
+        """Копия бота, которая читает расписание другого листа той же книги"""
+        view = copy.copy(self)
+        view.df_cache = self.sheet_cache[sheet]
+        view.sheet_name = sheet
+        view.week_info_cache = None
+        view.schedule_cache = None
+        view.time_grid_cache = None
+        view.layout_cache = None
+        view.render_cache = {}
+        view.page_cache = {}
+        view.date_index_cache = None
+        view._data_lock = threading.RLock()
+        return view
+
+    def get_sheet_schedules(self):
+        """Скомпилированное расписание каждого листа потока, ключ — имя листа"""
+        with self._data_lock:
+            default = self.get_schedule_data()
+            cached = self.sheet_schedules_cache
+            if cached is not None and cached[0] == self.data_version:
+                return cached[1]
+            
+            schedules = {}
+            for sheet in self.sheet_cache:
+                if sheet == self.sheet_name:
+                    schedules[sheet] = default
+                else:
+                    schedules[sheet] = self._sheet_view(sheet).get_schedule_data()
+            
+            self.sheet_schedules_cache = (self.data_version, schedules)
+            return schedules
+
+    def get_block_schedules(self):
+        """Скомпилированное расписание каждого блока групп всех листов потоков.
+
+        Ключ — «лист · группа»; блок своей группы берется из get_sheet_schedules.
+        Пока DataFrame нет (отпущены или еще не разобраны), возвращает расписания
+        листов только по своей группе и ничего не кэширует.
+        """
+        with self._data_lock:
+            sheets = self.get_sheet_schedules()
+            cached = self.block_schedules_cache
+            if cached is not None and cached[0] == self.data_version:
+                return cached[1]
+            if not self.sheet_cache:
+                return sheets
+            
+            schedules = {}
+            for sheet, data in sheets.items():
+                view = self if sheet == self.sheet_name else self._sheet_view(sheet)
+                layout = view.get_layout()
+                if not layout or layout['block'] is None:
+                    schedules[sheet] = data
+                    continue
+                for i, block in enumerate(layout['blocks']):
+                    if i == layout['block']:
+                        compiled = data
+                    else:
+                        block_view = self._sheet_view(sheet)
+                        block_view.layout_cache = dict(layout, block=i)
+                        block_view.week_info_cache = view.get_week_info()
+                        compiled = block_view.get_schedule_data()
+                    schedules[f"{sheet} · {block['group'] or f'блок {i + 1}'}"] = compiled
+            
+            self.block_schedules_cache = (self.data_version, schedules)
+            return schedules
+
+    def _blocks_version(self):
+        """Версия для индексов по get_block_schedules: неполные (без других групп) помечаются отдельно"""
+        cached = self.block_schedules_cache
+        if cached is not None and cached[0] == self.data_version:
+            return self.data_version
+        return ('без блоков', self.data_version)
+
     def is_data_loaded(self):
         """Проверка, загружены ли данные"""
-        return self.data_loaded and self.df_cache is not None
+        return self.data_loaded and (self.df_cache is not None or self._is_compiled())
+
+    def _is_compiled(self):
+        """Расписание текущей версии уже скомпилировано"""
+        cached = self.schedule_cache
+        return cached is not None and cached['version'] == self.data_version
+
+    def ensure_schedule(self):
+        """Загрузить и скомпилировать расписание, если его еще нет; True, если оно есть"""
+        if self.data_loaded and self._is_compiled():
+            return True
+        if self.get_dataframe() is None or not self.is_data_loaded():
+            return False
+        return bool(self.get_schedule_data()['weeks'])
+
+    def compact(self):
+        """Скомпилировать все листы и отпустить DataFrame: дальше данные только в компактных записях"""
+        if not self.compact_frames:
+            return False
+        with self._data_lock:
+            if not self.has_schedule() or self.df_cache is None:
+                return False
+            self.get_block_schedules()
+            self.get_date_index()
+            self.df_cache = None
+            self.sheet_cache = {}
+            self.time_grid_cache = None
+        logger.info(f"🗜 DataFrame отпущен, строк в таблице: {len(self.strings)}")
+        return True
 
-    def get_current_academic_week(self):
-        """Получить текущую учебную неделю из расписания"""
+    def get_current_academic_week(self, today=None):
+        """Получить текущую учебную неделю из расписания (или неделю даты today)"""
         try:
             week_info = self.get_week_info()
             if not week_info:
                 return "1"  # По умолчанию первая неделя
             
             # Получаем текущую дату
-            today = pd.Timestamp.now().normalize()
+            today = pd.Timestamp(today) if today is not None else pd.Timestamp.now().normalize()
             
             # Ищем неделю, которая содержит текущую дату
             for week_num, info in week_info.items():
@@ -357,8 +1144,8 @@ class ScheduleBot:
             week_data = week_info[week_number]
             monday_col = week_data['columns'][0]  # Первый столбец - понедельник
             
-            # Ищем дату в строке 4 (индекс 3) для понедельника
-            date_cell = df.iloc[3, monday_col]
+            # Ищем дату в строке заголовков недель для понедельника
+            date_cell = df.iloc[self.get_layout()['header_row'], monday_col]
             if pd.notna(date_cell):
                 date_str = str(date_cell).strip()
                 # Пытаемся извлечь дату
@@ -400,12 +1187,12 @@ class ScheduleBot:
             logger.error(f"❌ Ошибка получения даты дня: {e}")
             return ""
 
-    def get_current_week_and_day(self):
+    def get_current_week_and_day(self, today=None):
         """Получить текущую неделю и день с правильной логикой"""
-        week_number = self.get_current_academic_week()
+        week_number = self.get_current_academic_week(today)
         
         # Текущий день недели (0-понедельник, 6-воскресенье)
-        current_day = pd.Timestamp.now().dayofweek
+        current_day = (pd.Timestamp(today) if today is not None else pd.Timestamp.now()).dayofweek
         if current_day >= 6:  # Воскресенье
             current_day = 0   # Показываем понедельник
             # Если воскресенье, переходим к следующей неделе
@@ -428,10 +1215,14 @@ class ScheduleBot:
             if df is None or len(df.columns) == 0:
                 return {}
             
+            layout = self.get_layout()
+            if layout is None:
+                return {}
+            
             week_info = {}
-            # Быстрый поиск недель в строке 4
-            for col in range(min(50, len(df.columns))):  # Ограничиваем поиск
-                cell_value = df.iloc[3, col]
+            # Заголовки недель из найденной раскладки листа
+            for col in layout['week_columns']:
+                cell_value = df.iloc[layout['header_row'], col]
                 if pd.notna(cell_value) and 'неделя' in str(cell_value).lower():
                     week_text = str(cell_value)
                     week_num, week_type, date_range = self._parse_week_info(week_text)
@@ -453,6 +1244,31 @@ class ScheduleBot:
             logger.error(f"❌ Ошибка получения информации о неделях: {e}")
             return {}
 
+    def get_layout(self):
+        """Раскладка листа: строка заголовков, столбцы недель и блок группы"""
+        if self.layout_cache is not None:
+            return self.layout_cache
+        
+        df = self.get_dataframe()
+        if df is None:
+            return None
+        
+        start = time.perf_counter()
+        layout, cached = self.layouts.get(df, self.group_env)
+        if layout is None:
+            logger.warning("⚠️ Раскладка листа не найдена")
+            return None
+        
+        source = "из кэша" if cached else "найдена"
+        block = layout['blocks'][layout['block']] if layout['block'] is not None else None
+        rows = f"{block['start']}-{block['end']}" if block else "нет"
+        logger.info(
+            f"📐 Раскладка {source} за {(time.perf_counter() - start) * 1000:.0f} мс: "
+            f"заголовки в строке {layout['header_row']}, недель {len(layout['week_columns'])}, блок строк {rows}"
+        )
+        self.layout_cache = layout
+        return layout
+
     def _parse_week_info(self, week_text):
         """Быстрый парсинг информации о неделе с датами"""
         week_text_lower = week_text.lower()
@@ -483,7 +1299,7 @@ class ScheduleBot:
             if df is None:
                 return []
             
-            return [header_col + i for i in range(6) if header_col + i < len(df.columns)]
+            return week_day_columns(self.get_layout(), header_col, len(df.columns))
         except:
             return []
 
@@ -504,23 +1320,27 @@ class ScheduleBot:
             logger.error(f"❌ Неожиданная ошибка: {e}")
             return False
 
+    async def post_init(self, application):
+        """Перед началом опроса: меню команд и прогрев расписания в пределах WARMUP_TIMEOUT"""
+        self.loop_monitor.start()
+        self.reminders.attach(application.bot)
+        self.reminders.start(self.refresh_reminders)
+        await asyncio.gather(self.setup_commands(application), self.wait_warm_up())
+
+    async def wait_warm_up(self):
+        """Прогреть расписание в потоке; ждать не дольше WARMUP_TIMEOUT, дальше прогрев идет в фоне"""
+        warming = asyncio.get_event_loop().run_in_executor(None, self.warm_up)
+        try:
+            await asyncio.wait_for(asyncio.shield(warming), self.warmup_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏳ Прогрев не уложился в {self.warmup_timeout:.0f} с, продолжается в фоне")
+
     async def setup_commands(self, application):
         """Настройка меню команд"""
-        commands = [
-            BotCommand("start", "🚀 Запустить бота"),
-            BotCommand("menu", "📋 Главное меню"),
-            BotCommand("refresh", "🔄 Обновить расписание"),
-            BotCommand("week", "📅 Выбрать неделю"),
-            BotCommand("today", "📆 Расписание на сегодня"),
-            BotCommand("tomorrow", "📆 Расписание на завтра"),
-            BotCommand("monday", "📆 Понедельник"),
-            BotCommand("tuesday", "📆 Вторник"),
-            BotCommand("wednesday", "📆 Среда"),
-            BotCommand("thursday", "📆 Четверг"),
-            BotCommand("friday", "📆 Пятница"),
-            BotCommand("saturday", "📆 Суббота"),
-            BotCommand("debug", "🐛 Отладочная информация"),
-        ]
+        commands = [BotCommand(command, description) for command, _, _, description in COMMANDS]
+        enabled = application.bot_data.get('commands')
+        if enabled is not None:
+            commands = [command for command in commands if command.command in enabled]
         
         await application.bot.set_my_commands(commands)
         await application.bot.set_chat_menu_button(menu_button=MenuButtonCommands())
@@ -528,6 +1348,12 @@ class ScheduleBot:
     @rate_limit(limit_seconds=2)
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /start с автоматическим обновлением"""
+        if self.has_schedule():
+            # Сразу показываем сохраненное расписание, обновление идет в фоне
+            self.revalidate_in_background()
+            await self.show_main_menu(update, context)
+            return
+        
         # Отправляем сообщение о начале загрузки
         loading_message = await update.message.reply_text(
             "🔄 <b>Загружаю актуальное расписание...</b>\n"
@@ -535,8 +1361,8 @@ class ScheduleBot:
             parse_mode='HTML'
         )
         
-        # Принудительно обновляем расписание
-        success = await asyncio.get_event_loop().run_in_executor(None, self.download_schedule_from_website)
+        # Первая загрузка: сохраненного расписания еще нет
+        success = await asyncio.get_event_loop().run_in_executor(None, self.revalidate, True)
         
         if success:
             await loading_message.edit_text(
@@ -550,12 +1376,44 @@ class ScheduleBot:
         else:
             await loading_message.edit_text(
                 "❌ <b>Не удалось загрузить расписание</b>\n"
-                "Используется старая версия. Попробуйте обновить позже.",
+                "Попробуйте обновить позже.",
                 parse_mode='HTML'
             )
             await asyncio.sleep(1)
             await self.show_main_menu(update, context)
 
+    def _data_status(self):
+        """Статус данных для главного меню"""
+        status = "✅ Актуальное" if self.data_loaded else "⚠️ Старое"
+        if self.last_download_time:
+            status += f" (от {self.last_download_time:%d.%m %H:%M})"
+        return status
+
+    def _refresh_failed_text(self):
+        """Сообщение о неудачном обновлении с учетом уже сохраненного расписания"""
+        if self.has_schedule() and self.last_download_time:
+            return (
+                "❌ Не удалось обновить расписание\n"
+                f"Показываю сохраненную версию от {self.last_download_time:%d.%m %H:%M}"
+            )
+        return "❌ Не удалось обновить расписание"
+
+    def _main_menu_text(self, context):
+        """Текст главного меню: статус данных и команды из общего списка COMMANDS"""
+        enabled = context.bot_data.get('commands') if context is not None else None
+        lines = ''.join(
+            f"• /{command}{' ' + arguments if arguments else ''} - {hint}\n"
+            for command, arguments, hint, _ in COMMANDS
+            if hint and (enabled is None or command in enabled)
+        )
+        return (
+            f"👋 <b>Бот расписания 1-КРД-6</b>\n\n"
+            f"📊 <b>Статус данных:</b> {self._data_status()}\n\n"
+            "🚀 <b>Доступные команды:</b>\n"
+            f"{lines}\n"
+            "👇 <i>Или используйте кнопки ниже:</i>"
+        )
+
     async def show_main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, message_text=None):
         """Показать главное меню"""
         keyboard = [
@@ -566,20 +1424,7 @@ class ScheduleBot:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        status = "✅ Актуальное" if self.data_loaded else "⚠️ Старое"
-        
-        text = message_text or (
-            f"👋 <b>Бот расписания 1-КРД-6</b>\n\n"
-            f"📊 <b>Статус данных:</b> {status}\n\n"
-            "🚀 <b>Доступные команды:</b>\n"
-            "• /menu - Главное меню\n"
-            "• /refresh - Обновить расписание\n"
-            "• /week - Выбрать неделю\n"
-            "• /today - Сегодня\n• /tomorrow - Завтра\n"
-            "• /monday - Пн\n• /tuesday - Вт\n• /wednesday - Ср\n"
-            "• /thursday - Чт\n• /friday - Пт\n• /saturday - Сб\n\n"
-            "👇 <i>Или используйте кнопки ниже:</i>"
-        )
+        text = message_text or self._main_menu_text(context)
         
         if update.message:
             await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
@@ -596,7 +1441,7 @@ class ScheduleBot:
         """Команда /refresh"""
         message = await update.message.reply_text("🔄 Обновляю расписание...")
         
-        success = await asyncio.get_event_loop().run_in_executor(None, self.download_schedule_from_website)
+        success = await asyncio.get_event_loop().run_in_executor(None, self.revalidate, True)
         
         if success:
             await message.edit_text("✅ Расписание обновлено!")
@@ -604,7 +1449,98 @@ class ScheduleBot:
             # Показываем главное меню после обновления
             await self.show_main_menu(update, context)
         else:
-            await message.edit_text("❌ Не удалось обновить расписание")
+            await message.edit_text(self._refresh_failed_text())
+
+    @rate_limit(limit_seconds=2)
+    async def find(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /find <текст> - поиск пар по предмету, преподавателю или аудитории"""
+        query = ' '.join(context.args or []).strip()
+        if not query:
+            await update.message.reply_text(
+                "🔎 Укажите, что искать: /find <i>предмет, фамилия или аудитория</i>",
+                parse_mode='HTML'
+            )
+            return
+        
+        if not self.is_data_loaded():
+            await update.message.reply_text(
+                "❌ Данные не загружены. Сначала используйте /start или /refresh",
+                parse_mode='HTML'
+            )
+            return
+        
+        text = await asyncio.get_event_loop().run_in_executor(None, self.find_pairs_text, query)
+        await update.message.reply_text(text, parse_mode='HTML')
+
+    @rate_limit(limit_seconds=2)
+    async def free(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /free [дата] [пара] - свободные аудитории"""
+        if not self.is_data_loaded():
+            await update.message.reply_text(
+                "❌ Данные не загружены. Сначала используйте /start или /refresh",
+                parse_mode='HTML'
+            )
+            return
+        
+        text = await asyncio.get_event_loop().run_in_executor(None, self.free_rooms_text, context.args or [])
+        await update.message.reply_text(text, parse_mode='HTML')
+
+    @rate_limit(limit_seconds=2)
+    async def teacher(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /teacher <фамилия> [неделя] - расписание преподавателя по всем группам"""
+        if not context.args:
+            await update.message.reply_text(
+                "👨‍🏫 Укажите преподавателя: /teacher <i>фамилия</i> [неделя]",
+                parse_mode='HTML'
+            )
+            return
+        
+        if not self.is_data_loaded():
+            await update.message.reply_text(
+                "❌ Данные не загружены. Сначала используйте /start или /refresh",
+                parse_mode='HTML'
+            )
+            return
+        
+        text = await asyncio.get_event_loop().run_in_executor(None, self.teacher_text, context.args)
+        await update.message.reply_text(text, parse_mode='HTML')
+
+    @rate_limit(limit_seconds=2)
+    async def show_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /history [дата] [пара] - что и когда менялось в расписании дня"""
+        text = await asyncio.get_event_loop().run_in_executor(None, self.history_text, context.args or [])
+        await update.message.reply_text(text, parse_mode='HTML')
+
+    @rate_limit(limit_seconds=2)
+    async def remind(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /remind [1|2|обе|off] - напоминания за 10 минут до пары"""
+        chat_id = update.effective_chat.id
+        bot_id = context.bot.id
+        choice = context.args[0].lower() if context.args else None
+        lead = self.reminders.lead
+        store = self.reminders.store
+        # Подписки хранятся в файле: чтение и запись — в пуле потоков
+        loop = asyncio.get_event_loop()
+        
+        if choice in ('off', 'выкл', 'stop'):
+            if await loop.run_in_executor(None, store.unsubscribe, bot_id, chat_id):
+                text = "🔕 Напоминания о парах выключены"
+            else:
+                text = "🔕 Напоминания и так выключены"
+        elif choice in ('1', '2', '0', 'обе', 'all', 'on', 'вкл'):
+            subgroup = int(choice) if choice.isdigit() else 0
+            await loop.run_in_executor(None, store.subscribe, bot_id, chat_id, subgroup)
+            text = (f"⏰ Напоминания включены: {SUBGROUPS[subgroup]}, за {lead} минут до пары\n"
+                    f"Выключить: /remind off")
+        else:
+            subgroup = await loop.run_in_executor(None, store.subgroup, bot_id, chat_id)
+            status = f"включены ({SUBGROUPS[subgroup]})" if subgroup is not None else "выключены"
+            text = (f"⏰ <b>Напоминания за {lead} минут до пары</b>: {status}\n\n"
+                    f"/remind 1 — 1 подгруппа\n"
+                    f"/remind 2 — 2 подгруппа\n"
+                    f"/remind обе — обе подгруппы\n"
+                    f"/remind off — выключить")
+        await update.message.reply_text(text, parse_mode='HTML')
 
     @rate_limit(limit_seconds=2)
     async def week(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -623,46 +1559,30 @@ class ScheduleBot:
     @rate_limit(limit_seconds=2)
     async def today(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /today - расписание на сегодня"""
-        if not self.is_data_loaded():
+        view = await self.read_view()
+        if view is None:
             await update.message.reply_text(
                 "❌ Данные не загружены. Сначала используйте /start или /refresh",
                 parse_mode='HTML'
             )
             return
         
-        week_number, day_idx = self.get_current_week_and_day()
-        await self.show_day_schedule_standalone(update, week_number, day_idx, "сегодня")
+        _, week_number, day_idx = self.view_today(view)
+        await self.show_day_schedule_standalone(update, week_number, day_idx, "сегодня", view)
 
     @rate_limit(limit_seconds=2)
     async def tomorrow(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /tomorrow - расписание на завтра"""
-        if not self.is_data_loaded():
+        view = await self.read_view()
+        if view is None:
             await update.message.reply_text(
                 "❌ Данные не загружены. Сначала используйте /start или /refresh",
                 parse_mode='HTML'
             )
             return
         
-        week_number, current_day = self.get_current_week_and_day()
-        
-        # Определяем день для завтра
-        tomorrow_idx = current_day + 1
-        week_change = False
-        
-        if tomorrow_idx >= 6:  # Если завтра воскресенье или после субботы
-            tomorrow_idx = 0
-            week_change = True
-        
-        # Если переходим на следующую неделю
-        if week_change:
-            week_info = self.get_week_info()
-            if week_info:
-                weeks = sorted(week_info.keys(), key=int)
-                current_index = weeks.index(week_number)
-                if current_index < len(weeks) - 1:
-                    week_number = weeks[current_index + 1]
-        
-        await self.show_day_schedule_standalone(update, week_number, tomorrow_idx, "завтра")
+        week_number, tomorrow_idx = self.view_tomorrow(view)
+        await self.show_day_schedule_standalone(update, week_number, tomorrow_idx, "завтра", view)
 
     @rate_limit(limit_seconds=2)
     async def monday(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -696,7 +1616,8 @@ class ScheduleBot:
 
     async def show_day_by_name(self, update: Update, day_idx: int, day_name: str):
         """Показать расписание по названию дня"""
-        if not self.is_data_loaded():
+        view = await self.read_view()
+        if view is None:
             await update.message.reply_text(
                 "❌ Данные не загружены. Сначала используйте /start или /refresh",
                 parse_mode='HTML'
@@ -704,21 +1625,17 @@ class ScheduleBot:
             return
         
         # Для дней недели используем текущую учебную неделю
-        week_number = self.get_current_academic_week()
-        await self.show_day_schedule_standalone(update, week_number, day_idx, day_name)
+        week_number = self.view_today(view)[0]
+        await self.show_day_schedule_standalone(update, week_number, day_idx, day_name, view)
 
-    async def show_day_schedule_standalone(self, update: Update, week_number: str, day_idx: int, day_name: str):
+    async def show_day_schedule_standalone(self, update: Update, week_number: str, day_idx: int, day_name: str, view=None):
         """Показать расписание дня как отдельное сообщение"""
         loading_message = await update.message.reply_text(f"⏳ Загружаю расписание на {day_name}...")
         
-        schedule = await asyncio.get_event_loop().run_in_executor(
-            None, self.get_1krd6_schedule, week_number, day_idx
-        )
+        schedule = await self.rendered_schedule(week_number, day_idx)
         
         # Добавляем информацию о неделе
-        week_info = self.get_week_info()
-        week_data = week_info.get(week_number, {})
-        week_type = week_data.get('type', '')
+        week_type = self.view_week(view or await self.read_view(), week_number).get('type', '')
         
         full_schedule = f"📅 <b>Неделя {week_number}</b> ({week_type})\n{schedule}"
         
@@ -790,6 +1707,8 @@ class ScheduleBot:
                 await self.handle_day_selection(query, context, query.data)
             elif query.data.startswith("all_days_"):
                 await self.handle_all_days(query, context, query.data.replace("all_days_", ""))
+            elif query.data.startswith("image_week_"):
+                await self.handle_week_image(query, context, query.data.replace("image_week_", ""))
             elif query.data.startswith("quick_day_"):
                 await self.handle_quick_day_selection(query, context, query.data.replace("quick_day_", ""))
             # Обработка быстрых команд из меню дней
@@ -820,52 +1739,34 @@ class ScheduleBot:
     async def handle_quick_today(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик быстрой команды 'Сегодня'"""
         # Проверяем загрузку данных с правильным сообщением
-        df = self.get_dataframe()
-        if df is None or not self.is_data_loaded():
+        view = await self.read_view()
+        if view is None:
             await self.safe_edit_message(
                 query, 
                 "❌ Данные не загружены. Используйте /start или /refresh для загрузки расписания."
             )
             return
         
-        week_number, day_idx = self.get_current_week_and_day()
-        await self.show_quick_day_schedule(query, week_number, day_idx, "сегодня")
+        _, week_number, day_idx = self.view_today(view)
+        await self.show_quick_day_schedule(query, week_number, day_idx, "сегодня", view)
 
     async def handle_quick_tomorrow(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик быстрой команды 'Завтра'"""
-        df = self.get_dataframe()
-        if df is None or not self.is_data_loaded():
+        view = await self.read_view()
+        if view is None:
             await self.safe_edit_message(
                 query, 
                 "❌ Данные не загружены. Используйте /start или /refresh для загрузки расписания."
             )
             return
         
-        week_number, current_day = self.get_current_week_and_day()
-        
-        # Определяем день для завтра
-        tomorrow_idx = current_day + 1
-        week_change = False
-        
-        if tomorrow_idx >= 6:  # Если завтра воскресенье или после субботы
-            tomorrow_idx = 0
-            week_change = True
-        
-        # Если переходим на следующую неделю
-        if week_change:
-            week_info = self.get_week_info()
-            if week_info:
-                weeks = sorted(week_info.keys(), key=int)
-                current_index = weeks.index(week_number)
-                if current_index < len(weeks) - 1:
-                    week_number = weeks[current_index + 1]
-        
-        await self.show_quick_day_schedule(query, week_number, tomorrow_idx, "завтра")
+        week_number, tomorrow_idx = self.view_tomorrow(view)
+        await self.show_quick_day_schedule(query, week_number, tomorrow_idx, "завтра", view)
 
     async def handle_quick_day(self, query, context: ContextTypes.DEFAULT_TYPE, day_idx: int, day_name: str):
         """Обработчик быстрой команды дня недели"""
-        df = self.get_dataframe()
-        if df is None or not self.is_data_loaded():
+        view = await self.read_view()
+        if view is None:
             await self.safe_edit_message(
                 query, 
                 "❌ Данные не загружены. Используйте /start или /refresh для загрузки расписания."
@@ -873,21 +1774,17 @@ class ScheduleBot:
             return
         
         # Для дней недели используем текущую учебную неделю
-        week_number = self.get_current_academic_week()
-        await self.show_quick_day_schedule(query, week_number, day_idx, day_name)
+        week_number = self.view_today(view)[0]
+        await self.show_quick_day_schedule(query, week_number, day_idx, day_name, view)
 
-    async def show_quick_day_schedule(self, query, week_number: str, day_idx: int, day_name: str):
+    async def show_quick_day_schedule(self, query, week_number: str, day_idx: int, day_name: str, view=None):
         """Показать расписание дня в меню быстрых команд"""
         await self.safe_edit_message(query, f"⏳ Загружаю расписание на {day_name}...")
         
-        schedule = await asyncio.get_event_loop().run_in_executor(
-            None, self.get_1krd6_schedule, week_number, day_idx
-        )
+        schedule = await self.rendered_schedule(week_number, day_idx)
         
         # Добавляем информацию о неделе
-        week_info = self.get_week_info()
-        week_data = week_info.get(week_number, {})
-        week_type = week_data.get('type', '')
+        week_type = self.view_week(view or await self.read_view(), week_number).get('type', '')
         
         full_schedule = f"📅 <b>Неделя {week_number}</b> ({week_type})\n{schedule}"
         
@@ -903,7 +1800,7 @@ class ScheduleBot:
     async def handle_refresh(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик обновления расписания"""
         await self.safe_edit_message(query, "🔄 Обновляю расписание...")
-        success = await asyncio.get_event_loop().run_in_executor(None, self.download_schedule_from_website)
+        success = await asyncio.get_event_loop().run_in_executor(None, self.revalidate, True)
         
         if success:
             await self.safe_edit_message(query, "✅ Расписание обновлено!")
@@ -911,7 +1808,7 @@ class ScheduleBot:
             # Используем query для перехода в главное меню
             await self.show_main_menu_from_query(query, context)
         else:
-            await self.safe_edit_message(query, "❌ Не удалось обновить расписание")
+            await self.safe_edit_message(query, self._refresh_failed_text())
 
     async def show_main_menu_from_query(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Показать главное меню из callback query"""
@@ -923,21 +1820,7 @@ class ScheduleBot:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        status = "✅ Актуальное" if self.data_loaded else "⚠️ Старое"
-        
-        text = (
-            f"👋 <b>Бот расписания 1-КРД-6</b>\n\n"
-            f"📊 <b>Статус данных:</b> {status}\n\n"
-            "🚀 <b>Доступные команды:</b>\n"
-            "• /menu - Главное меню\n"
-            "• /refresh - Обновить расписание\n"
-            "• /week - Выбрать неделю\n"
-            "• /today - Сегодня\n• /tomorrow - Завтра\n"
-            "• /monday - Пн\n• /tuesday - Вт\n• /wednesday - Ср\n"
-            "• /thursday - Чт\n• /friday - Пт\n• /saturday - Сб\n\n"
-            "👇 <i>Или используйте кнопки ниже:</i>"
-        )
-        
+        text = self._main_menu_text(context)
         await self.safe_edit_message(query, text, reply_markup)
 
     async def show_quick_days(self, query, context: ContextTypes.DEFAULT_TYPE):
@@ -973,15 +1856,15 @@ class ScheduleBot:
 
     async def handle_quick_day_selection(self, query, context: ContextTypes.DEFAULT_TYPE, day_data):
         """Обработчик быстрого выбора дня"""
-        df = self.get_dataframe()
-        if df is None or not self.is_data_loaded():
+        view = await self.read_view()
+        if view is None:
             await self.safe_edit_message(
                 query, 
                 "❌ Данные не загружены. Используйте /start или /refresh для загрузки расписания."
             )
             return
         
-        week_number, current_day = self.get_current_week_and_day()
+        _, week_number, current_day = self.view_today(view)
         
         if day_data == "today":
             day_idx = current_day
@@ -996,14 +1879,10 @@ class ScheduleBot:
         
         await self.safe_edit_message(query, f"⏳ Загружаю расписание на {day_name}...")
         
-        schedule = await asyncio.get_event_loop().run_in_executor(
-            None, self.get_1krd6_schedule, week_number, day_idx
-        )
+        schedule = await self.rendered_schedule(week_number, day_idx)
         
         # Добавляем информацию о неделе
-        week_info = self.get_week_info()
-        week_data = week_info.get(week_number, {})
-        week_type = week_data.get('type', '')
+        week_type = self.view_week(view, week_number).get('type', '')
         
         full_schedule = f"📅 <b>Неделя {week_number}</b> ({week_type})\n{schedule}"
         
@@ -1054,14 +1933,15 @@ class ScheduleBot:
             keyboard.append([InlineKeyboardButton(day_name, callback_data=f"day_{week_number}_{day_idx}")])
         
         keyboard.append([InlineKeyboardButton("📅 Вся неделя", callback_data=f"all_days_{week_number}")])
+        if self.week_images.enabled:
+            keyboard.append([InlineKeyboardButton("🖼 Неделя картинкой", callback_data=f"image_week_{week_number}")])
         keyboard.append([InlineKeyboardButton("📆 Быстрый доступ по дням", callback_data="quick_days")])
         keyboard.append([InlineKeyboardButton("🔄 Другая неделя", callback_data="select_week")])
         keyboard.append([InlineKeyboardButton("📋 Главное меню", callback_data="back_to_menu")])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        week_info = self.get_week_info()
-        week_data = week_info.get(week_number, {})
+        week_data = self.view_week(await self.read_view(), week_number)
         
         await self.safe_edit_message(
             query,
@@ -1078,9 +1958,7 @@ class ScheduleBot:
         
         await self.safe_edit_message(query, "⏳ Загружаю расписание...")
         
-        schedule = await asyncio.get_event_loop().run_in_executor(
-            None, self.get_1krd6_schedule, week_number, day_idx
-        )
+        schedule = await self.rendered_schedule(week_number, day_idx)
         
         keyboard = [
             [InlineKeyboardButton("📅 Другой день", callback_data=f"week_{week_number}")],
@@ -1092,15 +1970,23 @@ class ScheduleBot:
         
         await self.safe_edit_message(query, schedule, reply_markup)
 
-    async def handle_all_days(self, query, context: ContextTypes.DEFAULT_TYPE, week_number):
-        """Обработчик всей недели"""
-        await self.safe_edit_message(query, "⏳ Загружаю расписание на неделю...")
+    async def handle_all_days(self, query, context: ContextTypes.DEFAULT_TYPE, week_data):
+        """Обработчик всей недели: all_days_{неделя}[_{страница}], показывается одна страница"""
+        week_number, _, page = week_data.partition('_')
+        page = int(page) if page.isdigit() else 0
         
-        schedule = await asyncio.get_event_loop().run_in_executor(
-            None, self.get_full_week_schedule, week_number
-        )
+        schedule, pages = await self.rendered_week_page(week_number, page)
         
-        keyboard = [
+        keyboard = []
+        if pages > 1:
+            page = min(page, pages - 1)
+            navigation = []
+            if page > 0:
+                navigation.append(InlineKeyboardButton("◀️ Назад", callback_data=f"all_days_{week_number}_{page - 1}"))
+            if page < pages - 1:
+                navigation.append(InlineKeyboardButton("Дальше ▶️", callback_data=f"all_days_{week_number}_{page + 1}"))
+            keyboard.append(navigation)
+        keyboard += [
             [InlineKeyboardButton("📅 Конкретный день", callback_data=f"week_{week_number}")],
             [InlineKeyboardButton("📆 Быстрый доступ по дням", callback_data="quick_days")],
             [InlineKeyboardButton("🔄 Другая неделя", callback_data="select_week")],
@@ -1110,6 +1996,59 @@ class ScheduleBot:
         
         await self.safe_edit_message(query, schedule, reply_markup)
 
+    async def handle_week_image(self, query, context: ContextTypes.DEFAULT_TYPE, week_number):
+        """Обработчик недели картинкой: загруженная картинка отправляется по file_id"""
+        week_data = self.view_week(await self.read_view(), week_number)
+        if not week_data:
+            await self.safe_edit_message(query, "❌ Неделя не найдена")
+            return
+        
+        keyboard = [
+            [InlineKeyboardButton("📅 Конкретный день", callback_data=f"week_{week_number}")],
+            [InlineKeyboardButton("🔄 Другая неделя", callback_data="select_week")],
+            [InlineKeyboardButton("📋 Главное меню", callback_data="back_to_menu")],
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        caption = (f"📅 <b>Неделя {week_number}</b> ({week_data['type']})\n"
+                   f"📆 {week_data['description']}")
+        
+        try:
+            await self.send_week_image(context.bot, query.message.chat_id, week_data, caption, reply_markup)
+        except ImportError as e:
+            self.week_images.disable(e)
+            await self.handle_all_days(query, context, week_number)
+        except Exception as e:
+            # Картинка не получилась: та же неделя текстом
+            logger.error(f"❌ Ошибка картинки недели: {e}")
+            await self.handle_all_days(query, context, week_number)
+
+    async def send_week_image(self, bot, chat_id, week_data, caption, reply_markup=None):
+        """Отправить неделю картинкой: по file_id, а если его нет — нарисовать и загрузить один раз"""
+        images = self.week_images
+        grid = week_grid(self.group_env or "1-КРД-6", week_data)
+        key = grid_key(grid)
+        
+        file_id = images.file_id(bot.id, key)
+        if file_id is None:
+            async with images.lock(bot.id, key):
+                # Пока ждали, картинку мог загрузить параллельный запрос
+                file_id = images.file_id(bot.id, key)
+                if file_id is None:
+                    png = await images.render(grid, key)
+                    message = await bot.send_photo(chat_id, png, caption=caption,
+                                                   reply_markup=reply_markup, parse_mode='HTML')
+                    images.uploaded += 1
+                    images.remember(bot.id, key, message.photo[-1].file_id)
+                    return
+        
+        try:
+            await bot.send_photo(chat_id, file_id, caption=caption, reply_markup=reply_markup, parse_mode='HTML')
+            images.reused += 1
+        except BadRequest as e:
+            logger.warning(f"⚠️ file_id картинки недели не принят, загружаем заново: {e}")
+            images.forget(bot.id, key)
+            await self.send_week_image(bot, chat_id, week_data, caption, reply_markup)
+
     async def handle_debug(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик отладки"""
         debug_info = await asyncio.get_event_loop().run_in_executor(None, self.debug_weeks_info)
@@ -1122,19 +2061,27 @@ class ScheduleBot:
             await query.message.reply_text(f"<pre>{debug_info}</pre>", parse_mode='HTML')
 
     def get_1krd6_schedule(self, week_number="1", day_filter=None):
-        """Оптимизированное получение расписания"""
+        """Оптимизированное получение расписания, готовый текст кэшируется до смены версии данных"""
+        key = (week_number, day_filter)
+        version = self.data_version
+        text = self.render_cache.get(key)
+        if text is not None:
+            return text
         try:
             if day_filter is None:
-                return self.get_full_week_schedule(week_number)
-            return self._get_day_schedule(week_number, day_filter, show_day_header=True)
+                text = self.get_full_week_schedule(week_number)
+            else:
+                text = self._get_day_schedule(week_number, day_filter, show_day_header=True)
         except Exception as e:
             return f"❌ Ошибка: {str(e)}"
+        if not text.startswith("❌") and version == self.data_version:
+            self.render_cache[key] = text
+        return text
 
     def get_full_week_schedule(self, week_number="1"):
         """Оптимизированное получение расписания на неделю"""
         try:
-            df = self.get_dataframe()
-            if df is None:
+            if not self.ensure_schedule():
                 return "❌ Ошибка загрузки данных"
             
             week_info = self.get_week_info()
@@ -1158,61 +2105,123 @@ class ScheduleBot:
         except Exception as e:
             return f"❌ Ошибка: {str(e)}"
 
+    @staticmethod
+    def _week_header(week_number, week_data):
+        return (f"📅 <b>Расписание 1-КРД-6</b>\n"
+                f"🔢 Неделя: {week_number} ({week_data['type']})\n"
+                f"📆 {week_data['description']}\n\n")
+
+    @staticmethod
+    def _split_fragment(text, limit):
+        """Текст дня по границам пар на куски не длиннее limit единиц UTF-16"""
+        chunks, chunk = [], ''
+        for block in re.split(r'(?<=\n\n)', text):
+            if chunk and _utf16_len(chunk + block) > limit:
+                chunks.append(chunk)
+                chunk = ''
+            while _utf16_len(block) > limit:
+                # Одна пара длиннее страницы: режем по строкам
+                lines = block.splitlines(keepends=True)
+                head = ''
+                while lines and _utf16_len(head + lines[0]) <= limit:
+                    head += lines.pop(0)
+                if not head:
+                    head, lines[0] = _cut_html_line(lines[0], limit)
+                chunks.append(head)
+                block = ''.join(lines)
+            chunk += block
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _week_fragments(self, week_number, week_data, day_indexes):
+        """Куски текстов дней недели (тексты дней — из кэша сообщений) не длиннее страницы"""
+        # Запас под строку номера страницы
+        limit = MESSAGE_LIMIT - _utf16_len(self._week_header(week_number, week_data)) - 40
+        for day_idx in day_indexes:
+            text = self.get_1krd6_schedule(week_number, day_idx)
+            if text.startswith("❌"):
+                raise ValueError(text)
+            for chunk_idx, chunk in enumerate(self._split_fragment(text + "\n", limit)):
+                yield day_idx, chunk_idx, chunk
+
+    def get_week_pages(self, week_number):
+        """Разбивка недели на страницы: [[(день, кусок), ...], ...], кэшируется до смены версии данных"""
+        pages = self.page_cache.get(week_number)
+        if pages is not None:
+            return pages
+        version = self.data_version
+        if not self.ensure_schedule():
+            raise ValueError("❌ Ошибка загрузки данных")
+        weeks = self.get_schedule_data()['weeks']
+        if week_number not in weeks:
+            raise ValueError("❌ Неделя не найдена")
+        
+        week_data = weeks[week_number]
+        limit = MESSAGE_LIMIT - _utf16_len(self._week_header(week_number, week_data)) - 40
+        pages, size = [[]], 0
+        for day_idx, chunk_idx, chunk in self._week_fragments(week_number, week_data, range(len(week_data['days']))):
+            length = _utf16_len(chunk)
+            if pages[-1] and size + length > limit:
+                pages.append([])
+                size = 0
+            pages[-1].append((day_idx, chunk_idx))
+            size += length
+        if version == self.data_version:
+            self.page_cache[week_number] = pages
+        return pages
+
+    def get_week_page(self, week_number, page=0, data=None):
+        """(текст страницы недели, число страниц): собирается только из дней этой страницы.
+        
+        data — уже скомпилированное расписание (слой данных read_view), чтобы
+        не брать блокировку данных в цикле событий.
+        """
+        try:
+            pages = self.get_week_pages(week_number)
+            page = max(0, min(page, len(pages) - 1))
+            wanted = set(pages[page])
+            week_data = (data or self.get_schedule_data())['weeks'][week_number]
+            text = self._week_header(week_number, week_data)
+            if len(pages) > 1:
+                text += f"📄 Страница {page + 1} из {len(pages)}\n\n"
+            days = sorted({day_idx for day_idx, _ in wanted})
+            for day_idx, chunk_idx, chunk in self._week_fragments(week_number, week_data, days):
+                if (day_idx, chunk_idx) in wanted:
+                    text += chunk
+            return text, len(pages)
+        except ValueError as e:
+            return str(e), 1
+        except Exception as e:
+            return f"❌ Ошибка: {str(e)}", 1
+
     def _get_day_schedule(self, week_number, day_idx, show_day_header=True):
         """Оптимизированное получение расписания дня с датой"""
         try:
-            df = self.get_dataframe()
-            if df is None:
+            if not self.ensure_schedule():
                 return "❌ Ошибка загрузки данных"
             
-            week_info = self.get_week_info()
-            if not week_info or week_number not in week_info:
+            weeks = self.get_schedule_data()['weeks']
+            if week_number not in weeks:
                 return "❌ Неделя не найдена"
             
-            week_data = week_info[week_number]
-            day_col = week_data['columns'][day_idx]
-            
-            days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-            
-            # Получаем дату дня для ВСЕХ дней
-            day_date = self.get_day_date(week_number, day_idx)
-            date_suffix = f" ({day_date})" if day_date else ""
-            
-            day_schedule = f"<b>{days[day_idx]}{date_suffix}</b>\n" if show_day_header else ""
-            has_classes = False
+            # Дата и пары уже скомпилированы для всех дней
+            day = weeks[week_number]['days'][day_idx]
+            date_suffix = f" ({day['date']})" if day['date'] else ""
             
-            # Оптимизированный поиск времени
-            time_cells = []
-            for row in range(89, 131):  # Ограниченный диапазон
-                cell_value = df.iloc[row, day_col]
-                if pd.notna(cell_value):
-                    cell_str = str(cell_value).strip()
-                    if self._is_time_cell(cell_str):
-                        time_value = self.extract_time_value(cell_value)
-                        time_cells.append({'row': row, 'time': cell_str, 'time_value': time_value})
+            day_schedule = f"<b>{day['name']}{date_suffix}</b>\n" if show_day_header else ""
+            pairs = day['pairs']
             
-            time_cells.sort(key=lambda x: x['time_value'])
-            pair_numbers = self._get_real_pair_numbers([tc['time_value'] for tc in time_cells])
-            
-            for i, time_cell in enumerate(time_cells):
-                if i >= len(pair_numbers):
-                    break
-                    
-                has_classes = True
-                pair_num = pair_numbers[i]
-                day_schedule += f"<b>Пара {pair_num}:</b>\n🕐 {time_cell['time']}\n"
-                
-                row = time_cell['row']
-                # Быстрое получение данных
-                for offset, label in enumerate(['📚', '👨‍🏫', '🏫', '📚', '👨‍🏫', '🏫'], 1):
-                    if row + offset <= 130:
-                        data_value = df.iloc[row + offset, day_col]
-                        if pd.notna(data_value) and str(data_value).strip() not in ['', '(пусто)', 'nan']:
-                            day_schedule += f"{label} {str(data_value).strip()}\n"
-                
+            for pair in pairs:
+                day_schedule += f"<b>Пара {pair.pair}:</b>\n🕐 {pair.time}\n"
+                for lesson in pair.lessons:
+                    for field, label in (('subject', '📚'), ('teacher', '👨‍🏫'), ('room', '🏫')):
+                        value = getattr(lesson, field)
+                        if value:
+                            day_schedule += f"{label} {value}\n"
                 day_schedule += "\n"
             
-            if not has_classes:
+            if not pairs:
                 day_schedule += "❌ Пар нет\n\n"
             
             return day_schedule
@@ -1220,48 +2229,506 @@ class ScheduleBot:
         except Exception as e:
             return f"❌ Ошибка: {str(e)}"
 
-    def _is_time_cell(self, cell_str):
-        """Быстрая проверка времени"""
-        if not cell_str or cell_str in ['', '(пусто)', 'nan']:
+    def _get_day_pairs(self, week_number, day_idx):
+        """Пары дня в виде данных: номер, время и занятия обеих подгрупп"""
+        week_data = self.get_week_info()[week_number]
+        day_col = week_data['columns'][day_idx]
+        
+        grid = self._get_time_grid()
+        col = grid['columns'][day_col]
+        text = grid['text']
+        minutes = grid['minutes'][:, col]
+        
+        # Строки с временем по возрастанию времени (при равенстве — сверху вниз)
+        rows = np.flatnonzero(minutes >= 0)
+        rows = rows[np.argsort(minutes[rows], kind='stable')]
+        
+        pairs = []
+        for row in rows:
+            # Строки под временем: предмет, преподаватель, аудитория для каждой подгруппы
+            values = [
+                text[row + offset, col] if row + offset < len(text) else None
+                for offset in range(1, 7)
+            ]
+            pairs.append({
+                'pair': int(grid['pairs'][row, col]),
+                'time': text[row, col],
+                'minutes': int(minutes[row]),
+                'lessons': [
+                    {'subject': values[0], 'teacher': values[1], 'room': values[2]},
+                    {'subject': values[3], 'teacher': values[4], 'room': values[5]},
+                ],
+            })
+        return pairs
+
+    def _get_time_grid(self):
+        """Сетка блока расписания по всем столбцам недель сразу: текст, минуты и номера пар"""
+        if self.time_grid_cache is not None:
+            return self.time_grid_cache
+        
+        df = self.get_dataframe()
+        layout = self.get_layout()
+        rows = layout['blocks'][layout['block']] if layout['block'] is not None else {'start': 0, 'end': -1}
+        columns = sorted({col for info in self.get_week_info().values() for col in info['columns']})
+        block = df.iloc[rows['start']:rows['end'] + 1, columns].to_numpy(dtype=object)
+        
+        cells = pd.Series(block.ravel())
+        text = cells.astype(str).str.strip()
+        filled = cells.notna() & ~text.isin(['', '(пусто)', 'nan'])
+        
+        parts = text.str.extract(TIME_PATTERN)
+        is_time = filled & parts[0].notna()
+        minutes = np.full(len(cells), -1, dtype=np.int32)
+        minutes[is_time.to_numpy()] = (
+            parts.loc[is_time, 0].astype(np.int32) * 60 + parts.loc[is_time, 1].astype(np.int32)
+        ).to_numpy()
+        
+        shape = block.shape
+        minutes = minutes.reshape(shape)
+        lookup = _pair_lookup()
+        self.time_grid_cache = {
+            'columns': {col: i for i, col in enumerate(columns)},
+            'text': text.where(filled, None).to_numpy(dtype=object).reshape(shape),
+            'minutes': minutes,
+            'pairs': lookup[np.clip(minutes, 0, len(lookup) - 1)],
+        }
+        return self.time_grid_cache
+
+    def get_schedule_data(self):
+        """Разобранное расписание всех недель, кэшируется до смены версии данных"""
+        with self._data_lock:
+            version = self.data_version
+            if self.schedule_cache is not None and self.schedule_cache['version'] == version:
+                return self.schedule_cache
+            
+            days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
+            weeks = {}
+            for week_number, info in self.get_week_info().items():
+                weeks[week_number] = {
+                    'week': week_number,
+                    'type': info['type'],
+                    'description': info['description'],
+                    'date_range': info['date_range'],
+                    'days': [
+                        {
+                            'day': day_idx,
+                            'name': days[day_idx],
+                            'date': self.get_day_date(week_number, day_idx),
+                            'pairs': compile_pairs(self._get_day_pairs(week_number, day_idx), self.strings),
+                        }
+                        for day_idx in range(min(len(days), len(info['columns'])))
+                    ],
+                }
+            
+            self.schedule_cache = {
+                'version': version,
+                'sheet': self.sheet_name,
+                'parse_seconds': self.sheet_timings.get(self.sheet_name),
+                'weeks': weeks,
+            }
+            logger.info(f"✅ Расписание скомпилировано (версия {version})")
+            return self.schedule_cache
+
+    def get_search_index(self):
+        """Поисковый индекс, приведенный к текущей версии данных"""
+        index = self.search_index
+        if index.version != self.data_version:
+            start = time.perf_counter()
+            rebuilt = index.update(self.get_sheet_schedules(), self.data_version)
+            logger.info(f"🔎 Поисковый индекс: дней пересобрано {rebuilt}, слов {len(index)}"
+                        f" за {(time.perf_counter() - start) * 1000:.0f} мс")
+        return index
+
+    def find_pairs_text(self, query, limit=15):
+        """Текст ответа /find: найденные пары с датами"""
+        try:
+            matches = self.get_search_index().search(query)
+        except Exception as e:
+            return f"❌ Ошибка: {str(e)}"
+        
+        query_text = html.escape(query)
+        if not matches:
+            return f"🔎 По запросу «{query_text}» ничего не найдено"
+        
+        text = f"🔎 <b>Найдено пар: {len(matches)}</b> по запросу «{query_text}»\n\n"
+        shown = 0
+        for match in matches[:limit]:
+            if len(text) > 3500:
+                break  # сообщение Telegram ограничено 4096 символами
+            shown += 1
+            pair = match['pair']
+            date_suffix = f" {match['date']}" if match['date'] else ""
+            sheet = f" [{match['sheet']}]" if match['sheet'] != self.sheet_name else ""
+            text += f"<b>{match['name']}{date_suffix}</b>, неделя {match['week']}{sheet}\n"
+            text += f"<b>Пара {pair.pair}:</b> 🕐 {pair.time}\n"
+            for lesson in pair.lessons:
+                for field, label in (('subject', '📚'), ('teacher', '👨‍🏫'), ('room', '🏫')):
+                    value = getattr(lesson, field)
+                    if value:
+                        text += f"{label} {value}\n"
+            text += "\n"
+        if len(matches) > shown:
+            text += f"<i>… и еще {len(matches) - shown}. Уточните запрос.</i>"
+        return text
+
+    def get_room_occupancy(self):
+        """Занятость аудиторий всеми группами всех листов, строится один раз на версию данных"""
+        with self._data_lock:
+            schedules = self.get_block_schedules()
+            version = self._blocks_version()
+            cached = self.rooms_cache
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            occupancy = RoomOccupancy(schedules)
+            self.rooms_cache = (version, occupancy)
+            logger.info(f"🏫 Занятость аудиторий: {len(occupancy.rooms)} аудиторий, {len(occupancy.dates)} дней")
+            return occupancy
+
+    def free_rooms_text(self, args, today=None):
+        """Текст ответа /free: свободные аудитории на дату по парам или на диапазон пар"""
+        try:
+            day, pairs = parse_query(args, today or datetime.now().date())
+            occupancy = self.get_room_occupancy()
+        except ValueError as e:
+            return f"❌ {e}\nПример: /free 05.09 3 или /free завтра 2-3"
+        except Exception as e:
+            return f"❌ Ошибка: {str(e)}"
+        
+        if day not in occupancy.dates:
+            return f"❌ В расписании нет дня {day:%d.%m.%Y}"
+        
+        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+        text = f"🏫 <b>Свободные аудитории</b>\n📆 {days[day.weekday()]} {day:%d.%m.%Y}\n\n"
+        # Диапазон пар — аудитории, свободные на всех парах сразу; без пары — по каждой паре
+        groups = [pairs] if pairs else [[pair] for pair in PAIRS]
+        for group in groups:
+            title = f"Пара {group[0]}" if len(group) == 1 else f"Пары {group[0]}-{group[-1]}"
+            pair_time = occupancy.time_range(group)
+            if pair_time:
+                title += f" 🕐 {pair_time}"
+            rooms = occupancy.free(day, group)
+            text += f"<b>{title}</b>: {', '.join(rooms) or 'нет свободных'}\n"
+        return text
+
+    def get_teacher_timetable(self):
+        """Расписание преподавателей по всем группам всех листов для текущей версии данных"""
+        timetable = self.teachers
+        if timetable.version != self.data_version:
+            schedules = self.get_block_schedules()
+            previous = timetable.version
+            changed = timetable.update(schedules, self._blocks_version())
+            if timetable.version != previous:
+                logger.info(f"👨‍🏫 Преподавателей: {len(timetable)}, изменилось: {len(changed)}")
+        return timetable
+
+    def refresh_reminders(self):
+        """Привести слоты напоминаний к текущей версии расписания (в пуле потоков)"""
+        reminders = self.reminders
+        if reminders.version == self.data_version or not self.ensure_schedule():
+            return
+        start = time.perf_counter()
+        changed = reminders.update(self.get_schedule_data(), self.data_version)
+        if changed:
+            logger.info(f"⏰ Напоминания: дней пересобрано {changed}"
+                        f" за {(time.perf_counter() - start) * 1000:.0f} мс")
+
+    def record_history(self):
+        """Дописать текущую версию расписания в журнал, если дни изменились"""
+        if self.history.version == self.data_version or not self.ensure_schedule():
+            return
+        try:
+            changed = self.history.record(self.get_schedule_data(), self.data_version)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи истории: {e}")
+            return
+        if changed:
+            logger.info(f"📜 История: новая версия, дней изменилось {changed}")
+
+    def history_text(self, args, today=None):
+        """Текст ответа /history: версии дня и изменения между ними"""
+        try:
+            day, pairs = parse_query(args, today or datetime.now().date())
+            versions = self.history.changes(f"{day:%d.%m.%Y}")
+        except ValueError as e:
+            return f"❌ {e}\nПример: /history 05.09 или /history завтра 2"
+        except Exception as e:
+            return f"❌ Ошибка: {str(e)}"
+        
+        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+        text = f"📜 <b>История расписания</b>\n📆 {days[day.weekday()]} {day:%d.%m.%Y}\n\n"
+        if not versions:
+            stats = self.history.stats()
+            since = f" (история ведется с {datetime.fromisoformat(stats['since']):%d.%m.%Y})" if stats['since'] else ""
+            return text + f"Этого дня нет в сохраненных версиях{since}"
+        
+        labels = (('📚', 0), ('👨‍🏫', 1), ('🏫', 2))
+        show = lambda value: html.escape(value) if value else '—'
+        first_at = datetime.fromisoformat(versions[0][0])
+        text += f"🕒 {first_at:%d.%m %H:%M} — день появился в расписании\n"
+        shown = 0
+        for (_, before), (at, after) in zip(versions, versions[1:]):
+            changes = [change for change in diff_day(before, after) if pairs is None or change[0] in pairs]
+            if not changes:
+                continue
+            shown += 1
+            text += f"\n🕒 <b>{datetime.fromisoformat(at):%d.%m %H:%M}</b>\n"
+            if after is None:
+                text += "➖ День убран из расписания\n"
+                continue
+            for number, subgroup, old, new in changes:
+                if subgroup is None:
+                    sign, pair = ('➕', new) if old is None else ('➖', old)
+                    lessons = '; '.join(show(lesson[0]) for lesson in pair[2] if lesson[0])
+                    text += f"{sign} Пара {number} ({show(pair[1])}): {lessons or 'пусто'}\n"
+                elif subgroup == 'time':
+                    text += f"🕐 Пара {number}: {show(old)} → {show(new)}\n"
+                else:
+                    fields = '; '.join(f"{label} {show(old[i])} → {show(new[i])}"
+                                       for label, i in labels if old[i] != new[i])
+                    text += f"✏️ Пара {number}, {subgroup} подгр.: {fields}\n"
+            if len(text) > 3500:
+                text += "<i>… изменения обрезаны</i>"  # сообщение Telegram ограничено 4096 символами
+                break
+        if not shown:
+            text += "\nИзменений не было"
+        return text
+
+    def teacher_text(self, args):
+        """Текст ответа /teacher: неделя преподавателя или список подходящих имен"""
+        args = list(args)
+        week_number = args.pop() if len(args) > 1 and args[-1].isdigit() else None
+        query = ' '.join(args)
+        try:
+            timetable = self.get_teacher_timetable()
+            keys = timetable.find(query)
+        except Exception as e:
+            return f"❌ Ошибка: {str(e)}"
+        
+        if not keys:
+            return f"👨‍🏫 Преподаватель «{html.escape(query)}» не найден"
+        if len(keys) > 1:
+            names = '\n'.join(f"• {timetable.names[key]}" for key in keys[:10])
+            more = f"\n… и еще {len(keys) - 10}" if len(keys) > 10 else ""
+            return f"👨‍🏫 Найдено несколько преподавателей, уточните:\n{names}{more}"
+        
+        key = keys[0]
+        weeks = timetable.weeks(key)
+        week_number = week_number or self.get_current_academic_week()
+        if week_number not in weeks:
+            return (
+                f"👨‍🏫 <b>{timetable.names[key]}</b>\n"
+                f"На неделе {week_number} занятий нет. Недели с занятиями: {', '.join(weeks)}"
+            )
+        return timetable.rendered(key, week_number, self._render_teacher_week)
+
+    def _render_teacher_week(self, key, week_number):
+        """Текст недели преподавателя по дням"""
+        timetable = self.teachers
+        lessons = timetable.lessons(key, week_number)
+        text = f"👨‍🏫 <b>{timetable.names[key]}</b>\n"
+        text += f"🔢 Неделя: {week_number} ({lessons[0]['type']})\n\n"
+        
+        day = None
+        for lesson in lessons:
+            if lesson['day'] != day:
+                day = lesson['day']
+                date_suffix = f" ({lesson['date']})" if lesson['date'] else ""
+                text += f"<b>{lesson['name']}{date_suffix}</b>\n"
+            text += f"<b>Пара {lesson['pair']}:</b> 🕐 {lesson['time']}\n"
+            if lesson['subject']:
+                text += f"📚 {lesson['subject']}\n"
+            if lesson['room']:
+                text += f"🏫 {lesson['room']}\n"
+            text += f"👥 {lesson['sheet']}, подгруппа {lesson['subgroup']}\n\n"
+        return text
+
+    def get_date_index(self):
+        """Дата -> (учебная неделя, неделя и день для «сегодня») по всем дням расписания"""
+        cached = self.date_index_cache
+        version = self.data_version
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        index = {}
+        for info in self.get_week_info().values():
+            dates = re.findall(r'\d{1,2}\.\d{1,2}\.\d{4}', info.get('description', ''))
+            if len(dates) < 2:
+                continue
+            start = datetime.strptime(dates[0], '%d.%m.%Y')
+            end = datetime.strptime(dates[1], '%d.%m.%Y') + timedelta(days=1)
+            day = start
+            while day <= end:
+                week_number, day_idx = self.get_current_week_and_day(day)
+                index[day.date().isoformat()] = [self.get_current_academic_week(day), week_number, day_idx]
+                day += timedelta(days=1)
+        self.date_index_cache = (version, index)
+        return index
+
+    def _view(self):
+        """Скомпилированное расписание и индекс дат текущей версии, если оба готовы"""
+        data, index = self.schedule_cache, self.date_index_cache
+        version = self.data_version
+        if not self.data_loaded or data is None or index is None:
+            return None
+        if data['version'] != version or index[0] != version:
+            return None
+        return data, index[1]
+
+    def _prepare_view(self):
+        """Скомпилировать расписание и индекс дат (в пуле потоков)"""
+        if not self.ensure_schedule():
+            return None
+        self.get_date_index()
+        return self._view()
+
+    async def read_view(self):
+        """Слой данных для обработчиков: (расписание, индекс дат) или None, если расписания нет.
+        
+        Готовый слой читается сразу; если его еще нет, он строится в пуле потоков,
+        а не в цикле событий.
+        """
+        view = self._view()
+        if view is None:
+            view = await asyncio.get_event_loop().run_in_executor(None, self._prepare_view)
+        return view
+
+    async def rendered_schedule(self, week_number, day_filter=None):
+        """Готовый текст из кэша сообщений; промах рисуется в пуле потоков"""
+        text = self.render_cache.get((week_number, day_filter))
+        if text is None:
+            text = await asyncio.get_event_loop().run_in_executor(
+                None, self.get_1krd6_schedule, week_number, day_filter
+            )
+        return text
+
+    async def rendered_week_page(self, week_number, page=0):
+        """Страница недели: из кэша текстов дней в цикле событий, промах — в пуле потоков"""
+        view = self._view()
+        pages = self.page_cache.get(week_number)
+        if view is not None and pages is not None and all((week_number, day_idx) in self.render_cache
+                                                          for day_idx, _ in pages[max(0, min(page, len(pages) - 1))]):
+            return self.get_week_page(week_number, page, view[0])
+        return await asyncio.get_event_loop().run_in_executor(None, self.get_week_page, week_number, page)
+
+    @staticmethod
+    def view_week(view, week_number):
+        """Неделя скомпилированного расписания (тип, описание) или пустой словарь"""
+        if view is None:
+            return {}
+        return view[0]['weeks'].get(week_number, {})
+
+    @staticmethod
+    def view_today(view, today=None):
+        """[учебная неделя, неделя, день] для даты по индексу дат, как get_current_week_and_day"""
+        today = today or date.today()
+        data, index = view
+        entry = index.get(today.isoformat())
+        if entry is not None:
+            return entry
+        
+        # Дата вне расписания: первая неделя, в воскресенье — понедельник следующей
+        weeks = data['weeks']
+        academic_week = sorted(weeks)[0] if weeks else "1"
+        week_number, day_idx = academic_week, today.weekday()
+        if day_idx >= 6:
+            day_idx = 0
+            week_number = ScheduleBot._next_week(weeks, academic_week)
+        return [academic_week, week_number, day_idx]
+
+    @staticmethod
+    def view_tomorrow(view, today=None):
+        """(неделя, день) для завтрашней даты: после субботы — понедельник следующей недели"""
+        _, week_number, current_day = ScheduleBot.view_today(view, today)
+        if current_day + 1 >= 6:
+            return ScheduleBot._next_week(view[0]['weeks'], week_number), 0
+        return week_number, current_day + 1
+
+    @staticmethod
+    def _next_week(weeks, week_number):
+        """Следующая по номеру неделя или та же, если она последняя"""
+        ordered = sorted(weeks, key=int)
+        if week_number in ordered:
+            position = ordered.index(week_number)
+            if position < len(ordered) - 1:
+                return ordered[position + 1]
+        return week_number
+
+    def publish_snapshot(self):
+        """Записать скомпилированное расписание в снимок для процессов-читателей"""
+        if not self.snapshot_path:
+            return False
+        try:
+            from api import snapshot_bodies
+            from snapshot import write_snapshot
+            
+            data = self.get_schedule_data()
+            # Даты вне расписания: понедельник и воскресенье далеко в прошлом
+            index = {
+                'version': data['version'],
+                'sheet': self.sheet_name,
+                # Файл книги, с которого следующий запуск начнет без сети
+                'source': os.path.abspath(self.excel_file),
+                'source_sheet': self.source_sheet,
+                'digest': self.excel_digest,
+                'downloaded_at': self.last_download_time.isoformat() if self.last_download_time else None,
+                'dates': self.get_date_index(),
+                # Для старта без pandas: раскладка и недели листа бота
+                'group': self.group_env,
+                'layout': self.get_layout(),
+                'week_info': self.get_week_info(),
+                'shape': list(self.sheet_shape) if self.sheet_shape else None,
+                'fallback': [
+                    self.get_current_academic_week(datetime(1970, 1, 5)),
+                    self.get_current_week_and_day(datetime(1970, 1, 4))[0],
+                ],
+            }
+            bodies = snapshot_bodies(self.get_sheet_schedules(), self.sheet_name)
+            generation = write_snapshot(self.snapshot_path, index, bodies)
+            logger.info(f"💾 Снимок расписания записан: поколение {generation}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи снимка: {e}")
             return False
-        return bool(re.search(r'\d{1,2}:\d{2}', cell_str))
-
-    def extract_time_value(self, time_str):
-        """Быстрое извлечение времени"""
-        if pd.isna(time_str):
-            return 0
-        time_match = re.search(r'(\d{1,2}):(\d{2})', str(time_str).strip())
-        if time_match:
-            hours = int(time_match.group(1))
-            minutes = int(time_match.group(2))
-            return hours * 60 + minutes
-        return 0
-
-    def _get_real_pair_numbers(self, time_values):
-        """Быстрое определение номеров пар"""
-        if not time_values:
-            return []
-        pair_times = {1: 510, 2: 620, 3: 720, 4: 835, 5: 940, 6: 1045}
-        return [min(pair_times.items(), key=lambda x: abs(x[1] - time_value))[0] for time_value in time_values]
 
     def debug_weeks_info(self):
         """Оптимизированная отладочная информация"""
         try:
-            df = self.get_dataframe()
-            if df is None:
+            if not self.ensure_schedule():
                 return "❌ Ошибка загрузки данных"
             
             debug_text = "🔍 ОТЛАДКА НЕДЕЛЬ:\n\n"
-            debug_text += f"📊 Столбцов: {len(df.columns)}, Строк: {len(df)}\n\n"
             
-            # Быстрый поиск недель
-            week_cells = []
-            for col in range(min(50, len(df.columns))):
-                cell_value = df.iloc[3, col]
-                if pd.notna(cell_value) and 'неделя' in str(cell_value).lower():
-                    week_cells.append((col, str(cell_value)))
+            age = self.data_age()
+            if age is not None:
+                debug_text += f"🕒 Данные от {self.last_download_time:%d.%m %H:%M:%S}, возраст {int(age // 60)} мин\n"
+            if self._refresh_lock.locked():
+                debug_text += "🔄 Идет фоновое обновление\n"
+            for breaker in self.breakers.values():
+                debug_text += f"🔌 {breaker.describe()}\n"
+            for source, (delay, samples, wins, failures) in self.source_latency.summary().items():
+                debug_text += f"🏁 {source}: задержка {delay * 1000:.0f} мс, замеров {samples}, побед {wins}, ошибок {failures}\n"
+            debug_text += "\n"
+            rows, columns = self.sheet_shape
+            debug_text += f"📊 Столбцов: {columns}, Строк: {rows}\n"
+            debug_text += f"🗜 Строк в таблице строк: {len(self.strings)}, DataFrame {'в памяти' if self.df_cache is not None else 'отпущен'}\n\n"
+            
+            if self.sheet_timings:
+                debug_text += f"📄 Лист бота: {self.sheet_name}\n"
+                for sheet, elapsed in self.sheet_timings.items():
+                    debug_text += f"   {sheet}: {elapsed * 1000:.0f} мс\n"
+                debug_text += "\n"
+            
+            layout = self.get_layout()
+            if layout is None:
+                return debug_text + "❌ Раскладка листа не найдена"
+            
+            debug_text += f"📐 Заголовки недель: строка {layout['header_row'] + 1}, дней в неделе: {layout['days_per_week']}\n"
+            for i, block in enumerate(layout['blocks']):
+                marker = "👉" if i == layout['block'] else "  "
+                debug_text += f"{marker} Блок строк {block['start'] + 1}-{block['end'] + 1}: {block['group'] or '—'}\n"
+            debug_text += "\n"
             
-            debug_text += f"📋 Найдено недель: {len(week_cells)}\n"
+            debug_text += f"📋 Найдено недель: {len(layout['week_columns'])}\n"
             
             week_info = self.get_week_info()
             for week_num, info in sorted(week_info.items(), key=lambda x: int(x[0])):
@@ -1272,28 +2739,70 @@ class ScheduleBot:
         except Exception as e:
             return f"❌ Ошибка отладки: {str(e)}"
 
-    def run(self):
-        """Запуск бота"""
-        application = Application.builder().token(self.token).build()
+    def command_handlers(self):
+        """Команды бота: имя -> обработчик"""
+        return {
+            "start": self.start,
+            "menu": self.menu,
+            "refresh": self.refresh,
+            "week": self.week,
+            "today": self.today,
+            "tomorrow": self.tomorrow,
+            "monday": self.monday,
+            "tuesday": self.tuesday,
+            "wednesday": self.wednesday,
+            "thursday": self.thursday,
+            "friday": self.friday,
+            "saturday": self.saturday,
+            "find": self.find,
+            "free": self.free,
+            "teacher": self.teacher,
+            "remind": self.remind,
+            "history": self.show_history,
+            "debug": self.debug,
+        }
+
+    def build_application(self, token=None, commands=None):
+        """Application с обработчиками этого бота; commands — включенные команды (None — все)"""
+        token = token or self.token
+        # Чаты обрабатываются параллельно, обновления одного чата — по порядку
+        processor = ChatOrderedUpdateProcessor(
+            max_in_flight=int(os.getenv('UPDATE_CONCURRENCY', 32)),
+            max_chat_queue=int(os.getenv('UPDATE_CHAT_QUEUE', 8)),
+            name=token.split(':')[0],
+            recorder=get_recorder(),
+        )
+        # Все исходящие вызовы — через общий планировщик с лимитами и повтором после 429
+        scheduler = SendScheduler(
+            rate=float(os.getenv('SEND_RATE', 25)),
+            chat_rate=float(os.getenv('SEND_CHAT_RATE', 1)),
+            chat_burst=int(os.getenv('SEND_CHAT_BURST', 3)),
+            name=processor.name,
+        )
+        builder = Application.builder().token(token).concurrent_updates(processor).rate_limiter(scheduler)
+        api_url = os.getenv('TELEGRAM_API_URL')
+        if api_url:
+            # Локальный Bot API сервер или подмена в бенчмарке
+            builder = builder.base_url(f"{api_url.rstrip('/')}/bot")
+        application = builder.build()
+        application.bot_data['commands'] = commands
         
         # Регистрация команд
-        application.add_handler(CommandHandler("start", self.start))
-        application.add_handler(CommandHandler("menu", self.menu))
-        application.add_handler(CommandHandler("refresh", self.refresh))
-        application.add_handler(CommandHandler("week", self.week))
-        application.add_handler(CommandHandler("today", self.today))
-        application.add_handler(CommandHandler("tomorrow", self.tomorrow))
-        application.add_handler(CommandHandler("monday", self.monday))
-        application.add_handler(CommandHandler("tuesday", self.tuesday))
-        application.add_handler(CommandHandler("wednesday", self.wednesday))
-        application.add_handler(CommandHandler("thursday", self.thursday))
-        application.add_handler(CommandHandler("friday", self.friday))
-        application.add_handler(CommandHandler("saturday", self.saturday))
-        application.add_handler(CommandHandler("debug", self.debug))
+        for name, callback in self.command_handlers().items():
+            if commands is None or name in commands:
+                application.add_handler(CommandHandler(name, callback))
         application.add_handler(CallbackQueryHandler(self.handle_callback))
+        return application
+
+    def run(self):
+        """Запуск бота"""
+        application = self.build_application()
+        
+        # Меню команд и прогрев расписания до приема обновлений
+        application.post_init = self.post_init
         
-        # Настройка меню при запуске
-        application.post_init = self.setup_commands
+        # HTTP: health-check и JSON API расписания
+        keep_alive(self)
         
         logger.info("🤖 Бот запущен...")
         logger.info("📱 Используйте /start или /menu")
@@ -0,0 +1,74 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Автомат защиты источника расписания.
+
+    После failure_threshold ошибок подряд источник «размыкается» и не
+    опрашивается reset_timeout секунд, затем пропускается одна пробная
+    попытка: успех замыкает автомат, ошибка снова размыкает его.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Можно ли сейчас обращаться к источнику"""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"🔌 Источник {self.name} снова доступен")
+            self.failures = 0
+            self.opened_at = None
+            self.last_error = None
+            self._trial = False
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error else None
+            if self._trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial:
+                    logger.warning(f"⚠️ Источник {self.name} отключен на {self.reset_timeout} с: {error}")
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def describe(self):
+        """Состояние для /debug"""
+        text = f"{self.name}: {self.state}, ошибок подряд: {self.failures}"
+        if self.state == self.OPEN:
+            left = self.reset_timeout - (time.monotonic() - self.opened_at)
+            text += f", повтор через {int(left)} с"
+        return text
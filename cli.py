@@ -0,0 +1,162 @@
+"""Разбор и выгрузка книги расписания без Telegram.
+
+Берет локальный xlsx (или CSV-выгрузку листа), проходит те же этапы, что и
+бот — разбор листов, поиск раскладки, недели, компиляция, тексты дней и
+недель — и выгружает все недели и дни в HTML (тексты сообщений бота вместе
+с их разметкой Telegram, экранированные) или JSON (ответы /api/schedule),
+печатая время каждого этапа.
+
+Запуск: python cli.py <книга.xlsx> [--out DIR] [--format html|json] [--all-sheets]
+"""
+import os
+import sys
+import html
+import json
+import time
+import logging
+import argparse
+import tempfile
+from contextlib import contextmanager
+
+from lessons import day_dict
+
+logger = logging.getLogger(__name__)
+
+HTML_PAGE = """<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>{title}</title></head>
+<body><pre style="white-space: pre-wrap; font-family: sans-serif">{body}</pre></body></html>
+"""
+
+
+class Stages:
+    """Время этапов: with stages('имя'): ..."""
+
+    def __init__(self):
+        self.timings = []
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.timings)
+        for name, seconds in self.timings:
+            print(f"  {name:<32} {seconds * 1000:9.1f} мс")
+        print(f"  {'всего':<32} {total * 1000:9.1f} мс")
+
+
+def load_bot(path, sheet=None, group=None, layout_cache=None):
+    """ScheduleBot на локальном файле: без сети, снимка и фоновых обновлений"""
+    from bot import ScheduleBot
+    from layout import LayoutCache
+
+    bot = ScheduleBot(token='0:cli', group=group, sheet=sheet)
+    bot.excel_file = os.path.abspath(path)
+    bot.data_loaded = True
+    bot.snapshot_path = None
+    # По умолчанию раскладка ищется заново, а не берется из кэша прошлых запусков
+    bot.layouts = LayoutCache(layout_cache or os.path.join(tempfile.mkdtemp(), 'layouts.json'))
+    return bot
+
+
+def export_sheet(view, out_dir, fmt, stages):
+    """Скомпилировать лист, нарисовать все недели и дни и записать файлы; вернуть (файлов, ошибок)"""
+    sheet = view.sheet_name
+    with stages(f"{sheet}: раскладка"):
+        layout = view.get_layout()
+    if layout is None:
+        raise SystemExit(f"❌ {sheet}: раскладка листа не найдена")
+    with stages(f"{sheet}: недели"):
+        week_info = view.get_week_info()
+    with stages(f"{sheet}: компиляция"):
+        data = view.get_schedule_data()
+
+    renders = {}
+    with stages(f"{sheet}: отрисовка"):
+        for week, info in sorted(data['weeks'].items(), key=lambda item: int(item[0])):
+            if fmt == 'html':
+                renders[f"week_{week}"] = view.get_1krd6_schedule(week)
+                for day in info['days']:
+                    renders[f"week_{week}_day_{day['day']}"] = view.get_1krd6_schedule(week, day['day'])
+            else:
+                head = {'version': data['version'], 'week': week, 'type': info['type'],
+                        'description': info['description']}
+                renders[f"week_{week}"] = dict(head, days=[day_dict(day) for day in info['days']])
+                for day in info['days']:
+                    renders[f"week_{week}_day_{day['day']}"] = dict(head, day=day_dict(day))
+
+    errors = [name for name, text in renders.items() if isinstance(text, str) and text.startswith("❌")]
+    for name in errors:
+        logger.error(f"❌ {sheet} {name}: {renders[name].splitlines()[0]}")
+
+    with stages(f"{sheet}: запись"):
+        folder = os.path.join(out_dir, sheet.replace(os.sep, '_'))
+        os.makedirs(folder, exist_ok=True)
+        for name, content in renders.items():
+            if fmt == 'html':
+                with open(os.path.join(folder, f"{name}.html"), 'w', encoding='utf-8') as f:
+                    # Тексты ячеек в сообщениях не экранированы: «<» в предмете сломал бы страницу
+                    f.write(HTML_PAGE.format(title=html.escape(f"{sheet} {name}"), body=html.escape(content)))
+            else:
+                with open(os.path.join(folder, f"{name}.json"), 'w', encoding='utf-8') as f:
+                    json.dump(content, f, ensure_ascii=False, indent=1)
+
+    days = sum(len(info['days']) for info in data['weeks'].values())
+    pairs = sum(len(day['pairs']) for info in data['weeks'].values() for day in info['days'])
+    print(f"📄 {sheet}: недель {len(week_info)}, дней {days}, пар {pairs}, файлов {len(renders)}"
+          f"{f', ошибок {len(errors)}' if errors else ''} -> {folder}")
+    return len(renders), len(errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('workbook', help="локальная книга xlsx или CSV-выгрузка листа")
+    parser.add_argument('--out', default='export', help="каталог выгрузки (по умолчанию ./export)")
+    parser.add_argument('--format', choices=('html', 'json'), default='html')
+    parser.add_argument('--sheet', help="лист (по умолчанию SCHEDULE_SHEET или первый лист 1 потока)")
+    parser.add_argument('--group', help="группа (по умолчанию SCHEDULE_GROUP)")
+    parser.add_argument('--all-sheets', action='store_true', help="выгрузить все листы потоков книги")
+    parser.add_argument('--layout-cache', help="файл кэша раскладок (по умолчанию поиск без кэша)")
+    parser.add_argument('--snapshot', help="записать снимок расписания для процессов-читателей")
+    parser.add_argument('-v', '--verbose', action='store_true', help="журнал бота на уровне INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if not os.path.exists(args.workbook):
+        parser.error(f"файл не найден: {args.workbook}")
+
+    stages = Stages()
+    with stages("импорт"):
+        bot = load_bot(args.workbook, args.sheet, args.group, args.layout_cache)
+    with stages("разбор листов"):
+        df = bot.get_dataframe()
+    if df is None:
+        print(f"❌ Книга не разобрана: {args.workbook}")
+        return 1
+    print(f"📚 {os.path.basename(args.workbook)}: листы {', '.join(bot.sheet_cache)}; лист бота {bot.sheet_name}")
+
+    sheets = list(bot.sheet_cache) if args.all_sheets else [bot.sheet_name]
+    files = errors = 0
+    for sheet in sheets:
+        view = bot if sheet == bot.sheet_name else bot._sheet_view(sheet)
+        written, failed = export_sheet(view, args.out, args.format, stages)
+        files += written
+        errors += failed
+
+    if args.snapshot:
+        bot.snapshot_path = args.snapshot
+        with stages("снимок"):
+            if not bot.publish_snapshot():
+                errors += 1
+
+    print(f"⏱ Этапы ({files} файлов):")
+    stages.report()
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Потоковая загрузка книги расписания.
+
+Ответ пишется кусками прямо в файл кэша и хэшируется по ходу загрузки.
+Размер ограничен, а HTML-страницы ошибок и книги без нужных листов
+отбрасываются по первым байтам и списку листов из xl/workbook.xml,
+не дожидаясь всего тела. Старые книги .xls (OLE2) принимаются как есть:
+списка листов в начале у них нет, его проверяет уже pandas при разборе.
+"""
+import os
+import re
+import html
+import zlib
+import struct
+import hashlib
+import logging
+import tempfile
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+MAX_DOWNLOAD_BYTES = int(os.getenv('MAX_DOWNLOAD_BYTES', 20 * 1024 * 1024))
+MIN_DOWNLOAD_BYTES = 10000
+# Один лист в CSV заметно меньше всей книги
+MIN_CSV_BYTES = 1000
+CHUNK_SIZE = 64 * 1024
+# Дальше этого места workbook.xml в начале архива не ищем
+SNIFF_LIMIT = 2 * 1024 * 1024
+
+ZIP_MAGIC = b'PK\x03\x04'
+# Составной документ OLE2: формат Excel 97-2003 (.xls)
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0'
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+SHEET_RE = re.compile(rb'<(?:\w+:)?sheet\b[^>]*?\bname="([^"]*)"')
+
+CACHE_DIR = os.getenv('SCHEDULE_CACHE_DIR') or tempfile.gettempdir()
+CACHE_PREFIX = 'schedule-'
+
+
+class DownloadRejected(Exception):
+    """Ответ не похож на нужную книгу Excel"""
+
+
+class DownloadCancelled(Exception):
+    """Загрузка отменена: файл уже получен из другого источника"""
+
+
+def parse_sheet_names(workbook_xml):
+    """Имена листов из xl/workbook.xml"""
+    return [html.unescape(name.decode('utf-8')) for name in SHEET_RE.findall(workbook_xml)]
+
+
+def read_sheet_names(path):
+    """Имена листов xlsx-файла без разбора самих листов"""
+    with zipfile.ZipFile(path) as archive:
+        return parse_sheet_names(archive.read('xl/workbook.xml'))
+
+
+class WorkbookSniffer:
+    """Разбирает локальные заголовки zip по мере загрузки, чтобы рано узнать листы книги"""
+
+    def __init__(self, limit=SNIFF_LIMIT):
+        self.limit = limit
+        self.sheet_names = None
+        self.done = False
+        self._buffer = bytearray()
+        self._skip = 0
+        self._seen = 0
+
+    def feed(self, chunk):
+        if self.done:
+            return
+        self._seen += len(chunk)
+        if self._skip:
+            skipped = min(self._skip, len(chunk))
+            self._skip -= skipped
+            chunk = chunk[skipped:]
+        self._buffer += chunk
+
+        while len(self._buffer) >= LOCAL_HEADER.size:
+            (signature, _, flags, method, _, _, _, compressed_size, _,
+             name_len, extra_len) = LOCAL_HEADER.unpack_from(self._buffer)
+            # Центральный каталог или данные без размеров в заголовке: раньше конца не узнать
+            if signature != ZIP_MAGIC or flags & 0x08:
+                self.done = True
+                break
+            header_end = LOCAL_HEADER.size + name_len + extra_len
+            if len(self._buffer) < header_end:
+                break
+            name = bytes(self._buffer[LOCAL_HEADER.size:LOCAL_HEADER.size + name_len])
+            data_end = header_end + compressed_size
+
+            if name == b'xl/workbook.xml':
+                if len(self._buffer) < data_end:
+                    break
+                data = bytes(self._buffer[header_end:data_end])
+                try:
+                    xml = zlib.decompress(data, -15) if method == 8 else data
+                    self.sheet_names = parse_sheet_names(xml)
+                except zlib.error:
+                    pass
+                self.done = True
+                break
+
+            if len(self._buffer) >= data_end:
+                del self._buffer[:data_end]
+            else:
+                self._skip = data_end - len(self._buffer)
+                self._buffer.clear()
+
+        if self._seen > self.limit:
+            self.done = True
+
+
+def stream_workbook(session, url, headers=None, timeout=30, sheet_check=None, max_bytes=None, fmt='xlsx',
+                    cancel=None):
+    """Скачать книгу (или один лист в CSV при fmt='csv') в файл кэша.
+
+    Вернуть (путь, sha256, имена листов). sheet_check(имена) вызывается, как
+    только список листов известен; False прерывает загрузку с DownloadRejected.
+    Книга .xls сохраняется с этим расширением, а имена листов для нее - None.
+    Установленное событие cancel прерывает загрузку с DownloadCancelled.
+    """
+    max_bytes = max_bytes or MAX_DOWNLOAD_BYTES
+    is_xlsx = fmt == 'xlsx'
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            raise DownloadRejected(f"HTTP {response.status_code}")
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise DownloadRejected(f"файл больше {max_bytes} байт")
+        if 'text/html' in response.headers.get('Content-Type', ''):
+            raise DownloadRejected("страница HTML вместо файла")
+
+        digest = hashlib.sha256()
+        sniffer = WorkbookSniffer()
+        size = 0
+        fd, part_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=CACHE_PREFIX, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if cancel is not None and cancel.is_set():
+                        raise DownloadCancelled(url)
+                    if not chunk:
+                        continue
+                    if size == 0 and is_xlsx and not chunk.startswith(ZIP_MAGIC):
+                        if not chunk.startswith(OLE2_MAGIC):
+                            raise DownloadRejected(f"не xlsx: начинается с {chunk[:16]!r}")
+                        # Бинарная .xls: листы проверит pandas (xlrd) при разборе
+                        fmt, is_xlsx = 'xls', False
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise DownloadRejected(f"файл больше {max_bytes} байт")
+                    digest.update(chunk)
+                    f.write(chunk)
+
+                    if is_xlsx and not sniffer.done:
+                        sniffer.feed(chunk)
+                        if sniffer.sheet_names is not None and sheet_check \
+                                and not sheet_check(sniffer.sheet_names):
+                            raise DownloadRejected(f"нет нужного листа: {sniffer.sheet_names}")
+
+            if size <= (MIN_CSV_BYTES if fmt == 'csv' else MIN_DOWNLOAD_BYTES):
+                raise DownloadRejected(f"слишком маленький файл: {size} байт")
+
+            sheet_names = sniffer.sheet_names
+            if is_xlsx and sheet_names is None:
+                try:
+                    sheet_names = read_sheet_names(part_path)
+                except (zipfile.BadZipFile, KeyError) as e:
+                    raise DownloadRejected(f"поврежденный xlsx: {e}")
+                if sheet_check and not sheet_check(sheet_names):
+                    raise DownloadRejected(f"нет нужного листа: {sheet_names}")
+
+            hexdigest = digest.hexdigest()
+            path = os.path.join(CACHE_DIR, f"{CACHE_PREFIX}{hexdigest[:16]}.{fmt}")
+            os.replace(part_path, path)
+        except BaseException:
+            try:
+                os.unlink(part_path)
+            except OSError:
+                pass
+            raise
+
+    logger.info(f"📥 Скачано {size} байт ({fmt}), листов: {len(sheet_names) if sheet_names else 1}")
+    return path, hexdigest, sheet_names
@@ -0,0 +1,185 @@
+"""Загрузка расписания из нескольких источников наперегонки.
+
+Источники запускаются по очереди, но следующий не ждет, пока предыдущий
+упрется в свой таймаут: он стартует, если предыдущий не ответил за время
+задержки, а при ошибке — сразу. Задержка для источника — 90-й перцентиль его
+недавних успешных загрузок. Побеждает первый ответ, прошедший проверку
+(размер, zip, нужный лист); остальные отменяются, их файлы удаляются.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DELAY = float(os.getenv('HEDGE_DELAY', 2.0))
+MIN_DELAY = 0.2
+MAX_DELAY = 10.0
+
+
+class SourceLatency:
+    """История времени ответа источников и задержка перед запуском следующего"""
+
+    def __init__(self, history=20, default=DEFAULT_DELAY):
+        self.history = history
+        self.default = default
+        self._latencies = {}
+        self.failures = {}
+        self.wins = {}
+        self._lock = threading.Lock()
+
+    def record(self, source, seconds):
+        with self._lock:
+            self._latencies.setdefault(source, deque(maxlen=self.history)).append(seconds)
+
+    def record_failure(self, source):
+        with self._lock:
+            self.failures[source] = self.failures.get(source, 0) + 1
+
+    def record_win(self, source):
+        with self._lock:
+            self.wins[source] = self.wins.get(source, 0) + 1
+
+    def delay(self, source):
+        """Сколько ждать источник, прежде чем запускать следующий"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(source, ()))
+        if len(latencies) < 3:
+            return self.default
+        p90 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+        return min(MAX_DELAY, max(MIN_DELAY, p90))
+
+    def summary(self):
+        """Источник -> (задержка, успешных замеров, побед, ошибок)"""
+        with self._lock:
+            sources = set(self._latencies) | set(self.failures) | set(self.wins)
+        return {source: (self.delay(source), len(self._latencies.get(source, ())),
+                         self.wins.get(source, 0), self.failures.get(source, 0))
+                for source in sorted(sources)}
+
+
+class HedgedRace:
+    """Одна гонка источников.
+
+    Кандидат — (источник, ключ, функция). Функция получает гонку и возвращает
+    (путь, sha256, лист) или None. Вместо результата она может добавить
+    новых кандидатов через spawn() — например, ссылки со страницы сайта;
+    они встают в начало очереди. Отмена видна через race.cancel.
+    """
+
+    def __init__(self, latency, max_workers=4):
+        self.latency = latency
+        self.max_workers = max_workers
+        self.cancel = threading.Event()
+        self._pending = deque()
+        self._seen = set()
+        self._spawned = set()
+        self._lock = threading.Lock()
+
+    def spawn(self, candidates):
+        """Добавить кандидатов в начало очереди (из потока кандидата)"""
+        with self._lock:
+            for candidate in reversed(candidates):
+                self._pending.appendleft(candidate)
+            self._spawned.add(threading.get_ident())
+
+    def _next(self):
+        """Следующий кандидат, которого еще не запускали, или None"""
+        with self._lock:
+            while self._pending:
+                source, key, fn = self._pending.popleft()
+                if key not in self._seen:
+                    self._seen.add(key)
+                    return source, key, fn
+        return None
+
+    def _call(self, fn):
+        """Вызвать кандидата; вернуть (результат, добавил ли он кандидатов)"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._spawned.discard(ident)
+        result = fn(self)
+        with self._lock:
+            spawned = ident in self._spawned
+            self._spawned.discard(ident)
+        return result, spawned
+
+    def run(self, candidates):
+        """Запустить кандидатов с хеджированием; вернуть (источник, результат) первого успешного или None"""
+        self._pending.extend(candidates)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hedge')
+        running = {}  # future -> (источник, ключ, время запуска)
+        next_start = 0.0
+        winner = None
+        started = time.monotonic()
+        try:
+            while winner is None:
+                now = time.monotonic()
+                if len(running) < self.max_workers and (not running or now >= next_start):
+                    candidate = self._next()
+                    if candidate is not None:
+                        source, key, fn = candidate
+                        running[pool.submit(self._call, fn)] = (source, key, now)
+                        next_start = now + self.latency.delay(source)
+                        continue
+                if not running:
+                    break
+
+                waiting = self._pending and len(running) < self.max_workers
+                timeout = max(0.0, next_start - now) if waiting else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source, key, launched = running.pop(future)
+                    elapsed = time.monotonic() - launched
+                    try:
+                        result, spawned = future.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ {source} {key}: {e}")
+                        result, spawned = None, False
+
+                    if result is not None and winner is None:
+                        self.latency.record(source, elapsed)
+                        self.latency.record_win(source)
+                        winner = (source, result)
+                    elif result is not None:
+                        _discard(result, winner[1])
+                    elif spawned:
+                        # Источник отдал ссылки: они стартуют сразу
+                        self.latency.record(source, elapsed)
+                        next_start = 0.0
+                    else:
+                        self.latency.record_failure(source)
+                        next_start = 0.0
+        finally:
+            self.cancel.set()
+            for future in running:
+                # Опоздавший успех удаляем, когда он все-таки завершится
+                future.add_done_callback(lambda future, won=winner: _discard_future(future, won))
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if winner is not None:
+            logger.info(f"🏁 Источник {winner[0]} за {(time.monotonic() - started) * 1000:.0f} мс, "
+                        f"отменено загрузок: {len(running)}")
+        return winner
+
+
+def _discard_future(future, winner):
+    if future.cancelled() or future.exception() is not None:
+        return
+    result, _ = future.result()
+    if result is not None:
+        _discard(result, winner[1] if winner else None)
+
+
+def _discard(result, kept):
+    """Удалить файл проигравшего, если это не тот же файл, что у победителя"""
+    path = result[0]
+    if kept is not None and os.path.abspath(path) == os.path.abspath(kept[0]):
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
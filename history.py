@@ -0,0 +1,175 @@
+"""История версий расписания.
+
+Каждая новая версия расписания дописывается в конец файла отдельным
+gzip-блоком с JSON: первая запись — все дни, следующие — только дни,
+изменившиеся относительно предыдущей версии (удаленный день — null).
+Файл только дописывается; когда старейшая запись выходит за срок хранения
+или файл перерастает предел, старые записи сворачиваются в одну базовую
+и файл переписывается атомарно. Файл лежит в папке состояния (state.py).
+"""
+import os
+import gzip
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from state import atomic_write, state_path
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = int(os.getenv('HISTORY_DAYS', 200))
+MAX_BYTES = int(os.getenv('HISTORY_MAX_BYTES', 5 * 1024 * 1024))
+
+
+def day_record(day):
+    """Пары дня в компактном виде: [номер, время, [[предмет, преподаватель, аудитория], ...]]"""
+    return [[pair.pair, pair.time, [list(lesson.astuple()) for lesson in pair.lessons]] for pair in day['pairs']]
+
+
+def schedule_days(schedule):
+    """Дата -> пары дня для всех недель скомпилированного расписания"""
+    days = {}
+    for info in schedule['weeks'].values():
+        for day in info['days']:
+            if day.get('date'):
+                days[day['date']] = day_record(day)
+    return days
+
+
+def diff_day(old, new):
+    """Изменения дня: [(номер пары, подгруппа или None, что было, что стало)]"""
+    old_pairs = {pair[0]: pair for pair in old or []}
+    new_pairs = {pair[0]: pair for pair in new or []}
+    changes = []
+    for number in sorted(old_pairs.keys() | new_pairs.keys()):
+        before, after = old_pairs.get(number), new_pairs.get(number)
+        if before is None or after is None:
+            changes.append((number, None, before, after))
+            continue
+        if before[1] != after[1]:
+            changes.append((number, 'time', before[1], after[1]))
+        for subgroup, (lesson_before, lesson_after) in enumerate(zip(before[2], after[2]), 1):
+            if lesson_before != lesson_after:
+                changes.append((number, subgroup, lesson_before, lesson_after))
+    return changes
+
+
+class ScheduleHistory:
+    """Журнал версий расписания: дописывание дельт и изменения по дате"""
+
+    def __init__(self, path=None, name=None, retention_days=RETENTION_DAYS, max_bytes=MAX_BYTES):
+        path = path or state_path('HISTORY_PATH', 'history.jsonl.gz')
+        if name:
+            # Несколько конфигураций расписания в процессе: у каждой свой файл
+            folder, base = os.path.split(path)
+            stem, dot, ext = base.partition('.')
+            path = os.path.join(folder, f"{stem}_{name}{dot}{ext}")
+        self.path = path
+        self.retention = timedelta(days=retention_days)
+        self.max_bytes = max_bytes
+        self.version = None
+        self._records = None  # [(время, дни)] по порядку
+        self._current = {}  # дата -> пары последней версии
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._records is not None:
+            return self._records
+        self._records = []
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._apply(record['at'], record['days'])
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, ValueError) as e:
+            # Недописанный последний блок: все прочитанное до него в силе
+            logger.warning(f"⚠️ История расписания прочитана частично: {e}")
+        return self._records
+
+    def _apply(self, at, days):
+        self._records.append((at, days))
+        for date, pairs in days.items():
+            if pairs is None:
+                self._current.pop(date, None)
+            else:
+                self._current[date] = pairs
+
+    def record(self, schedule, version, at=None):
+        """Дописать версию расписания, если дни изменились; вернуть число изменившихся дней"""
+        with self._lock:
+            if version == self.version:
+                return 0
+            self._load()
+            days = schedule_days(schedule)
+            delta = {date: pairs for date, pairs in days.items() if self._current.get(date) != pairs}
+            delta.update({date: None for date in self._current.keys() - days.keys()})
+            self.version = version
+            if not delta:
+                return 0
+
+            at = (at or datetime.now()).isoformat(timespec='seconds')
+            self._apply(at, delta)
+            try:
+                # Папка состояния создается при первой записи
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                    f.write(json.dumps({'at': at, 'days': delta}, ensure_ascii=False, separators=(',', ':')) + '\n')
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось дописать историю расписания: {e}")
+                return len(delta)
+            self._trim(datetime.fromisoformat(at))
+            return len(delta)
+
+    def _trim(self, now):
+        """Свернуть записи старше срока хранения (или лишние по размеру) в одну базовую"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        cutoff = (now - self.retention).isoformat(timespec='seconds')
+        folded = sum(1 for at, _ in self._records[:-1] if at < cutoff)
+        # Переписываем файл не на каждой записи, а когда устарела заметная часть журнала
+        if folded < max(2, len(self._records) // 10):
+            folded = 0
+        if size > self.max_bytes:
+            folded = max(folded, len(self._records) // 2)
+        if folded < 2:
+            return
+
+        base = {}
+        for _, days in self._records[:folded]:
+            base.update(days)
+        base = {date: pairs for date, pairs in base.items() if pairs is not None}
+        records = [(self._records[folded - 1][0], base)] + self._records[folded:]
+        try:
+            with atomic_write(self.path, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                for at, days in records:
+                    f.write(json.dumps({'at': at, 'days': days}, ensure_ascii=False, separators=(',', ':')) + '\n')
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сжать историю расписания: {e}")
+            return
+        self._records = records
+        logger.info(f"📜 История: свернуто записей {folded}, осталось {len(records)}, "
+                    f"{os.path.getsize(self.path) // 1024} КБ")
+
+    def changes(self, date):
+        """Версии дня: [(время, пары или None)] — первая появившаяся и каждая смена"""
+        with self._lock:
+            return [(at, days[date]) for at, days in self._load() if date in days]
+
+    def stats(self):
+        with self._lock:
+            records = self._load()
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            return {
+                'versions': len(records),
+                'days': len(self._current),
+                'since': records[0][0] if records else None,
+                'bytes': size,
+            }
@@ -0,0 +1,189 @@
+"""Поиск раскладки листа расписания: строка заголовков недель, столбцы дней и блоки групп.
+
+Раскладка кэшируется по структурному отпечатку листа (размер, заполненность
+шапки и столбцов подписей), поэтому следующие загрузки книги того же вида
+пропускают поиск. Найденная в кэше раскладка сначала проверяется на листе.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+
+from lazy import LazyModule
+from state import atomic_write
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк сверху просматривать в поисках заголовков недель
+HEADER_SCAN_ROWS = 15
+# Сколько первых столбцов считаются столбцами подписей (для отпечатка)
+LABEL_COLUMNS = 2
+# Сколько раскладок хранить: вытесняются давно найденные
+MAX_LAYOUTS = 64
+# Строк под временем: предмет, преподаватель, аудитория для двух подгрупп
+LESSON_ROWS = 6
+DAYS_PER_WEEK = 6
+PAIRS_PER_DAY = 6
+# Строка, в которой раньше был жестко задан блок 1-КРД-6
+DEFAULT_BLOCK_ROW = 89
+
+TIME_PATTERN = r'\d{1,2}:\d{2}'
+TIME_RE = re.compile(TIME_PATTERN)
+
+
+def fingerprint(df):
+    """Структурный отпечаток листа: не меняется при смене самих занятий"""
+    digest = hashlib.sha1()
+    digest.update(f"{df.shape[0]}x{df.shape[1]}".encode())
+    digest.update(df.iloc[:HEADER_SCAN_ROWS].notna().to_numpy().tobytes())
+    digest.update(df.iloc[:, :LABEL_COLUMNS].notna().to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _text(values):
+    """Ячейки как обрезанные строки; пустые ячейки — пустая строка"""
+    cells = pd.Series(values.ravel())
+    text = cells.astype(str).str.strip().where(cells.notna(), '')
+    return text.to_numpy(dtype=object).reshape(values.shape)
+
+
+def week_day_columns(layout, header_col, n_columns):
+    """Столбцы дней недели, начинающейся в столбце header_col"""
+    return [header_col + i for i in range(layout['days_per_week']) if header_col + i < n_columns]
+
+
+def day_columns(layout, n_columns):
+    """Столбцы дней всех недель"""
+    return [col for header_col in layout['week_columns'] for col in week_day_columns(layout, header_col, n_columns)]
+
+
+def detect_layout(df, group=None):
+    """Найти раскладку листа за один проход"""
+    header = _text(df.iloc[:HEADER_SCAN_ROWS].to_numpy(dtype=object))
+    is_week = np.vectorize(lambda cell: 'неделя' in cell.lower(), otypes=[bool])(header)
+    counts = is_week.sum(axis=1)
+    if not counts.any():
+        return None
+
+    header_row = int(counts.argmax())
+    week_columns = [int(col) for col in np.flatnonzero(is_week[header_row])]
+    gaps = np.diff(week_columns)
+    span = int(min(DAYS_PER_WEEK, gaps.min())) if len(gaps) else DAYS_PER_WEEK
+
+    # Ячейки времени во всех столбцах дней ниже шапки
+    columns = day_columns({'week_columns': week_columns, 'days_per_week': span}, len(df.columns))
+    body = df.iloc[header_row + 1:, columns]
+    has_time = body.apply(lambda column: column.astype(str).str.contains(TIME_PATTERN) & column.notna())
+    time_rows = [int(row) for row in np.flatnonzero(has_time.to_numpy().any(axis=1)) + header_row + 1]
+
+    # Соседние пары одной группы идут не дальше чем через LESSON_ROWS строк,
+    # а весь блок группы занимает не больше PAIRS_PER_DAY пар
+    blocks = []
+    for row in time_rows:
+        if blocks and row - blocks[-1]['last_time_row'] <= LESSON_ROWS + 1 \
+                and row - blocks[-1]['start'] < PAIRS_PER_DAY * (LESSON_ROWS + 1):
+            blocks[-1]['last_time_row'] = row
+        else:
+            blocks.append({'start': row, 'last_time_row': row})
+    for i, block in enumerate(blocks):
+        limit = blocks[i + 1]['start'] - 1 if i + 1 < len(blocks) else len(df) - 1
+        block['end'] = min(block.pop('last_time_row') + LESSON_ROWS, limit)
+        block['group'] = _block_label(df, block, week_columns[0])
+
+    return {
+        'header_row': header_row,
+        'week_columns': week_columns,
+        'days_per_week': span,
+        'blocks': blocks,
+        'block': _select_block(blocks, group),
+    }
+
+
+def _block_label(df, block, first_week_col):
+    """Подпись группы в столбцах слева от недель: первая ячейка, не похожая на время или номер"""
+    if first_week_col == 0:
+        return None
+    labels = _text(df.iloc[block['start']:block['end'] + 1, :first_week_col].to_numpy(dtype=object))
+    for cell in labels.ravel():
+        if cell and cell != 'nan' and not TIME_RE.search(cell) and not cell.replace('.', '').isdigit():
+            return cell
+    return None
+
+
+def _select_block(blocks, group=None):
+    """Индекс блока группы: по подписи, иначе прежний блок с 89 строки, иначе первый"""
+    if not blocks:
+        return None
+    if group:
+        for i, block in enumerate(blocks):
+            if block['group'] and group.lower() in block['group'].lower():
+                return i
+    for i, block in enumerate(blocks):
+        if block['start'] <= DEFAULT_BLOCK_ROW + LESSON_ROWS and block['end'] >= DEFAULT_BLOCK_ROW:
+            return i
+    return 0
+
+
+def validate_layout(df, layout):
+    """Быстрая проверка, что сохраненная раскладка подходит к листу"""
+    try:
+        row = layout['header_row']
+        for col in layout['week_columns']:
+            if 'неделя' not in str(df.iat[row, col]).lower():
+                return False
+        if layout['block'] is not None:
+            start = layout['blocks'][layout['block']]['start']
+            cells = df.iloc[start, day_columns(layout, len(df.columns))]
+            if not cells.astype(str).str.contains(TIME_PATTERN).any():
+                return False
+        return True
+    except (IndexError, KeyError, TypeError):
+        return False
+
+
+class LayoutCache:
+    """Раскладки по отпечаткам листов: в памяти и в JSON-файле между перезапусками"""
+
+    def __init__(self, path=None, max_entries=MAX_LAYOUTS):
+        self.path = path or os.getenv('LAYOUT_CACHE') or os.path.join(tempfile.gettempdir(), 'ktmu_layouts.json')
+        self.max_entries = max_entries
+        self._layouts = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._layouts is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._layouts = json.load(f)
+            except (OSError, ValueError):
+                self._layouts = {}
+        return self._layouts
+
+    def get(self, df, group=None):
+        """Раскладка листа: из кэша, если отпечаток известен и проверка прошла, иначе поиск"""
+        key = f"{fingerprint(df)}:{group or ''}"
+        with self._lock:
+            layout = self._load().get(key)
+            if layout is not None and validate_layout(df, layout):
+                return layout, True
+
+            layout = detect_layout(df, group)
+            if layout is None:
+                return None, False
+            # Порядок словаря — порядок поиска: лишние вытесняются с начала
+            self._layouts.pop(key, None)
+            self._layouts[key] = layout
+            for old_key in list(self._layouts)[:-self.max_entries]:
+                del self._layouts[old_key]
+            try:
+                with atomic_write(self.path, encoding='utf-8') as f:
+                    json.dump(self._layouts, f, ensure_ascii=False)
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось сохранить кэш раскладок: {e}")
+            return layout, False
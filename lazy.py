@@ -0,0 +1,31 @@
+"""Отложенный импорт тяжелых зависимостей.
+
+pandas, numpy, requests и BeautifulSoup нужны только разбору книги и
+загрузке с сайта, поэтому модуль импортируется при первом обращении к его
+атрибуту, а не при запуске процесса.
+"""
+import sys
+import importlib
+
+
+class LazyModule:
+    """Заместитель модуля: настоящий модуль импортируется при первом обращении"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'загружен' if self._module is not None else 'не загружен'
+        return f"<LazyModule {self._name}: {state}>"
+
+
+def is_loaded(name):
+    """Импортирован ли уже модуль в этом процессе"""
+    return name in sys.modules
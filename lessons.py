@@ -0,0 +1,84 @@
+"""Компактные записи скомпилированного расписания.
+
+Пары и занятия хранятся в объектах со __slots__ вместо словарей, строки
+предметов, преподавателей, аудиторий и времени берутся из общей таблицы
+строк (одинаковый текст во всех неделях и листах — один объект), а номер
+пары и минута начала — небольшие целые. Словари собираются только для JSON.
+"""
+
+
+class StringTable:
+    """Общая таблица строк: каждый различный текст хранится один раз"""
+
+    def __init__(self):
+        self._strings = {}
+
+    def intern(self, text):
+        if text is None:
+            return None
+        return self._strings.setdefault(text, text)
+
+    def __len__(self):
+        return len(self._strings)
+
+
+class Lesson:
+    """Занятие подгруппы: предмет, преподаватель, аудитория (None, если пусто)"""
+
+    __slots__ = ('subject', 'teacher', 'room')
+
+    def __init__(self, subject, teacher, room):
+        self.subject = subject
+        self.teacher = teacher
+        self.room = room
+
+    def astuple(self):
+        return (self.subject, self.teacher, self.room)
+
+    def to_dict(self):
+        return {'subject': self.subject, 'teacher': self.teacher, 'room': self.room}
+
+
+class Pair:
+    """Пара дня: номер, текст времени, минута начала и занятия обеих подгрупп"""
+
+    __slots__ = ('pair', 'time', 'minutes', 'lessons')
+
+    def __init__(self, pair, time, minutes, lessons):
+        self.pair = pair
+        self.time = time
+        self.minutes = minutes
+        self.lessons = lessons
+
+    def astuple(self):
+        return (self.pair, self.time, self.minutes, tuple(lesson.astuple() for lesson in self.lessons))
+
+    def to_dict(self):
+        return {
+            'pair': self.pair,
+            'time': self.time,
+            'minutes': self.minutes,
+            'lessons': [lesson.to_dict() for lesson in self.lessons],
+        }
+
+
+def compile_pairs(pairs, strings):
+    """Словари пар из разбора листа -> кортеж компактных записей"""
+    return tuple(
+        Pair(
+            pair['pair'],
+            strings.intern(pair['time']),
+            pair['minutes'],
+            tuple(
+                Lesson(strings.intern(lesson['subject']), strings.intern(lesson['teacher']),
+                       strings.intern(lesson['room']))
+                for lesson in pair['lessons']
+            ),
+        )
+        for pair in pairs
+    )
+
+
+def day_dict(day):
+    """День скомпилированного расписания в виде словаря для JSON"""
+    return dict(day, pairs=[pair.to_dict() for pair in day['pairs']])
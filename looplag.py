@@ -0,0 +1,96 @@
+"""Сторож задержки цикла событий.
+
+Задача в цикле событий отмечается каждые interval секунд, а фоновый поток
+проверяет отметки. Если отметки нет дольше threshold, значит какой-то
+обработчик выполняет блокирующий код в цикле: поток снимает стек потока
+цикла, чтобы в логе было видно, что именно блокирует, и считает такие
+случаи. Фактическая задержка измеряется по следующей отметке.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class LoopLagMonitor:
+    """Считает и логирует блокировки цикла событий дольше threshold секунд"""
+
+    def __init__(self, threshold=0.1, interval=0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_stack = None
+        self._beat = None
+        self._loop_thread = None
+        self._stalled = False
+        self._task = None
+
+    def start(self, loop=None):
+        """Начать наблюдение за циклом (вызывается из самого цикла)"""
+        if self._task is not None:
+            return
+        loop = loop or asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name='loop-lag', daemon=True).start()
+        logger.info(f"⏱ Сторож цикла событий: порог {self.threshold * 1000:.0f} мс")
+
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = now - before - self.interval
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag > self.threshold:
+                if not self._stalled:
+                    # Блокировка прошла между проверками потока-сторожа
+                    self.stalls += 1
+                self._stalled = False
+                logger.warning(f"⏱ Цикл событий был заблокирован {lag * 1000:.0f} мс")
+
+    def _watch(self):
+        while True:
+            time.sleep(min(self.interval, self.threshold) / 2)
+            if self._task is None or self._task.done():
+                return
+            if self._stalled or time.monotonic() - self._beat <= self.threshold + self.interval:
+                continue
+            # Цикл не отметился вовремя: кто-то держит его поток
+            self._stalled = True
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            # Вызовы кода бота и самый внутренний кадр (pandas, requests, ...)
+            shown = [entry for entry in stack if entry.filename.startswith(ROOT)][-3:]
+            if not shown or shown[-1] is not stack[-1]:
+                shown.append(stack[-1])
+            self.last_stack = [f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}" for entry in shown]
+            logger.warning(f"⏱ Цикл событий заблокирован дольше {self.threshold * 1000:.0f} мс: "
+                           f"{' <- '.join(reversed(self.last_stack))}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def metrics(self):
+        return {
+            'threshold_ms': round(self.threshold * 1000),
+            'stalls': self.stalls,
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'last_stack': self.last_stack,
+        }
@@ -1,6 +1,7 @@
 import os
 import logging
 from bot import ScheduleBot
+from tenants import TenantRuntime, load_configs
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +14,12 @@ def main():
     """Запуск бота"""
     logger.info(f"🚀 Starting bot on port {port}")
     
+    configs = load_configs()
+    if configs:
+        # Несколько ботов (BOTS / BOTS_FILE) в одном процессе с общими данными
+        TenantRuntime(configs).run()
+        return
+    
     bot = ScheduleBot()
     bot.run()
 
@@ -0,0 +1,305 @@
+"""Напоминания «пара через 10 минут».
+
+Вместо отдельной задачи на каждого подписчика и каждую пару — одна куча
+таймеров по слотам (дата, минута начала пары). В слоте лежат готовые тексты
+для каждой подгруппы, а подписчики одной подгруппы получают один и тот же
+текст пачкой. При обновлении расписания пересобираются только слоты дней,
+чьи пары изменились; подписки и последний отправленный слот хранятся в
+JSON-файле в папке состояния и переживают перезапуск.
+
+Время пар в таблице — местное время колледжа (SCHEDULE_TZ), а не часовой
+пояс сервера, поэтому слоты и «сейчас» считаются в этом поясе.
+"""
+import os
+import json
+import heapq
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from telegram.error import Forbidden
+
+from state import atomic_write, state_path
+
+logger = logging.getLogger(__name__)
+
+LEAD_MINUTES = int(os.getenv('REMINDER_LEAD', 10))
+# Часовой пояс расписания: колледж в Санкт-Петербурге
+SCHEDULE_TZ = ZoneInfo(os.getenv('SCHEDULE_TZ', 'Europe/Moscow'))
+# Одновременных отправок; темп задает планировщик отправки бота (sending.py)
+SEND_CHUNK = 25
+# Как часто проверять, не сменилась ли версия расписания, с
+CHECK_INTERVAL = 60
+SUBGROUPS = {0: "обе подгруппы", 1: "1 подгруппа", 2: "2 подгруппа"}
+
+
+def lesson_line(lesson):
+    """«предмет, аудитория» занятия или None, если занятия нет"""
+    if lesson is None or not lesson.subject:
+        return None
+    return f"{lesson.subject}, {lesson.room}" if lesson.room else lesson.subject
+
+
+def reminder_texts(pair, lead=LEAD_MINUTES):
+    """Подгруппа (0 — обе) -> текст напоминания о паре; подгруппы без занятия пропускаются"""
+    lines = [lesson_line(lesson) for lesson in pair.lessons[:2]]
+    lines += [None] * (2 - len(lines))
+    head = f"⏰ <b>Пара через {lead} минут</b> ({pair.pair}-я, 🕐 {pair.time})"
+    texts = {}
+    for subgroup, line in enumerate(lines, 1):
+        if line:
+            texts[subgroup] = f"{head}\n📚 {line}"
+    if lines[0] and lines[0] == lines[1]:
+        texts[0] = texts[1]
+    elif any(lines):
+        texts[0] = head + ''.join(
+            f"\n📚 {subgroup} подгр.: {line}" for subgroup, line in enumerate(lines, 1) if line
+        )
+    return texts
+
+
+def day_slots(day, lead=LEAD_MINUTES):
+    """Слоты дня: (дата ISO, минута начала) -> (время срабатывания, тексты по подгруппам)"""
+    try:
+        date = datetime.strptime(day['date'], '%d.%m.%Y').replace(tzinfo=SCHEDULE_TZ)
+    except (TypeError, ValueError):
+        return {}
+    slots = {}
+    for pair in day['pairs']:
+        texts = reminder_texts(pair, lead)
+        if pair.minutes < 0 or not texts:
+            continue
+        # Несколько строк с одним временем: первая по таблице
+        key = (date.date().isoformat(), pair.minutes)
+        if key not in slots:
+            fire_at = date + timedelta(minutes=pair.minutes - lead)
+            slots[key] = (fire_at.timestamp(), texts)
+    return slots
+
+
+def day_signature(day):
+    return (day.get('date'), tuple(pair.astuple() for pair in day['pairs']))
+
+
+class ReminderStore:
+    """Подписки (бот, чат) -> подгруппа и последний отправленный слот в JSON-файле"""
+
+    def __init__(self, path):
+        self.path = path
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._state is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                self._state = {}
+            self._state.setdefault('subscribers', {})
+            self._state.setdefault('fired', 0.0)
+        return self._state
+
+    def _save(self):
+        try:
+            with atomic_write(self.path, encoding='utf-8') as f:
+                json.dump(self._state, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сохранить подписки на напоминания: {e}")
+
+    def subscribe(self, bot_id, chat_id, subgroup):
+        with self._lock:
+            self._load()['subscribers'][f"{bot_id}:{chat_id}"] = subgroup
+            self._save()
+
+    def unsubscribe(self, bot_id, chat_id):
+        with self._lock:
+            removed = self._load()['subscribers'].pop(f"{bot_id}:{chat_id}", None) is not None
+            if removed:
+                self._save()
+            return removed
+
+    def subgroup(self, bot_id, chat_id):
+        with self._lock:
+            return self._load()['subscribers'].get(f"{bot_id}:{chat_id}")
+
+    def batches(self):
+        """Подгруппа -> [(бот, чат)]"""
+        with self._lock:
+            subscribers = dict(self._load()['subscribers'])
+        batches = {}
+        for key, subgroup in subscribers.items():
+            bot_id, chat_id = key.split(':')
+            batches.setdefault(subgroup, []).append((int(bot_id), int(chat_id)))
+        return batches
+
+    @property
+    def fired(self):
+        with self._lock:
+            return self._load()['fired']
+
+    def mark_fired(self, fire_at):
+        with self._lock:
+            self._load()['fired'] = fire_at
+            self._save()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load()['subscribers'])
+
+
+class ReminderScheduler:
+    """Куча таймеров слотов пар и задача, рассылающая напоминания пачками по подгруппам"""
+
+    def __init__(self, path=None, name=None, lead=LEAD_MINUTES):
+        path = path or state_path('REMINDERS_PATH', 'reminders.json')
+        if name:
+            # Несколько конфигураций расписания в процессе: у каждой свой файл
+            root, ext = os.path.splitext(path)
+            path = f"{root}_{name}{ext}"
+        self.store = ReminderStore(path)
+        self.lead = lead
+        self.version = None
+        self.bots = {}  # id бота -> telegram.Bot
+        self.sent = 0
+        self.failed = 0
+        self._slots = {}  # (дата, минута) -> (время срабатывания, тексты)
+        self._days = {}  # дата -> (подпись пар дня, ключи его слотов)
+        self._heap = []  # (время срабатывания, слот); устаревшие записи пропускаются при извлечении
+        self._task = None
+        self._lock = threading.Lock()
+
+    def update(self, schedule, version):
+        """Привести слоты к расписанию; вернуть число пересобранных дней"""
+        with self._lock:
+            if version == self.version:
+                return 0
+            days = {}
+            for info in schedule['weeks'].values():
+                for day in info['days']:
+                    if day.get('date'):
+                        days[day['date']] = day
+
+            changed = 0
+            for date in self._days.keys() - days.keys():
+                self._drop_day(date)
+                changed += 1
+            for date, day in days.items():
+                signature = day_signature(day)
+                if date in self._days and self._days[date][0] == signature:
+                    continue
+                self._drop_day(date)
+                slots = day_slots(day, self.lead)
+                for key, slot in slots.items():
+                    self._slots[key] = slot
+                    heapq.heappush(self._heap, (slot[0], key))
+                self._days[date] = (signature, list(slots))
+                changed += 1
+            self.version = version
+            return changed
+
+    def _drop_day(self, date):
+        """Убрать слоты дня; их записи в куче станут устаревшими"""
+        _, keys = self._days.pop(date, (None, ()))
+        for key in keys:
+            self._slots.pop(key, None)
+        # Куча не растет без предела от пересборок: чистим, когда устаревших больше половины
+        if len(self._heap) > 2 * len(self._slots) + 64:
+            self._heap = [(fire_at, key) for fire_at, key in self._heap
+                          if self._slots.get(key, (None,))[0] == fire_at]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now):
+        """Слоты, время которых пришло, и время следующего слота (или None)"""
+        due = []
+        with self._lock:
+            while self._heap:
+                fire_at, key = self._heap[0]
+                slot = self._slots.get(key)
+                if slot is None or slot[0] != fire_at:
+                    heapq.heappop(self._heap)
+                    continue
+                if fire_at > now:
+                    return due, fire_at
+                heapq.heappop(self._heap)
+                due.append((fire_at, key, slot[1]))
+        return due, None
+
+    def attach(self, bot):
+        """Бот, через который отправляются напоминания его подписчикам"""
+        self.bots[bot.id] = bot
+
+    def start(self, refresh):
+        """Запустить рассылку в текущем цикле; refresh() приводит слоты к расписанию"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(refresh))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, refresh):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, refresh)
+            except Exception as e:
+                logger.error(f"❌ Напоминания: не удалось обновить слоты: {e}")
+
+            now = datetime.now(SCHEDULE_TZ).timestamp()
+            due, next_at = self._pop_due(now)
+            # Файл подписок читается и пишется в пуле потоков, не в цикле событий
+            fired = await loop.run_in_executor(None, lambda: self.store.fired) if due else 0.0
+            for fire_at, key, texts in due:
+                # Пропущенное за время простоя не досылаем, если пара уже началась
+                if fire_at <= fired or now - fire_at > self.lead * 60:
+                    continue
+                await self._send_slot(key, texts)
+                await loop.run_in_executor(None, self.store.mark_fired, fire_at)
+            if due:
+                continue
+
+            timeout = CHECK_INTERVAL if next_at is None else min(CHECK_INTERVAL, max(0.0, next_at - now))
+            await asyncio.sleep(timeout)
+
+    async def _send_slot(self, key, texts):
+        """Разослать слот: каждой подгруппе подписчиков — ее текст, пачками"""
+        messages = []
+        for subgroup, chats in self.store.batches().items():
+            text = texts.get(subgroup)
+            if text:
+                messages += [(bot_id, chat_id, text) for bot_id, chat_id in chats if bot_id in self.bots]
+        for start in range(0, len(messages), SEND_CHUNK):
+            results = await asyncio.gather(*(
+                self.bots[bot_id].send_message(chat_id, text, parse_mode='HTML')
+                for bot_id, chat_id, text in messages[start:start + SEND_CHUNK]
+            ), return_exceptions=True)
+            for (bot_id, chat_id, _), result in zip(messages[start:start + SEND_CHUNK], results):
+                if isinstance(result, Forbidden):
+                    # Бота заблокировали или удалили из чата: дальше не пишем
+                    self.failed += 1
+                    await asyncio.get_running_loop().run_in_executor(None, self.store.unsubscribe, bot_id, chat_id)
+                    logger.info(f"🔕 Чат {chat_id} недоступен ({result}), подписка снята")
+                elif isinstance(result, Exception):
+                    self.failed += 1
+                    logger.warning(f"⚠️ Напоминание не отправлено: {result}")
+                else:
+                    self.sent += 1
+        if messages:
+            logger.info(f"⏰ Слот {key[0]} {key[1] // 60:02d}:{key[1] % 60:02d}: напоминаний {len(messages)}")
+
+    def metrics(self):
+        now = datetime.now(SCHEDULE_TZ).timestamp()
+        with self._lock:
+            upcoming = min((slot[0] for slot in self._slots.values() if slot[0] > now), default=None)
+        return {
+            'subscribers': len(self.store),
+            'slots': len(self._slots),
+            'heap': len(self._heap),
+            'next': datetime.fromtimestamp(upcoming, SCHEDULE_TZ).isoformat() if upcoming else None,
+            'sent': self.sent,
+            'failed': self.failed,
+        }
@@ -0,0 +1,133 @@
+"""Занятость аудиторий по дням и парам.
+
+Для каждой пары (дата, номер пары) хранится битовая маска занятых аудиторий
+по строкам аудиторий всех разобранных листов. Свободные аудитории на одну
+или несколько пар — пересечение инвертированных масок, без обхода таблицы.
+"""
+import re
+from datetime import date, datetime, timedelta
+
+PAIRS = range(1, 7)
+ROOM_SPLIT_RE = re.compile(r'[,;/]|\s+и\s+')
+ROOM_PREFIX_RE = re.compile(r'^(ауд(итория)?|каб(инет)?)\.?\s*', re.IGNORECASE)
+DATE_RE = re.compile(r'^(\d{1,2})\.(\d{1,2})(?:\.(\d{2}|\d{4}))?$')
+PAIR_RE = re.compile(r'^([1-6])(?:-([1-6]))?$')
+
+
+def room_names(cell):
+    """Аудитории из ячейки: «ауд. 101/102» -> ['101', '102']"""
+    names = []
+    for part in ROOM_SPLIT_RE.split(cell or ''):
+        name = ' '.join(ROOM_PREFIX_RE.sub('', part.strip()).split())
+        if name and name.lower() not in ('nan', '(пусто)', '-'):
+            names.append(name)
+    return names
+
+
+def _room_key(name):
+    return name.lower().replace('ё', 'е')
+
+
+def parse_query(args, today):
+    """Аргументы /free -> (дата, номера пар или None). Без даты — сегодня"""
+    day = today
+    pairs = None
+    for arg in args:
+        arg = arg.strip().lower()
+        date_match = DATE_RE.match(arg)
+        pair_match = PAIR_RE.match(arg)
+        if arg == 'сегодня':
+            day = today
+        elif arg == 'завтра':
+            day = today + timedelta(days=1)
+        elif date_match:
+            day_num, month, year = date_match.groups()
+            if year is None:
+                year = today.year
+            elif len(year) == 2:
+                year = 2000 + int(year)
+            try:
+                day = date(int(year), int(month), int(day_num))
+            except ValueError:
+                raise ValueError(f"Неверная дата: {arg}")
+        elif pair_match:
+            first, last = pair_match.groups()
+            pairs = list(range(int(first), int(last or first) + 1))
+            if not pairs:
+                raise ValueError(f"Неверный диапазон пар: {arg}")
+        else:
+            raise ValueError(f"Непонятный аргумент: {arg}")
+    return day, pairs
+
+
+class RoomOccupancy:
+    """Аудитории × (дата, пара) в виде битовых масок"""
+
+    def __init__(self, schedules):
+        self.rooms = []
+        self.dates = set()
+        self._ids = {}
+        self._busy = {}  # (дата, пара) -> маска занятых аудиторий
+        self.times = {}  # номер пары -> время из расписания
+        for data in schedules.values():
+            for info in data['weeks'].values():
+                for day in info['days']:
+                    try:
+                        day_date = datetime.strptime(day['date'], '%d.%m.%Y').date()
+                    except (TypeError, ValueError):
+                        continue
+                    self.dates.add(day_date)
+                    for pair in day['pairs']:
+                        slot = (day_date, pair.pair)
+                        self.times.setdefault(pair.pair, pair.time)
+                        mask = self._busy.get(slot, 0)
+                        for lesson in pair.lessons:
+                            for name in room_names(lesson.room):
+                                mask |= 1 << self._room_id(name)
+                        self._busy[slot] = mask
+        self.all_rooms = (1 << len(self.rooms)) - 1
+
+    def _room_id(self, name):
+        key = _room_key(name)
+        room_id = self._ids.get(key)
+        if room_id is None:
+            room_id = self._ids[key] = len(self.rooms)
+            self.rooms.append(name)
+        return room_id
+
+    def time_range(self, pairs):
+        """Время от начала первой до конца последней пары: «12:00-15:15»"""
+        first, last = self.times.get(pairs[0]), self.times.get(pairs[-1])
+        if not first or not last:
+            return None
+        return f"{first.split('-')[0]}-{last.split('-')[-1]}"
+
+    def busy_mask(self, day, pair):
+        return self._busy.get((day, pair), 0)
+
+    def free_mask(self, day, pairs):
+        """Аудитории, свободные на всех парах pairs"""
+        mask = self.all_rooms
+        for pair in pairs:
+            mask &= ~self._busy.get((day, pair), 0)
+        return mask
+
+    def names(self, mask):
+        """Имена аудиторий маски в естественном порядке"""
+        names = []
+        room_id = 0
+        while mask:
+            if mask & 1:
+                names.append(self.rooms[room_id])
+            mask >>= 1
+            room_id += 1
+        return sorted(names, key=_natural_key)
+
+    def free(self, day, pairs):
+        return self.names(self.free_mask(day, pairs))
+
+
+def _natural_key(name):
+    """«101» < «205» < «спортзал»: числа сравниваются как числа"""
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part.lower())
+            for part in re.findall(r'\d+|\D+', name)]
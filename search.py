@@ -0,0 +1,153 @@
+"""Инвертированный индекс по предметам, преподавателям и аудиториям.
+
+Индекс строится по скомпилированному расписанию всех листов и недель.
+Слова нормализуются (нижний регистр, ё -> е, латинские двойники букв в
+кириллических словах), поиск идет по префиксам слов запроса. При обновлении
+данных пересобираются только дни, содержимое которых изменилось.
+"""
+import re
+import bisect
+import hashlib
+import threading
+
+WORD_RE = re.compile(r'\w+')
+# Латинские буквы, которые в таблицах набирают вместо похожих кириллических
+HOMOGLYPHS = str.maketrans('aeopcxykmthb', 'аеорсхукмтнв')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+FIELDS = ('subject', 'teacher', 'room')
+
+
+def normalize(word):
+    """Нормальная форма слова для индекса и запроса"""
+    word = word.lower().replace('ё', 'е')
+    if CYRILLIC_RE.search(word):
+        word = word.translate(HOMOGLYPHS)
+    return word
+
+
+def tokenize(text):
+    """Нормализованные слова текста"""
+    return [normalize(word) for word in WORD_RE.findall(text or '')]
+
+
+def _signature(day):
+    """Отпечаток содержимого дня: дата и пары"""
+    raw = repr((day['date'], [pair.astuple() for pair in day['pairs']]))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ScheduleIndex:
+    """Слово -> пары, в которых оно встречается.
+
+    Пара задается ключом (лист, неделя, день, позиция пары в дне).
+    """
+
+    def __init__(self):
+        self.version = None
+        self._postings = {}
+        self._words = []
+        self._days = {}  # (лист, неделя, день) -> (отпечаток, слова дня, ключи пар)
+        self._entries = {}
+        self._order = {}  # ключ пары -> ключ сортировки по дате и времени
+        self._lock = threading.Lock()
+
+    def update(self, schedules, version):
+        """Привести индекс к расписаниям листов; вернуть число пересобранных дней"""
+        with self._lock:
+            if version == self.version:
+                return 0
+            seen = set()
+            rebuilt = 0
+            for sheet, data in schedules.items():
+                for week, info in data['weeks'].items():
+                    for day in info['days']:
+                        day_key = (sheet, week, day['day'])
+                        seen.add(day_key)
+                        signature = _signature(day)
+                        known = self._days.get(day_key)
+                        if known and known[0] == signature:
+                            continue
+                        self._remove_day(day_key)
+                        self._add_day(day_key, signature, info, day)
+                        rebuilt += 1
+            for day_key in [key for key in self._days if key not in seen]:
+                self._remove_day(day_key)
+                rebuilt += 1
+            if rebuilt:
+                self._words = sorted(self._postings)
+            self.version = version
+            return rebuilt
+
+    def _add_day(self, day_key, signature, info, day):
+        words = set()
+        entries = []
+        for position, pair in enumerate(day['pairs']):
+            entry = day_key + (position,)
+            entries.append(entry)
+            self._entries[entry] = {
+                'sheet': day_key[0],
+                'week': day_key[1],
+                'type': info['type'],
+                'day': day['day'],
+                'name': day['name'],
+                'date': day['date'],
+                'pair': pair,
+            }
+            self._order[entry] = (_date_key(day['date']), pair.minutes, day_key[0])
+            for lesson in pair.lessons:
+                for field in FIELDS:
+                    for word in tokenize(getattr(lesson, field)):
+                        self._postings.setdefault(word, set()).add(entry)
+                        words.add(word)
+        self._days[day_key] = (signature, words, entries)
+
+    def _remove_day(self, day_key):
+        known = self._days.pop(day_key, None)
+        if known is None:
+            return
+        _, words, entries = known
+        for word in words:
+            postings = self._postings[word]
+            postings.difference_update(entries)
+            if not postings:
+                del self._postings[word]
+        for entry in entries:
+            del self._entries[entry]
+            del self._order[entry]
+
+    def _prefix(self, prefix):
+        """Все пары со словами, начинающимися с prefix"""
+        words = self._words
+        result = set()
+        for i in range(bisect.bisect_left(words, prefix), len(words)):
+            if not words[i].startswith(prefix):
+                break
+            result |= self._postings[words[i]]
+        return result
+
+    def search(self, query):
+        """Пары, в которых есть слова с каждым префиксом запроса, по дате и номеру пары"""
+        prefixes = tokenize(query)
+        if not prefixes:
+            return []
+        found = None
+        with self._lock:
+            # Сначала самый длинный префикс: у него обычно меньше всего совпадений
+            for prefix in sorted(prefixes, key=len, reverse=True):
+                entries = self._prefix(prefix)
+                found = entries if found is None else found & entries
+                if not found:
+                    return []
+            return [self._entries[entry] for entry in sorted(found, key=self._order.__getitem__)]
+
+    def __len__(self):
+        return len(self._postings)
+
+
+def _date_key(date_text):
+    """дд.мм.гггг -> (гггг, мм, дд); пустая дата в конце"""
+    parts = date_text.split('.') if date_text else []
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return (9999, 99, 99)
+    return (int(parts[2]), int(parts[1]), int(parts[0]))
@@ -0,0 +1,233 @@
+"""Единый планировщик исходящих вызовов Bot API.
+
+Все вызовы бота, адресованные чату (sendMessage, editMessageText, sendPhoto,
+...), проходят через общий лимит и лимит своего чата (маркерные корзины),
+поэтому всплеск ответов не упирается в 429. Если Telegram все же
+отвечает RetryAfter, отправка приостанавливается для всех чатов на
+указанное время и запрос повторяется. Правка сообщения, которую, пока она
+ждала очереди, перекрыла более новая правка того же сообщения, не
+отправляется: ее вызывающий получает результат новой правки.
+"""
+import time
+import asyncio
+import logging
+import weakref
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Все планировщики процесса: их метрики отдает /metrics
+SCHEDULERS = weakref.WeakSet()
+
+# Правки, которые перекрываются более новой правкой того же сообщения
+EDIT_ENDPOINTS = {'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'}
+# Чатов без очереди, после которого неактивные корзины чатов забываются
+MAX_IDLE_CHATS = 10000
+
+
+def _percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class TokenBucket:
+    """Маркерная корзина: rate маркеров в секунду, не больше burst про запас"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Сколько ждать до следующего маркера"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Chat:
+    __slots__ = ('lock', 'bucket', 'pending')
+
+    def __init__(self, bucket):
+        self.lock = asyncio.Lock()
+        self.bucket = bucket
+        self.pending = 0
+
+
+class SendScheduler(BaseRateLimiter):
+    """Ограничитель исходящих вызовов: общий и по чатам, с повтором после RetryAfter"""
+
+    def __init__(self, rate=25.0, chat_rate=1.0, chat_burst=3, group_rate=20 / 60, max_retries=3, name='bot'):
+        self.name = name
+        self.max_retries = max_retries
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        # Запас общей корзины мал: за любую секунду уходит не больше rate * 1.2 вызовов
+        self._global = TokenBucket(rate, max(1.0, rate / 5))
+        self._chats = {}  # чат -> _Chat
+        self._edits = {}  # (чат, сообщение) -> future самой новой правки
+        self._blocked_until = 0.0
+        self.pending = 0
+        self.max_pending = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+        self._waits = deque(maxlen=1024)  # ожидание в очереди, с
+        SCHEDULERS.add(self)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) > MAX_IDLE_CHATS:
+                now = time.monotonic()
+                self._chats = {key: value for key, value in self._chats.items()
+                               if value.pending or not value.bucket.full(now)}
+            # Группы (отрицательный id) Telegram ограничивает строже личных чатов
+            rate = self.group_rate if str(chat_id).startswith('-') else self.chat_rate
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, self.chat_burst))
+        return chat
+
+    async def _wait_pause(self):
+        """Дождаться снятия паузы после 429; пауза может продлиться, пока ждем"""
+        while True:
+            delay = self._blocked_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _wait_turn(self, chat):
+        """Дождаться маркеров общей корзины и корзины чата и снятия паузы после 429"""
+        while True:
+            now = time.monotonic()
+            delay = max(self._global.delay(now), chat.bucket.delay(now), self._blocked_until - now)
+            if delay <= 0:
+                self._global.take(now)
+                chat.bucket.take(now)
+                return
+            await asyncio.sleep(delay)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            # answerCallbackQuery, setMyCommands: без очереди, но с паузой после 429
+            # (getUpdates через ограничитель не проходит)
+            await self._wait_pause()
+            return await self._call(callback, args, kwargs, endpoint)
+
+        edit_key = None
+        future = None
+        if endpoint in EDIT_ENDPOINTS and data.get('message_id') is not None:
+            edit_key = (chat_id, data['message_id'])
+            future = asyncio.get_running_loop().create_future()
+            self._edits[edit_key] = future
+
+        chat = self._chat(chat_id)
+        chat.pending += 1
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        enqueued = time.perf_counter()
+        superseded = None
+        try:
+            async with chat.lock:
+                latest = self._edits.get(edit_key) if edit_key is not None else None
+                if latest is not None and latest is not future:
+                    # Пока ждали, пришла более новая правка того же сообщения
+                    superseded = latest
+                else:
+                    await self._wait_turn(chat)
+                    self._waits.append(time.perf_counter() - enqueued)
+                    try:
+                        result = await self._call(callback, args, kwargs, endpoint, chat)
+                    except Exception as e:
+                        if future is not None and not future.done():
+                            future.set_exception(e)
+                            future.exception()  # ошибку получает вызывающий, а не журнал asyncio
+                        raise
+                    if future is not None and not future.done():
+                        future.set_result(result)
+                    return result
+        finally:
+            chat.pending -= 1
+            self.pending -= 1
+            if edit_key is not None and self._edits.get(edit_key) is future:
+                del self._edits[edit_key]
+            if future is not None and superseded is None and not future.done():
+                # Вызов отменен: ждущие его правки не должны висеть
+                future.cancel()
+
+        self.coalesced += 1
+        try:
+            result = await asyncio.shield(superseded)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                future.exception()
+            raise
+        # Правки, которые ждали эту, получают тот же результат
+        if not future.done():
+            future.set_result(result)
+        return result
+
+    async def _call(self, callback, args, kwargs, endpoint, chat=None):
+        """Вызов Bot API; после RetryAfter — пауза для всех и повтор, не больше max_retries раз"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                self.retries += 1
+                delay = float(e.retry_after)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error(f"❌ {endpoint}: Telegram ограничил отправку, попыток {attempt + 1}")
+                    raise
+                logger.warning(f"🚦 {endpoint}: 429, пауза {delay:.0f} с (попытка {attempt + 1})")
+                if chat is None:
+                    await self._wait_pause()
+                else:
+                    await self._wait_turn(chat)
+
+    def metrics(self):
+        """Очередь исходящих вызовов и ожидание в ней"""
+        waits = list(self._waits)
+        return {
+            'name': self.name,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'failed': self.failed,
+            'wait_p50_ms': round(_percentile(waits, 0.5) * 1000, 2),
+            'wait_p95_ms': round(_percentile(waits, 0.95) * 1000, 2),
+            'wait_max_ms': round(max(waits, default=0.0) * 1000, 2),
+        }
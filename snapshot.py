@@ -0,0 +1,225 @@
+"""Снимок скомпилированного расписания в memory-mapped файле.
+
+Процесс-загрузчик (бот с SNAPSHOT_PATH) после каждой загрузки пишет снимок,
+а любое число процессов-читателей на той же машине (например, воркеры
+gunicorn с ``'api:create_snapshot_app()'``) отображают файл в память и
+подхватывают новые версии по счетчику поколений, не разбирая книгу Excel.
+
+Формат файла: заголовок HEADER, JSON-индекс, затем тела ответов подряд.
+Файл заменяется атомарно, поэтому уже открытые отображения остаются целыми.
+Тела отдаются срезами отображения без копирования, а в ответ WSGI —
+через wsgi.file_wrapper, то есть под gunicorn прямо из файла (sendfile).
+"""
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import tempfile
+import threading
+
+MAGIC = b'KTMUSNP1'
+# magic, поколение, длина индекса, crc32 индекса и данных
+HEADER = struct.Struct('<8sQII')
+
+
+class SnapshotError(Exception):
+    """Файл снимка поврежден или имеет неизвестный формат"""
+
+
+def read_generation(path):
+    """Поколение снимка в файле или 0, если файла нет"""
+    try:
+        with open(path, 'rb') as f:
+            magic, generation, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return generation if magic == MAGIC else 0
+
+
+def write_snapshot(path, index, bodies):
+    """Атомарно записать снимок; bodies: ключ -> (etag, байты). Вернуть поколение"""
+    generation = read_generation(path) + 1
+
+    offsets = {}
+    chunks = []
+    position = 0
+    for key, (etag, body) in bodies.items():
+        offsets[key] = [position, len(body), etag]
+        chunks.append(body)
+        position += len(body)
+
+    index = dict(index, generation=generation, bodies=offsets)
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    data = b''.join(chunks)
+    checksum = zlib.crc32(data, zlib.crc32(index_bytes))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, generation, len(index_bytes), checksum))
+            f.write(index_bytes)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return generation
+
+
+class BodyFile:
+    """Тело ответа как файл для wsgi.file_wrapper: length байт с текущего места файла снимка.
+
+    Сервер с sendfile (gunicorn) берет fileno(), позицию и Content-Length и
+    отправляет байты из файла ядром; остальные читают его через read().
+    """
+
+    def __init__(self, f, length):
+        self._file = f
+        self._left = length
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._file.read(size)
+        self._left -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+class MappedBody:
+    """Тело ответа в снимке: срез отображения без копирования и тот же срез файлом"""
+
+    __slots__ = ('view', 'path', 'inode', 'offset')
+
+    def __init__(self, view, path, inode, offset):
+        self.view = view
+        self.path = path
+        self.inode = inode
+        self.offset = offset
+
+    def __len__(self):
+        return self.view.nbytes
+
+    def open(self):
+        """BodyFile этого среза или None, если файл снимка уже заменен новым поколением"""
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return None
+        if os.fstat(f.fileno()).st_ino != self.inode:
+            f.close()
+            return None
+        f.seek(self.offset)
+        return BodyFile(f, self.view.nbytes)
+
+
+class SnapshotReader:
+    """Читатель снимка: держит файл отображенным и перечитывает его при смене поколения"""
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._state = None  # (stat, memoryview отображения, index, начало данных)
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        state = self._state
+        return state[2]['generation'] if state else 0
+
+    @property
+    def index(self):
+        state = self._state
+        return state[2] if state else None
+
+    def refresh(self, force=False):
+        """Проверить файл (не чаще check_interval) и отобразить новое поколение"""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+
+        with self._lock:
+            self._next_check = now + self.check_interval
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return False
+            stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if self._state and self._state[0] == stat_key:
+                return False
+
+            with open(self.path, 'rb') as f:
+                try:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    raise SnapshotError("Снимок пуст")
+            try:
+                generation, index, data_start = self._check(mapped)
+            except BaseException:
+                mapped.close()
+                raise
+            if generation <= self.generation:
+                mapped.close()
+                return False
+            # Прежнее отображение не закрываем: его срезы могут еще отправляться,
+            # оно освободится вместе с последним из них
+            self._state = (stat_key, memoryview(mapped), index, data_start)
+            return True
+
+    @staticmethod
+    def _check(mapped):
+        """Проверить заголовок и контрольную сумму; вернуть (поколение, индекс, начало данных)"""
+        try:
+            magic, generation, index_len, checksum = HEADER.unpack_from(mapped, 0)
+        except struct.error:
+            raise SnapshotError("Снимок обрезан")
+        if magic != MAGIC:
+            raise SnapshotError("Неизвестный формат снимка")
+
+        data_start = HEADER.size + index_len
+        index_bytes = mapped[HEADER.size:data_start]
+        with memoryview(mapped) as view:
+            if zlib.crc32(view[data_start:], zlib.crc32(index_bytes)) != checksum:
+                raise SnapshotError("Контрольная сумма снимка не совпадает")
+        return generation, json.loads(index_bytes), data_start
+
+    def _locate(self, key):
+        state = self._state
+        if state is None:
+            return None
+        entry = state[2]['bodies'].get(key)
+        if entry is None:
+            return None
+        offset, length, etag = entry
+        start = state[3] + offset
+        return state, etag, start, length
+
+    def body(self, key):
+        """(etag, memoryview) готового ответа по ключу или None; тело не копируется"""
+        found = self._locate(key)
+        if found is None:
+            return None
+        state, etag, start, length = found
+        return etag, state[1][start:start + length]
+
+    def mapped_body(self, key):
+        """(etag, MappedBody) готового ответа по ключу или None"""
+        found = self._locate(key)
+        if found is None:
+            return None
+        state, etag, start, length = found
+        return etag, MappedBody(state[1][start:start + length], self.path, state[0][0], start)
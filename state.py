@@ -0,0 +1,41 @@
+"""Файлы состояния бота, которые должны пережить перезапуск.
+
+Подписки на напоминания, журнал версий расписания и file_id картинок недель
+лежат в одной папке STATE_DIR (по умолчанию state/ рядом с кодом), а не во
+временной папке системы: ее чистят при перезагрузке. На хостинге с
+эфемерным диском STATE_DIR указывают на подключенный том. Путь отдельного
+файла по-прежнему можно задать его собственной переменной окружения.
+Папка создается при первой записи, а не при создании объектов бота.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+STATE_DIR = os.getenv('STATE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state')
+
+
+def state_path(env, filename):
+    """Путь файла состояния: из переменной окружения env или filename в STATE_DIR"""
+    return os.getenv(env) or os.path.join(STATE_DIR, filename)
+
+
+@contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """Файл, целиком заменяющий path: пишется во временный файл в той же папке и переносится os.replace.
+
+    Имя временного файла уникально, поэтому два процесса с общим path не
+    пишут в один и тот же .tmp; при ошибке временный файл удаляется.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}-", suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
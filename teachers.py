@@ -0,0 +1,108 @@
+"""Расписание преподавателей по всем листам.
+
+Скомпилированное расписание групп разворачивается один раз на версию данных
+в преподаватель -> неделя -> занятия. Готовые тексты недель кэшируются и при
+обновлении сбрасываются только у преподавателей, чьи занятия изменились.
+"""
+import json
+import hashlib
+import threading
+
+from search import tokenize
+
+
+def teacher_key(name):
+    """Ключ преподавателя: нормализованные слова имени"""
+    return ' '.join(tokenize(name))
+
+
+class TeacherTimetable:
+    """Преподаватель -> неделя -> занятия с датами и группами"""
+
+    def __init__(self):
+        self.version = None
+        self.names = {}  # ключ -> имя как в таблице
+        self._weeks = {}  # ключ -> {неделя: [занятия]}
+        self._signatures = {}
+        self._rendered = {}  # (ключ, неделя) -> текст
+        self._lock = threading.Lock()
+
+    def update(self, schedules, version):
+        """Развернуть расписания листов; вернуть ключи преподавателей, у которых что-то изменилось"""
+        with self._lock:
+            if version == self.version:
+                return set()
+            names, weeks = {}, {}
+            for sheet, data in schedules.items():
+                for week, info in data['weeks'].items():
+                    for day in info['days']:
+                        for pair in day['pairs']:
+                            for subgroup, lesson in enumerate(pair.lessons, 1):
+                                key = teacher_key(lesson.teacher)
+                                if not key:
+                                    continue
+                                names.setdefault(key, lesson.teacher.strip())
+                                weeks.setdefault(key, {}).setdefault(week, []).append({
+                                    'week': week,
+                                    'type': info['type'],
+                                    'day': day['day'],
+                                    'name': day['name'],
+                                    'date': day['date'],
+                                    'pair': pair.pair,
+                                    'time': pair.time,
+                                    'minutes': pair.minutes,
+                                    'subject': lesson.subject,
+                                    'room': lesson.room,
+                                    'sheet': sheet,
+                                    'subgroup': subgroup,
+                                })
+
+            signatures = {}
+            for key, by_week in weeks.items():
+                for lessons in by_week.values():
+                    lessons.sort(key=lambda lesson: (lesson['day'], lesson['minutes'], lesson['sheet'], lesson['subgroup']))
+                raw = json.dumps(by_week, ensure_ascii=False, sort_keys=True)
+                signatures[key] = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+            changed = {key for key in signatures.keys() | self._signatures.keys()
+                       if signatures.get(key) != self._signatures.get(key)}
+            self._rendered = {cache_key: text for cache_key, text in self._rendered.items()
+                              if cache_key[0] not in changed}
+            self.names, self._weeks, self._signatures = names, weeks, signatures
+            self.version = version
+            return changed
+
+    def find(self, query):
+        """Ключи преподавателей, у которых каждое слово запроса — начало одного из слов имени"""
+        prefixes = tokenize(query)
+        if not prefixes:
+            return []
+        exact = teacher_key(query)
+        if exact in self.names:
+            return [exact]
+        return sorted(
+            key for key in self.names
+            if all(any(word.startswith(prefix) for word in key.split()) for prefix in prefixes)
+        )
+
+    def weeks(self, key):
+        """Номера недель, в которых у преподавателя есть занятия"""
+        return sorted(self._weeks.get(key, {}), key=int)
+
+    def lessons(self, key, week):
+        return self._weeks.get(key, {}).get(week, [])
+
+    def rendered(self, key, week, render):
+        """Текст недели преподавателя: из кэша или render(ключ, неделя)"""
+        cache_key = (key, week)
+        text = self._rendered.get(cache_key)
+        if text is None:
+            version = self.version
+            text = render(key, week)
+            # Пока рисовали, данные могли обновиться: такой текст не кэшируем
+            if version == self.version:
+                self._rendered[cache_key] = text
+        return text
+
+    def __len__(self):
+        return len(self.names)
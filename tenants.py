@@ -0,0 +1,119 @@
+"""Несколько ботов в одном процессе.
+
+Каждый бот (токен) получает свой Application со своим набором команд, а
+данные делятся по конфигурации расписания (лист, группа): боты с одинаковой
+конфигурацией работают с одним ScheduleBot и общим кэшем сообщений. Книгу
+скачивает и разбирает только ведущий ScheduleBot, остальные переходят на его
+файл и DataFrame, поэтому сеть и разбор не растут с числом ботов.
+
+Конфигурация — JSON-список в BOTS или в файле BOTS_FILE:
+
+    [{"token": "...", "group": "1-КРД-6", "sheet": "1 поток",
+      "commands": ["start", "menu", "today"]}]
+
+Вместо token можно указать token_env — имя переменной окружения с токеном.
+"""
+import os
+import json
+import signal
+import asyncio
+import logging
+
+from bot import ScheduleBot, keep_alive
+
+logger = logging.getLogger(__name__)
+
+
+def load_configs():
+    """Конфигурации ботов из BOTS / BOTS_FILE; пустой список, если не заданы"""
+    raw = os.getenv('BOTS')
+    path = os.getenv('BOTS_FILE')
+    if not raw and path:
+        with open(path, encoding='utf-8') as f:
+            raw = f.read()
+    if not raw:
+        return []
+
+    configs = json.loads(raw)
+    if not isinstance(configs, list):
+        raise ValueError("BOTS: ожидается список конфигураций")
+    for i, config in enumerate(configs):
+        if not config.get('token') and config.get('token_env'):
+            config['token'] = os.getenv(config['token_env'])
+        if not config.get('token'):
+            raise ValueError(f"BOTS[{i}]: не задан токен")
+    return configs
+
+
+class TenantRuntime:
+    """Боты одного процесса поверх общих ScheduleBot"""
+
+    def __init__(self, configs):
+        self.bots = {}  # (лист, группа) -> ScheduleBot
+        self.tenants = []  # (конфигурация, ScheduleBot)
+        self.primary = None
+        for config in configs:
+            key = (config.get('sheet') or os.getenv('SCHEDULE_SHEET'),
+                   config.get('group') or os.getenv('SCHEDULE_GROUP'))
+            bot = self.bots.get(key)
+            if bot is None:
+                bot = self.bots[key] = ScheduleBot(token=config['token'], group=key[1], sheet=key[0])
+                if self.primary is None:
+                    self.primary = bot
+                else:
+                    bot.follow(self.primary)
+            self.tenants.append((config, bot))
+
+        if self.primary is not None and len({sheet for sheet, _ in self.bots}) > 1:
+            # В CSV-выгрузке один лист, а ведомым нужны и другие листы книги
+            self.primary.google_export = 'xlsx'
+
+    def is_ready(self):
+        return all(bot.is_ready() for bot in self.bots.values())
+
+    async def warm_up(self):
+        """Ведущий прогревается первым, ведомые затем берут его книгу"""
+        await self.primary.wait_warm_up()
+        followers = [bot for bot in self.bots.values() if bot is not self.primary]
+        await asyncio.gather(*(bot.wait_warm_up() for bot in followers))
+
+    async def serve(self):
+        """Прогреть данные, запустить опрос всех ботов и работать до SIGINT/SIGTERM"""
+        applications = []
+        for config, bot in self.tenants:
+            application = bot.build_application(config['token'], config.get('commands'))
+            applications.append((application, bot))
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self.primary.loop_monitor.start(loop)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        try:
+            await asyncio.gather(self.warm_up(), *(application.initialize() for application, _ in applications))
+            for application, bot in applications:
+                bot.reminders.attach(application.bot)
+                await bot.setup_commands(application)
+                await application.start()
+                await application.updater.start_polling(drop_pending_updates=True)
+            for bot in self.bots.values():
+                bot.reminders.start(bot.refresh_reminders)
+            logger.info(f"🤖 Ботов запущено: {len(applications)}, конфигураций расписания: {len(self.bots)}")
+            await stop.wait()
+        finally:
+            for application, _ in applications:
+                if application.updater.running:
+                    await application.updater.stop()
+                if application.running:
+                    await application.stop()
+                await application.shutdown()
+
+    def run(self):
+        """Запуск всех ботов"""
+        # HTTP: health-check готов, когда прогреты все конфигурации; JSON API — ведущего
+        keep_alive(self.primary, ready=self.is_ready)
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            logger.error(f"❌ Ошибка запуска: {e}")
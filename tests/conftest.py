@@ -0,0 +1,112 @@
+"""Общие фикстуры: синтетические листы расписания и скомпилированные дни."""
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lessons import Lesson, Pair  # noqa: E402
+
+PAIR_TIMES = ['8:30-10:00', '10:10-11:40', '12:00-13:30', '13:45-15:15', '15:25-16:55', '17:05-18:35']
+FIRST_MONDAY = date(2025, 9, 1)
+# Блок группы по умолчанию начинается с 89 строки, как на сайте колледжа
+GROUP_ROWS = {'1-КРД-6': 89, '1-КРД-5': 40}
+
+
+def make_frame(weeks=2, groups=('1-КРД-6',), lesson=None):
+    """Лист с раскладкой «1 поток»: подпись группы слева, блок из 6 пар по 7 строк.
+
+    lesson(группа, неделя, день, пара) -> (предмет, преподаватель, аудитория) или None.
+    """
+    import pandas as pd
+
+    lesson = lesson or (lambda group, week, day, pair: (
+        f"Предмет {pair}{day}", f"Преподаватель {pair}", f"ауд. {100 + pair + day}"))
+    rows, cols = 135, 2 + 6 * weeks
+    grid = [[None] * cols for _ in range(rows)]
+    for week in range(weeks):
+        col = 2 + 6 * week
+        monday = FIRST_MONDAY + timedelta(weeks=week)
+        week_type = 'нечетная' if week % 2 == 0 else 'четная'
+        grid[3][col] = f"Неделя ({week + 1}) {week_type} {monday:%d.%m.%Y} - {monday + timedelta(days=5):%d.%m.%Y}"
+        for group in groups:
+            start = GROUP_ROWS[group]
+            grid[start][0] = group
+            for day in range(6):
+                for pair in range(6):
+                    cell = lesson(group, week, day, pair)
+                    if cell is None:
+                        continue
+                    row = start + 7 * pair
+                    grid[row][col + day] = PAIR_TIMES[pair]
+                    for offset, value in enumerate(cell, 1):
+                        grid[row + offset][col + day] = value
+    return pd.DataFrame(grid)
+
+
+def write_workbook(path, sheets):
+    """Записать листы {имя: DataFrame} в xlsx"""
+    import pandas as pd
+
+    with pd.ExcelWriter(path) as writer:
+        for sheet, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet, header=False, index=False)
+    return str(path)
+
+
+def make_pair(number, lessons, minutes=None):
+    """Пара из кортежей (предмет, преподаватель, аудитория) по подгруппам"""
+    start = PAIR_TIMES[number - 1].split('-')[0]
+    hours, mins = map(int, start.split(':'))
+    return Pair(number, PAIR_TIMES[number - 1], hours * 60 + mins if minutes is None else minutes,
+                tuple(Lesson(*lesson) for lesson in lessons))
+
+
+def make_day(day_date, pairs, day_idx=None):
+    day_idx = day_date.weekday() if day_idx is None else day_idx
+    names = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
+    return {'day': day_idx, 'name': names[day_idx], 'date': f"{day_date:%d.%m.%Y}", 'pairs': tuple(pairs)}
+
+
+def make_schedule(days, week='1', version=1, sheet='1 поток'):
+    """Скомпилированное расписание одной недели из готовых дней"""
+    return {
+        'version': version,
+        'sheet': sheet,
+        'parse_seconds': 0.0,
+        'weeks': {week: {'week': week, 'type': 'Нечетная', 'description': f"Неделя ({week})",
+                         'date_range': None, 'days': list(days)}},
+    }
+
+
+@pytest.fixture
+def monday():
+    return FIRST_MONDAY
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """Книга с двумя группами на листе «1 поток»"""
+    return write_workbook(tmp_path / 'schedule.xlsx', {'1 поток': make_frame(groups=('1-КРД-5', '1-КРД-6'))})
+
+
+@pytest.fixture
+def state_files(tmp_path, monkeypatch):
+    """Файлы состояния бота — во временной папке теста, а не в state/ репозитория"""
+    for env, name in [('REMINDERS_PATH', 'reminders.json'), ('HISTORY_PATH', 'history.jsonl.gz'),
+                      ('WEEK_IMAGE_CACHE', 'week_images.json')]:
+        monkeypatch.setenv(env, str(tmp_path / name))
+
+
+@pytest.fixture
+def load_bot(tmp_path, state_files):
+    """ScheduleBot на локальной книге; файлы состояния — во временной папке теста"""
+
+    def load(path, group='1-КРД-6', sheet=None):
+        import cli
+
+        return cli.load_bot(path, sheet=sheet, group=group, layout_cache=str(tmp_path / 'layouts.json'))
+
+    return load
@@ -0,0 +1,27 @@
+from breaker import CircuitBreaker
+
+
+def test_opens_after_threshold_and_half_opens_after_timeout(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('breaker.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker('site', failure_threshold=2, reset_timeout=60)
+
+    breaker.record_failure(OSError('timeout'))
+    assert breaker.allow()
+    breaker.record_failure(OSError('timeout'))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    now[0] += 60
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # В полуоткрытом состоянии пропускается одна пробная попытка
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure(OSError('timeout'))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0 and breaker.allow()
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import cli
+from conftest import make_frame, write_workbook
+
+
+def test_html_export_escapes_sheet_text(tmp_path, state_files):
+    def lesson(group, week, day, pair):
+        return (f"Предмет <{pair}> & Ко", "Преподаватель", "ауд. 101") if pair < 2 else None
+
+    workbook = write_workbook(tmp_path / 'book.xlsx', {'1 поток': make_frame(lesson=lesson)})
+    out = tmp_path / 'export'
+    assert cli.main([workbook, '--out', str(out)]) == 0
+
+    folder = out / '1 поток'
+    assert sorted(path.name for path in folder.iterdir())[:3] == ['week_1.html', 'week_1_day_0.html', 'week_1_day_1.html']
+    page = (folder / 'week_1_day_0.html').read_text(encoding='utf-8')
+    assert 'Предмет &lt;0&gt; &amp; Ко' in page and '<0>' not in page
+    # Разметка Telegram показывается как есть, а не применяется
+    assert '&lt;b&gt;' in page and '<b>' not in page
+
+
+def test_json_export_matches_api_payload_for_all_sheets(tmp_path, state_files):
+    from api import build_payload, schedule_key
+
+    workbook = write_workbook(tmp_path / 'book.xlsx', {'1 поток': make_frame(), '2 поток': make_frame()})
+    out = tmp_path / 'export'
+    snapshot = tmp_path / 'schedule.snap'
+    assert cli.main([workbook, '--out', str(out), '--format', 'json', '--all-sheets', '--snapshot', str(snapshot)]) == 0
+    assert {path.name for path in out.iterdir()} == {'1 поток', '2 поток'}
+    assert snapshot.exists()
+
+    bot = cli.load_bot(workbook)
+    data = bot.get_schedule_data()
+    exported = json.loads((out / '1 поток' / 'week_2_day_3.json').read_text(encoding='utf-8'))
+    assert exported == json.loads(json.dumps(build_payload(schedule_key('2', 3), data), ensure_ascii=False))
+    assert len(list((out / '2 поток').iterdir())) == 2 * 7
+
+
+def test_missing_workbook_is_reported(tmp_path, capsys, state_files):
+    with pytest.raises(SystemExit):
+        cli.main([str(tmp_path / 'missing.xlsx')])
+    assert 'файл не найден' in capsys.readouterr().err
@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+
+from bot import COMMANDS
+
+
+def test_command_list_matches_handlers(load_bot, workbook):
+    bot = load_bot(workbook)
+    assert [command for command, *_ in COMMANDS] == list(bot.command_handlers())
+
+
+def test_main_menu_lists_commands_from_shared_list(load_bot, workbook):
+    bot = load_bot(workbook)
+    text = bot._main_menu_text(SimpleNamespace(bot_data={}))
+    for command in ('find', 'free', 'teacher', 'remind', 'history'):
+        assert f"• /{command} " in text
+    assert '/debug' not in text
+
+    # Выключенные у развертывания команды в меню не попадают
+    text = bot._main_menu_text(SimpleNamespace(bot_data={'commands': ['menu', 'today']}))
+    assert '/menu' in text and '/today' in text and '/find' not in text
@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+from conftest import make_frame, write_workbook
+from download import (DownloadCancelled, DownloadRejected, WorkbookSniffer, read_sheet_names,
+                      stream_workbook)
+
+
+class FakeResponse:
+    def __init__(self, body, status=200, content_type='application/octet-stream', chunk=4096):
+        self.body = body
+        self.status_code = status
+        self.headers = {'Content-Type': content_type, 'Content-Length': str(len(body))}
+        self.chunk = chunk
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), self.chunk):
+            yield self.body[start:start + self.chunk]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, **kwargs):
+        return self.response
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    folder = tmp_path / 'cache'
+    folder.mkdir()
+    monkeypatch.setattr('download.CACHE_DIR', str(folder))
+    return folder
+
+
+@pytest.fixture
+def xlsx_bytes(tmp_path):
+    path = write_workbook(tmp_path / 'book.xlsx', {'Титул': make_frame(), '1 поток': make_frame()})
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_sniffer_reads_sheet_names_from_first_chunks(xlsx_bytes):
+    sniffer = WorkbookSniffer()
+    for start in range(0, len(xlsx_bytes), 1000):
+        sniffer.feed(xlsx_bytes[start:start + 1000])
+        if sniffer.done:
+            break
+    assert sniffer.sheet_names == ['Титул', '1 поток']
+
+
+def test_stream_workbook_writes_cache_file(cache_dir, xlsx_bytes):
+    seen = []
+    path, digest, sheets = stream_workbook(FakeSession(FakeResponse(xlsx_bytes)), 'http://x/s.xlsx',
+                                           sheet_check=lambda names: seen.append(names) or True)
+    assert sheets == ['Титул', '1 поток']
+    assert seen == [sheets]
+    assert read_sheet_names(path) == sheets
+    assert path.startswith(str(cache_dir)) and digest[:16] in path
+    assert [p.name for p in cache_dir.iterdir()] == [path.rsplit('/', 1)[1]]
+
+
+def test_rejects_html_non_zip_and_missing_sheet(cache_dir, xlsx_bytes):
+    with pytest.raises(DownloadRejected, match='HTML'):
+        stream_workbook(FakeSession(FakeResponse(b'<html>', content_type='text/html')), 'u')
+    with pytest.raises(DownloadRejected, match='HTTP 404'):
+        stream_workbook(FakeSession(FakeResponse(b'', status=404)), 'u')
+    with pytest.raises(DownloadRejected, match='не xlsx'):
+        stream_workbook(FakeSession(FakeResponse(b'<!DOCTYPE html>' + b' ' * 20000)), 'u')
+    with pytest.raises(DownloadRejected, match='нет нужного листа'):
+        stream_workbook(FakeSession(FakeResponse(xlsx_bytes)), 'u', sheet_check=lambda names: False)
+    with pytest.raises(DownloadRejected, match='больше'):
+        stream_workbook(FakeSession(FakeResponse(xlsx_bytes)), 'u', max_bytes=1000)
+    # Частичные файлы не остаются в кэше
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_cancel_stops_download(cache_dir, xlsx_bytes):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(DownloadCancelled):
+        stream_workbook(FakeSession(FakeResponse(xlsx_bytes)), 'u', cancel=cancel)
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_csv_sheet(cache_dir):
+    body = ('Неделя (1);' * 200).encode('utf-8')
+    path, _, sheets = stream_workbook(FakeSession(FakeResponse(body)), 'u', fmt='csv')
+    assert path.endswith('.csv') and sheets is None
+
+
+def test_legacy_xls_passes_through_without_sheet_check(cache_dir):
+    body = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + b'\0' * 20000
+    checked = []
+    path, _, sheets = stream_workbook(FakeSession(FakeResponse(body)), 'http://x/s.xls',
+                                      sheet_check=lambda names: checked.append(names) or False)
+    # Листы .xls проверяет pandas при разборе, а не загрузчик
+    assert path.endswith('.xls') and sheets is None and checked == []
+    with open(path, 'rb') as f:
+        assert f.read() == body
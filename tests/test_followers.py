@@ -0,0 +1,22 @@
+from conftest import make_frame, write_workbook
+
+
+def test_adopt_keeps_previous_data_when_configured_sheet_is_missing(tmp_path, load_bot):
+    book = write_workbook(tmp_path / 'book.xlsx', {'1 поток': make_frame(), '2 поток': make_frame()})
+    old_book = write_workbook(tmp_path / 'old.xlsx', {'3 поток': make_frame()})
+    leader = load_bot(book)
+    leader.get_schedule_data()
+
+    second = load_bot(old_book, sheet='2 поток')
+    assert second.adopt(leader) and second.sheet_name == '2 поток'
+    assert second.excel_file == leader.excel_file
+
+    default = load_bot(old_book)
+    assert default.adopt(leader) and default.sheet_name == '1 поток'
+
+    missing = load_bot(old_book, sheet='3 поток')
+    data = missing.get_schedule_data()
+    version = missing.data_version
+    assert not missing.adopt(leader)
+    assert missing.excel_file == old_book and missing.sheet_name == '3 поток'
+    assert missing.data_version == version and missing.get_schedule_data() is data
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from hedge import HedgedRace, SourceLatency
+
+
+def test_latency_delay_uses_p90_within_bounds():
+    latency = SourceLatency(default=2.0)
+    assert latency.delay('site') == 2.0
+    for seconds in (0.01, 0.02, 0.03):
+        latency.record('site', seconds)
+    assert latency.delay('site') == 0.2
+    for seconds in (30, 30, 30):
+        latency.record('slow', seconds)
+    assert latency.delay('slow') == 10.0
+
+
+def test_hedged_source_wins_and_slow_result_is_discarded(tmp_path):
+    latency = SourceLatency(default=0.05)
+    release = threading.Event()
+    slow_file = tmp_path / 'slow.xlsx'
+    fast_file = tmp_path / 'fast.xlsx'
+
+    def slow(race):
+        release.wait(2)
+        slow_file.write_bytes(b'slow')
+        return str(slow_file), 'a', None
+
+    def fast(race):
+        fast_file.write_bytes(b'fast')
+        return str(fast_file), 'b', None
+
+    winner = HedgedRace(latency).run([('site', 'slow', slow), ('google', 'fast', fast)])
+    assert winner == ('google', (str(fast_file), 'b', None))
+    assert latency.wins == {'google': 1}
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while slow_file.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not slow_file.exists()
+    assert fast_file.exists()
+
+
+def test_failure_starts_next_candidate_and_spawn_runs_first():
+    latency = SourceLatency(default=5.0)
+    calls = []
+
+    def broken(race):
+        calls.append('broken')
+        raise OSError('HTTP 500')
+
+    def site(race):
+        calls.append('site')
+        race.spawn([('site-xlsx', 'link', lambda race: calls.append('link') or ('link.xlsx', 'c', None))])
+        return None
+
+    started = time.monotonic()
+    winner = HedgedRace(latency, max_workers=1).run([
+        ('known', 'broken', broken), ('site', 'page', site), ('known', 'never', lambda race: calls.append('never')),
+    ])
+    assert time.monotonic() - started < 1
+    assert winner == ('site-xlsx', ('link.xlsx', 'c', None))
+    assert calls == ['broken', 'site', 'link']
+    assert latency.failures == {'known': 1}
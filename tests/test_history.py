@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from conftest import make_day, make_pair, make_schedule
+from history import ScheduleHistory, diff_day
+
+
+def week(monday, room='101'):
+    return make_schedule([
+        make_day(monday, [make_pair(1, [('Математика', 'Иванов', room), ('Физика', 'Петров', '102')])]),
+        make_day(monday + timedelta(days=1), [make_pair(2, [('Химия', 'Сидоров', '103')])]),
+    ])
+
+
+def test_records_only_changed_days_and_reads_back(tmp_path, monday):
+    path = str(tmp_path / 'history.jsonl.gz')
+    history = ScheduleHistory(path)
+    assert history.record(week(monday), 1, at=datetime(2025, 9, 1, 8)) == 2
+    assert history.record(week(monday), 1) == 0
+    assert history.record(week(monday), 2) == 0
+    assert history.record(week(monday, room='305'), 3, at=datetime(2025, 9, 1, 9)) == 1
+
+    reopened = ScheduleHistory(path)
+    versions = reopened.changes('01.09.2025')
+    assert [at for at, _ in versions] == ['2025-09-01T08:00:00', '2025-09-01T09:00:00']
+    assert diff_day(versions[0][1], versions[1][1]) == [
+        (1, 1, ['Математика', 'Иванов', '101'], ['Математика', 'Иванов', '305'])]
+    assert len(reopened.changes('02.09.2025')) == 1
+    assert reopened.stats()['versions'] == 2
+
+
+def test_removed_day_and_pair_changes():
+    old = [[1, '8:30-10:00', [['А', 'Б', '1']]], [2, '10:10-11:40', [['В', 'Г', '2']]]]
+    new = [[1, '8:40-10:10', [['А', 'Б', '1']]]]
+    assert diff_day(old, new) == [(1, 'time', '8:30-10:00', '8:40-10:10'), (2, None, old[1], None)]
+
+
+def test_old_records_are_folded_into_base(tmp_path, monday):
+    path = str(tmp_path / 'history.jsonl.gz')
+    history = ScheduleHistory(path, retention_days=10)
+    start = datetime(2025, 1, 1)
+    for version in range(30):
+        history.record(week(monday, room=str(version)), version, at=start + timedelta(days=version))
+
+    stats = history.stats()
+    assert stats['versions'] < 30
+    assert stats['since'] >= (start + timedelta(days=10)).isoformat()
+    # Последняя версия дня не потерялась при свертке
+    latest = ScheduleHistory(path).changes('01.09.2025')[-1][1]
+    assert latest[0][2][0][2] == '29'
+    # Свертка переписывает файл через уникальный временный, которого после нее не остается
+    assert [path.name for path in tmp_path.iterdir()] == ['history.jsonl.gz']
@@ -0,0 +1,51 @@
+from conftest import make_frame
+from layout import LayoutCache, detect_layout, validate_layout
+
+
+def test_detect_layout_finds_weeks_and_group_blocks():
+    df = make_frame(weeks=3, groups=('1-КРД-5', '1-КРД-6'))
+    layout = detect_layout(df)
+
+    assert layout['header_row'] == 3
+    assert layout['week_columns'] == [2, 8, 14]
+    assert layout['days_per_week'] == 6
+    assert [(block['start'], block['group']) for block in layout['blocks']] == [(40, '1-КРД-5'), (89, '1-КРД-6')]
+    assert layout['blocks'][1]['end'] == 89 + 7 * 5 + 6
+    # Без группы выбирается прежний блок с 89 строки
+    assert layout['block'] == 1
+    assert detect_layout(df, group='крд-5')['block'] == 0
+
+
+def test_detect_layout_without_week_headers():
+    df = make_frame()
+    df.iloc[3] = None
+    assert detect_layout(df) is None
+
+
+def test_layout_cache_reuses_validated_layout(tmp_path):
+    df = make_frame()
+    cache = LayoutCache(str(tmp_path / 'layouts.json'))
+    layout, cached = cache.get(df)
+    assert not cached and validate_layout(df, layout)
+
+    layout_again, cached = LayoutCache(cache.path).get(df)
+    assert cached and layout_again == layout
+
+    # Сдвинутая шапка: сохраненная раскладка не проходит проверку и ищется заново
+    moved = make_frame()
+    moved.iloc[4], moved.iloc[3] = moved.iloc[3].copy(), None
+    assert not validate_layout(moved, layout)
+
+
+def test_layout_cache_keeps_newest_entries(tmp_path):
+    cache = LayoutCache(str(tmp_path / 'layouts.json'), max_entries=2)
+    frames = [make_frame(weeks=weeks) for weeks in (1, 2, 3)]
+    for df in frames:
+        assert not cache.get(df)[1]
+
+    reopened = LayoutCache(cache.path, max_entries=2)
+    assert len(reopened._load()) == 2
+    assert not reopened.get(frames[0])[1]
+    assert reopened.get(frames[2])[1]
+    # Рядом с кэшем не остается временных файлов
+    assert [path.name for path in tmp_path.iterdir()] == ['layouts.json']
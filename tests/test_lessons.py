@@ -0,0 +1,28 @@
+from lessons import StringTable, compile_pairs, day_dict
+
+
+def test_compile_pairs_interns_strings():
+    strings = StringTable()
+    raw = [{'pair': 1, 'time': '8:30-10:00', 'minutes': 510,
+            'lessons': [{'subject': ''.join(['Мате', 'матика']), 'teacher': 'Иванов', 'room': '101'},
+                        {'subject': None, 'teacher': None, 'room': None}]}]
+    first = compile_pairs(raw, strings)
+    second = compile_pairs([dict(raw[0], lessons=[{'subject': 'Математика', 'teacher': 'Иванов', 'room': '101'}])],
+                           strings)
+
+    assert first[0].lessons[0].subject is second[0].lessons[0].subject
+    assert first[0].lessons[1].astuple() == (None, None, None)
+    assert len(strings) == 4
+
+
+def test_day_dict_round_trips_pairs():
+    pairs = compile_pairs([{'pair': 2, 'time': '10:10-11:40', 'minutes': 610,
+                            'lessons': [{'subject': 'Физика', 'teacher': 'Петров', 'room': '202'}]}], StringTable())
+    day = {'day': 0, 'name': 'Понедельник', 'date': '01.09.2025', 'pairs': pairs}
+
+    assert day_dict(day) == {
+        'day': 0, 'name': 'Понедельник', 'date': '01.09.2025',
+        'pairs': [{'pair': 2, 'time': '10:10-11:40', 'minutes': 610,
+                   'lessons': [{'subject': 'Физика', 'teacher': 'Петров', 'room': '202'}]}],
+    }
+    assert pairs[0].astuple() == (2, '10:10-11:40', 610, (('Физика', 'Петров', '202'),))
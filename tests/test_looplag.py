@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from looplag import LoopLagMonitor
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+def test_blocking_call_is_counted_with_its_stack():
+    async def run():
+        monitor = LoopLagMonitor(threshold=0.05, interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        block_loop(0.3)
+        await asyncio.sleep(0.05)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(run())
+    # Поток-сторож и следующая отметка видят одну и ту же блокировку
+    assert monitor.stalls == 1
+    assert monitor.max_lag >= 0.25
+    assert any('test_looplag.py' in entry and 'block_loop' in entry for entry in monitor.last_stack)
+    metrics = monitor.metrics()
+    assert metrics['stalls'] == 1 and metrics['threshold_ms'] == 50 and metrics['last_stack'] == monitor.last_stack
+
+
+def test_idle_loop_has_no_stalls():
+    async def run():
+        monitor = LoopLagMonitor(threshold=0.2, interval=0.01)
+        monitor.start()
+        monitor.start()  # повторный запуск ничего не делает
+        await asyncio.sleep(0.1)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(run())
+    assert monitor.stalls == 0 and monitor.last_stack is None
@@ -0,0 +1,102 @@
+import asyncio
+import re
+import threading
+
+import bot as bot_module
+from bot import ScheduleBot, _utf16_len
+
+split = ScheduleBot._split_fragment
+
+
+def strip_tags(text):
+    return re.sub(r'<[^>]*>', '', text)
+
+
+def assert_balanced(chunk):
+    stack = []
+    for closing, name in re.findall(r'<(/?)(\w+)[^>]*>', chunk):
+        if closing:
+            assert stack.pop() == name, chunk
+        else:
+            stack.append(name)
+    assert not stack, chunk
+
+
+def test_split_measures_utf16_units():
+    # Эмодзи вне BMP занимает две единицы UTF-16, хотя в str это один символ
+    block = "<b>Пара 1:</b>\n" + "📚 😀😀😀\n" * 5 + "\n"
+    text = block * 6
+    limit = _utf16_len(block) + 10
+    chunks = split(text, limit)
+    assert ''.join(chunks) == text
+    assert len(chunks) == 6 and all(_utf16_len(chunk) <= limit for chunk in chunks)
+
+
+def test_split_cuts_single_huge_line():
+    text = "📚 " + "слово " * 2000 + "\n\n"
+    chunks = split(text, 500)
+    assert len(chunks) > 20
+    assert all(_utf16_len(chunk) <= 500 for chunk in chunks)
+    assert ''.join(chunks) == text
+
+
+def test_split_keeps_tags_and_entities_whole():
+    line = "<b>Пара 1: <i>" + "A&amp;B 😀 " * 300 + "</i> хвост</b>\n"
+    chunks = split(line, 200)
+    assert len(chunks) > 10
+    for chunk in chunks:
+        assert _utf16_len(chunk) <= 200
+        assert_balanced(chunk)
+        # Сущности не разрезаны
+        assert all(part.startswith('amp;') for part in chunk.split('&')[1:]), chunk
+    assert strip_tags(''.join(chunks)) == strip_tags(line)
+
+
+def test_week_pages_navigate_and_cover_the_week(load_bot, workbook, monkeypatch):
+    monkeypatch.setattr(bot_module, 'MESSAGE_LIMIT', 1000)
+    bot = load_bot(workbook)
+    pages = bot.get_week_pages('1')
+    assert len(pages) > 2
+
+    body = ''
+    for page in range(len(pages)):
+        text, count = bot.get_week_page('1', page)
+        assert count == len(pages) and _utf16_len(text) <= 1000
+        assert f"📄 Страница {page + 1} из {count}\n\n" in text
+        body += text.split("\n\n", 2)[2]
+    days = ''.join(bot.get_1krd6_schedule('1', day) + "\n" for day in range(6))
+    assert body == days
+
+    # Номер страницы вне диапазона прижимается к краям
+    assert bot.get_week_page('1', 99) == bot.get_week_page('1', len(pages) - 1)
+    assert bot.get_week_page('1', -5) == bot.get_week_page('1', 0)
+    assert bot.get_week_page('99') == ("❌ Неделя не найдена", 1)
+
+
+def test_cached_week_page_does_not_wait_for_data_lock(load_bot, workbook, monkeypatch):
+    monkeypatch.setattr(bot_module, 'MESSAGE_LIMIT', 1000)
+    bot = load_bot(workbook)
+    bot._prepare_view()
+    expected = bot.get_week_page('1', 1)
+
+    # Фоновая сборка держит блокировку данных
+    held, release = threading.Event(), threading.Event()
+
+    def compile_in_background():
+        with bot._data_lock:
+            held.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=compile_in_background)
+    worker.start()
+    held.wait()
+    result = []
+    reader = threading.Thread(target=lambda: result.append(asyncio.run(bot.rendered_week_page('1', 1))))
+    reader.start()
+    try:
+        reader.join(2)
+        assert result == [expected]
+    finally:
+        release.set()
+        worker.join()
+        reader.join()
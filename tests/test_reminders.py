@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from conftest import make_day, make_pair, make_schedule
+from reminders import SCHEDULE_TZ, ReminderScheduler, ReminderStore, day_slots, reminder_texts
+
+
+def test_reminder_texts_per_subgroup():
+    both = reminder_texts(make_pair(1, [('Математика', 'Иванов', '101'), ('Математика', 'Иванов', '101')]), lead=10)
+    assert set(both) == {0, 1, 2} and both[0] == both[1]
+    assert '📚 Математика, 101' in both[0] and 'через 10 минут' in both[0]
+
+    split = reminder_texts(make_pair(2, [('Физика', 'Петров', None), (None, None, None)]), lead=10)
+    assert set(split) == {0, 1}
+    assert '1 подгр.: Физика' in split[0]
+
+
+def test_day_slots_fire_lead_minutes_before_pair(monday):
+    day = make_day(monday, [make_pair(1, [('Математика', 'Иванов', '101')]), make_pair(2, [(None, None, None)])])
+    slots = day_slots(day, lead=10)
+    assert list(slots) == [('2025-09-01', 510)]
+    assert slots['2025-09-01', 510][0] == datetime(2025, 9, 1, 8, 20, tzinfo=SCHEDULE_TZ).timestamp()
+    assert day_slots(dict(day, date=''), lead=10) == {}
+
+
+def test_day_slots_use_schedule_timezone_not_server_clock(monkeypatch, monday):
+    monkeypatch.setattr('reminders.SCHEDULE_TZ', ZoneInfo('Asia/Bishkek'))
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    try:
+        slots = day_slots(make_day(monday, [make_pair(1, [('Математика', 'Иванов', '101')])]), lead=10)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    # 8:20 в Бишкеке (UTC+6) — 2:20 UTC при любом поясе сервера
+    assert slots['2025-09-01', 510][0] == datetime(2025, 9, 1, 2, 20, tzinfo=timezone.utc).timestamp()
+
+
+def test_store_persists_subscriptions(tmp_path):
+    path = str(tmp_path / 'reminders.json')
+    store = ReminderStore(path)
+    store.subscribe(1, 100, 0)
+    store.subscribe(1, 200, 2)
+    store.mark_fired(123.0)
+    assert store.unsubscribe(1, 200) and not store.unsubscribe(1, 200)
+
+    reopened = ReminderStore(path)
+    assert reopened.batches() == {0: [(1, 100)]}
+    assert reopened.fired == 123.0 and len(reopened) == 1
+
+
+def test_update_rebuilds_only_changed_days(tmp_path, monday):
+    scheduler = ReminderScheduler(path=str(tmp_path / 'reminders.json'), lead=10)
+    tuesday = monday + timedelta(days=1)
+    days = [make_day(monday, [make_pair(1, [('Математика', 'Иванов', '101')])]),
+            make_day(tuesday, [make_pair(2, [('Физика', 'Петров', '102')])])]
+    assert scheduler.update(make_schedule(days), 1) == 2
+    assert scheduler.update(make_schedule(days), 1) == 0
+
+    days[1] = make_day(tuesday, [make_pair(3, [('Физика', 'Петров', '102')])])
+    assert scheduler.update(make_schedule(days), 2) == 1
+    assert sorted(scheduler._slots) == [('2025-09-01', 510), ('2025-09-02', 720)]
+
+    due, next_at = scheduler._pop_due(datetime(2025, 9, 1, 9, tzinfo=SCHEDULE_TZ).timestamp())
+    assert [key for _, key, _ in due] == [('2025-09-01', 510)]
+    assert next_at == datetime(2025, 9, 2, 11, 50, tzinfo=SCHEDULE_TZ).timestamp()
+
+
+def test_send_slot_batches_by_subgroup(tmp_path):
+    class Bot:
+        id = 7
+
+        def __init__(self):
+            self.sent = []
+
+        async def send_message(self, chat_id, text, parse_mode=None):
+            self.sent.append((chat_id, text))
+
+    scheduler = ReminderScheduler(path=str(tmp_path / 'reminders.json'))
+    bot = Bot()
+    scheduler.attach(bot)
+    scheduler.store.subscribe(7, 1, 0)
+    scheduler.store.subscribe(7, 2, 1)
+    scheduler.store.subscribe(7, 3, 2)
+    scheduler.store.subscribe(8, 4, 0)  # бот не подключен
+
+    asyncio.run(scheduler._send_slot(('2025-09-01', 510), {0: 'обе', 1: 'первая'}))
+    assert sorted(bot.sent) == [(1, 'обе'), (2, 'первая')]
+    assert scheduler.sent == 2
+
+
+def test_store_is_written_outside_event_loop(tmp_path):
+    scheduler = ReminderScheduler(path=str(tmp_path / 'reminders.json'), lead=10)
+    scheduler.store.subscribe(7, 1, 0)
+    key, fire_at = ('2025-09-01', 510), datetime.now(SCHEDULE_TZ).timestamp() - 1
+    scheduler._slots[key] = (fire_at, {0: 'обе'})
+    scheduler._heap.append((fire_at, key))
+    writers = []
+    mark_fired = scheduler.store.mark_fired
+
+    def record_writer(value):
+        writers.append(threading.get_ident())
+        mark_fired(value)
+
+    scheduler.store.mark_fired = record_writer
+
+    async def run():
+        scheduler.start(lambda: None)
+        for _ in range(100):
+            if writers:
+                break
+            await asyncio.sleep(0.01)
+        scheduler.stop()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert writers and loop_thread not in writers
+    assert ReminderStore(scheduler.store.path).fired == fire_at
+
+
+def test_blocked_chat_is_unsubscribed(tmp_path):
+    from telegram.error import Forbidden
+
+    class Bot:
+        id = 7
+
+        async def send_message(self, chat_id, text, parse_mode=None):
+            if chat_id == 2:
+                raise Forbidden("Forbidden: bot was blocked by the user")
+
+    scheduler = ReminderScheduler(path=str(tmp_path / 'reminders.json'))
+    scheduler.attach(Bot())
+    scheduler.store.subscribe(7, 1, 0)
+    scheduler.store.subscribe(7, 2, 0)
+
+    asyncio.run(scheduler._send_slot(('2025-09-01', 510), {0: 'обе'}))
+    assert scheduler.sent == 1 and scheduler.failed == 1
+    assert ReminderStore(scheduler.store.path).batches() == {0: [(7, 1)]}
+
+
+def test_state_dir_is_created_on_first_write(tmp_path, monkeypatch):
+    from history import ScheduleHistory
+
+    state_dir = tmp_path / 'state'
+    monkeypatch.setattr('state.STATE_DIR', str(state_dir))
+    for env in ('REMINDERS_PATH', 'HISTORY_PATH'):
+        monkeypatch.delenv(env, raising=False)
+
+    scheduler = ReminderScheduler()
+    history = ScheduleHistory()
+    assert not state_dir.exists() and len(scheduler.store) == 0 and history.stats()['versions'] == 0
+
+    scheduler.store.subscribe(7, 1, 0)
+    assert sorted(path.name for path in state_dir.iterdir()) == ['reminders.json']
@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+
+from conftest import make_day, make_frame, make_pair, make_schedule, write_workbook
+from rooms import RoomOccupancy, parse_query, room_names
+
+
+def test_room_names_split_and_strip_prefixes():
+    assert room_names('ауд. 101/102') == ['101', '102']
+    assert room_names('Каб 5 и спортзал') == ['5', 'спортзал']
+    assert room_names(None) == []
+    assert room_names('nan') == []
+
+
+def test_parse_query():
+    today = date(2025, 9, 3)
+    assert parse_query([], today) == (today, None)
+    assert parse_query(['завтра', '2-3'], today) == (date(2025, 9, 4), [2, 3])
+    assert parse_query(['05.09', '4'], today) == (date(2025, 9, 5), [4])
+    assert parse_query(['5.9.25'], today) == (date(2025, 9, 5), None)
+    with pytest.raises(ValueError):
+        parse_query(['31.02'], today)
+    with pytest.raises(ValueError):
+        parse_query(['утром'], today)
+
+
+def test_free_rooms_across_schedules(monday):
+    own = make_schedule([make_day(monday, [
+        make_pair(1, [('Математика', 'Иванов', 'ауд. 101'), ('Физика', 'Петров', '102')]),
+        make_pair(2, [('Химия', 'Сидоров', '103')]),
+    ])])
+    other = make_schedule([make_day(monday, [make_pair(2, [('История', 'Орлов', '101')])])])
+    occupancy = RoomOccupancy({'1-КРД-6': own, '1-КРД-5': other})
+
+    assert occupancy.dates == {monday}
+    assert occupancy.free(monday, [1]) == ['103']
+    # 101 занята на второй паре другой группой
+    assert occupancy.free(monday, [2]) == ['102']
+    assert occupancy.free(monday, [1, 2]) == []
+    assert occupancy.free(monday, [5]) == ['101', '102', '103']
+    assert occupancy.time_range([1, 2]) == '8:30-11:40'
+
+
+def test_rooms_of_other_groups_are_busy(tmp_path, load_bot, monday):
+    def lesson(group, week, day, pair):
+        if (week, day) != (0, 0) or pair > 1:
+            return None
+        # 500 занимает соседняя группа на первой паре, своя группа — на второй
+        if group == '1-КРД-5':
+            return ('История', 'Орлов', 'ауд. 500') if pair == 0 else None
+        return ('Математика', 'Иванов', 'ауд. 101') if pair == 0 else ('Физика', 'Петров', 'ауд. 500')
+
+    path = write_workbook(tmp_path / 'book.xlsx', {'1 поток': make_frame(groups=('1-КРД-5', '1-КРД-6'), lesson=lesson)})
+    bot = load_bot(path)
+
+    own = bot.get_schedule_data()['weeks']['1']['days'][0]['pairs']
+    assert [lesson.room for pair in own for lesson in pair.lessons if lesson.room] == ['ауд. 101', 'ауд. 500']
+    assert set(bot.get_block_schedules()) == {'1 поток · 1-КРД-5', '1 поток · 1-КРД-6'}
+
+    occupancy = bot.get_room_occupancy()
+    assert occupancy.free(monday, [1]) == []
+    assert occupancy.free(monday, [2]) == ['101']
+    # Отпущенные DataFrame не мешают: занятость уже построена по всем блокам
+    assert bot.compact() and bot.get_room_occupancy() is occupancy
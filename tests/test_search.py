@@ -0,0 +1,44 @@
+from conftest import make_day, make_pair, make_schedule
+from search import ScheduleIndex, normalize, tokenize
+
+
+def test_normalize_folds_case_yo_and_latin_homoglyphs():
+    assert normalize('Ёлкин') == 'елкин'
+    # Латинские «a» и «o» в кириллическом слове
+    assert normalize('Мaтемaтикo') == 'математико'
+    assert normalize('Python') == 'python'
+    assert tokenize('ауд. 101/102') == ['ауд', '101', '102']
+
+
+def test_search_by_prefixes_sorted_by_date_and_time(monday):
+    index = ScheduleIndex()
+    tuesday = make_day(monday.replace(day=2), [make_pair(1, [('Физика', 'Петров П.П.', '202')])])
+    day = make_day(monday, [
+        make_pair(3, [('Математика', 'Иванов И.И.', '101')]),
+        make_pair(1, [('Математика', 'Сидоров', '103')]),
+    ])
+    assert index.update({'1 поток': make_schedule([tuesday, day])}, 1) == 2
+
+    found = index.search('матем')
+    assert [(match['date'], match['pair'].pair) for match in found] == [('01.09.2025', 1), ('01.09.2025', 3)]
+    assert [match['pair'].pair for match in index.search('мат ив')] == [3]
+    assert index.search('петр 202')[0]['name'] == 'Вторник'
+    assert index.search('химия') == []
+    assert index.search('') == []
+
+
+def test_update_rebuilds_only_changed_days(monday):
+    index = ScheduleIndex()
+    first = make_day(monday, [make_pair(1, [('Математика', 'Иванов', '101')])])
+    second = make_day(monday.replace(day=2), [make_pair(1, [('Физика', 'Петров', '202')])])
+    index.update({'1 поток': make_schedule([first, second])}, 1)
+
+    changed = make_day(monday.replace(day=2), [make_pair(1, [('Химия', 'Петров', '202')])])
+    assert index.update({'1 поток': make_schedule([first, changed])}, 2) == 1
+    assert index.search('физ') == []
+    assert len(index.search('хим')) == 1
+    # Та же версия не пересобирается
+    assert index.update({'1 поток': make_schedule([])}, 2) == 0
+    # Пропавший лист удаляет свои дни
+    assert index.update({}, 3) == 2
+    assert len(index) == 0
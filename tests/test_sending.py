@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from sending import SendScheduler, TokenBucket
+
+
+def test_token_bucket_delay(monkeypatch):
+    now = 10.0
+    bucket = TokenBucket(rate=2, burst=2)
+    bucket.updated = now
+    assert bucket.delay(now) == 0
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.5) == 0
+    assert not bucket.full(now + 0.5) and bucket.full(now + 1)
+
+
+class FakeAPI:
+    def __init__(self, failures=0):
+        self.calls = []
+        self.failures = failures
+
+    async def call(self, endpoint, chat_id, message_id, text):
+        await asyncio.sleep(0.01)
+        if self.failures:
+            self.failures -= 1
+            raise RetryAfter(0)
+        self.calls.append((endpoint, chat_id, text))
+        return text
+
+
+def request(scheduler, api, endpoint, chat_id, text, message_id=1):
+    data = {'chat_id': chat_id, 'message_id': message_id, 'text': text}
+    return scheduler.process_request(api.call, (endpoint, chat_id, message_id, text), {}, endpoint, data, None)
+
+
+def test_superseded_edits_are_coalesced():
+    async def run():
+        scheduler = SendScheduler(rate=100, chat_rate=100, chat_burst=1)
+        api = FakeAPI()
+        results = await asyncio.gather(
+            request(scheduler, api, 'sendMessage', 1, 'загрузка'),
+            *(request(scheduler, api, 'editMessageText', 1, f'правка {i}') for i in range(4)),
+        )
+        return scheduler, api, results
+
+    scheduler, api, results = asyncio.run(run())
+    # Правки, перекрытые последней, пока ждали очереди, получают ее результат
+    assert results == ['загрузка'] + ['правка 3'] * 4
+    assert [text for _, _, text in api.calls] == ['загрузка', 'правка 3']
+    assert scheduler.metrics()['coalesced'] == 3
+
+
+def test_chats_keep_order_and_retry_after_429():
+    async def run():
+        scheduler = SendScheduler(rate=100, chat_rate=100, chat_burst=5, max_retries=2)
+        api = FakeAPI(failures=1)
+        await asyncio.gather(*(request(scheduler, api, 'sendMessage', chat, f'{chat}-{i}', message_id=None)
+                               for i in range(3) for chat in (1, 2)))
+        return scheduler, api
+
+    scheduler, api = asyncio.run(run())
+    for chat in (1, 2):
+        assert [text for _, sent_chat, text in api.calls if sent_chat == chat] == [f'{chat}-{i}' for i in range(3)]
+    assert scheduler.retries == 1 and scheduler.failed == 0
+
+
+def test_gives_up_after_max_retries():
+    async def run():
+        scheduler = SendScheduler(rate=100, chat_rate=100, max_retries=1)
+        with pytest.raises(RetryAfter):
+            await request(scheduler, FakeAPI(failures=5), 'sendMessage', 1, 'x')
+        return scheduler
+
+    assert asyncio.run(run()).failed == 1
+
+
+def test_chatless_calls_wait_out_429_pause():
+    async def run():
+        scheduler = SendScheduler(rate=100, chat_rate=100)
+        scheduler._blocked_until = time.monotonic() + 0.2
+        called = []
+
+        async def answer():
+            called.append(time.monotonic())
+            return True
+
+        start = time.monotonic()
+        assert await scheduler.process_request(answer, (), {}, 'answerCallbackQuery', {'callback_query_id': '1'}, None)
+        return called[0] - start
+
+    assert asyncio.run(run()) >= 0.15
@@ -0,0 +1,152 @@
+import os
+from datetime import date
+
+import pytest
+
+from snapshot import SnapshotError, SnapshotReader, read_generation, write_snapshot
+
+
+def test_write_and_read_generations(tmp_path):
+    path = str(tmp_path / 'schedule.snap')
+    assert read_generation(path) == 0
+    reader = SnapshotReader(path, check_interval=0)
+    assert not reader.refresh() and reader.body('weeks') is None
+
+    assert write_snapshot(path, {'sheet': '1 поток'}, {'weeks': ('"1-a"', b'{"weeks":[]}'), 'x': ('"1-b"', b'xyz')}) == 1
+    assert reader.refresh()
+    assert reader.generation == 1 and reader.index['sheet'] == '1 поток'
+    etag, body = reader.body('weeks')
+    assert etag == '"1-a"' and bytes(body) == b'{"weeks":[]}'
+    assert bytes(reader.body('x')[1]) == b'xyz'
+    assert reader.body('missing') is None
+    # Без изменений файла повторное отображение не нужно
+    assert not reader.refresh()
+
+    assert write_snapshot(path, {'sheet': '2 поток'}, {'weeks': ('"2-a"', b'[]')}) == 2
+    assert reader.refresh()
+    assert reader.index['sheet'] == '2 поток' and bytes(reader.body('weeks')[1]) == b'[]'
+
+
+def test_corrupted_snapshot_is_rejected(tmp_path):
+    path = tmp_path / 'schedule.snap'
+    write_snapshot(str(path), {}, {'weeks': ('"1"', b'0123456789')})
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError):
+        SnapshotReader(str(path)).refresh(force=True)
+
+    path.write_bytes(b'garbage-garbage-garbage-garbage')
+    with pytest.raises(SnapshotError):
+        SnapshotReader(str(path)).refresh(force=True)
+
+
+def replace_with(path, data):
+    # Как и write_snapshot, подменяем файл атомарно: усечение на месте
+    # обрушило бы действующее отображение (SIGBUS)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def test_refresh_keeps_previous_generation_on_corrupt_file(tmp_path):
+    path = tmp_path / 'schedule.snap'
+    write_snapshot(str(path), {'sheet': '1 поток'}, {'weeks': ('"1"', b'[1]')})
+    reader = SnapshotReader(str(path), check_interval=0)
+    reader.refresh()
+    view = reader.body('weeks')[1]
+
+    replace_with(path, b'')
+    with pytest.raises(SnapshotError):
+        reader.refresh()
+    # Прежнее отображение и выданные из него срезы остаются в силе
+    assert reader.generation == 1 and bytes(view) == b'[1]'
+
+
+def test_mapped_body_opens_same_bytes_as_file(tmp_path):
+    path = str(tmp_path / 'schedule.snap')
+    write_snapshot(path, {}, {'a': ('"1"', b'first'), 'b': ('"2"', b'second-body')})
+    reader = SnapshotReader(path)
+    reader.refresh()
+    etag, body = reader.mapped_body('b')
+    assert etag == '"2"' and len(body) == 11
+
+    body_file = body.open()
+    assert body_file.read(6) == b'second' and body_file.read() == b'-body' and body_file.read() == b''
+    body_file.close()
+
+    # Файл заменен новым поколением: срез отдается только из отображения
+    write_snapshot(path, {}, {'b': ('"3"', b'other')})
+    assert body.open() is None and bytes(body.view) == b'second-body'
+
+
+def test_snapshot_app_serves_bodies_and_reports_state(tmp_path):
+    from api import create_snapshot_app, schedule_key
+
+    path = tmp_path / 'schedule.snap'
+    app = create_snapshot_app(str(path))
+    statuses = []
+
+    def call(url, **environ):
+        environ.update(PATH_INFO=url, QUERY_STRING='')
+        result = app(environ, lambda status, headers: statuses.append(status))
+        return statuses[-1], b''.join(result)
+
+    assert call('/health')[0].startswith('503')
+    write_snapshot(str(path), {'sheet': '1 поток', 'dates': {}, 'fallback': ['1', '1']},
+                   {schedule_key('1'): ('"1-a"', b'{"week":"1"}')})
+    assert call('/health') == ('200 OK', b'generation 1')
+
+    class FileWrapper:
+        def __init__(self, f):
+            self.f = f
+
+        def __iter__(self):
+            yield self.f.read()
+            self.f.close()
+
+    assert call('/api/schedule', **{'wsgi.file_wrapper': FileWrapper})[1] == b'{"week":"1"}'
+    assert call('/api/weeks')[0].startswith('404')
+
+    replace_with(path, b'broken')
+    status, body = call('/health')
+    assert status == '200 OK' and b'generation 1, new snapshot rejected' in body
+
+
+def test_cold_start_serves_snapshot_records_before_parsing(tmp_path, load_bot, workbook):
+    snapshot_path = str(tmp_path / 'bot.snap')
+    first = load_bot(workbook)
+    first.snapshot_path = snapshot_path
+    first.get_schedule_data()
+    assert first.publish_snapshot()
+    expected = [first.get_1krd6_schedule('1', day) for day in range(6)] + [first.get_full_week_schedule('2')]
+
+    second = load_bot(workbook)
+    second.snapshot_path = snapshot_path
+    second.data_loaded = False
+
+    def no_pandas():
+        raise AssertionError("книга разбирается на старте")
+
+    second.load_sheets = no_pandas
+    assert second.load_saved_schedule() and second.restored
+    assert [second.get_1krd6_schedule('1', day) for day in range(6)] + [second.get_full_week_schedule('2')] == expected
+    tuesday = date(2025, 9, 2)
+    assert second.view_today(second._view(), tuesday) == first.view_today(first._view(), tuesday) == ['1', '1', 1]
+    # До разбора книги соседняя группа неизвестна
+    assert list(second.get_block_schedules()) == ['1 поток']
+
+    del second.load_sheets
+    assert second.parse_restored() and not second.restored
+    assert set(second.get_block_schedules()) == {'1 поток · 1-КРД-5', '1 поток · 1-КРД-6'}
+    assert second.get_1krd6_schedule('1', 0) == expected[0] and second.df_cache is None
+
+
+def test_api_rejects_malformed_week_and_day(load_bot, workbook):
+    from api import ScheduleAPI
+
+    api = ScheduleAPI(load_bot(workbook))
+    assert api.respond('schedule', {'week': '1', 'day': '0'})[0] == 200
+    assert api.respond('schedule', {'week': '99'})[0] == 404
+    for args in ({'week': '1/2'}, {'week': '1/2/3'}, {'week': '²'}, {'week': '1', 'day': '²'}, {'week': '1', 'day': '6'}):
+        assert api.respond('schedule', args)[0] == 400, args
@@ -0,0 +1,51 @@
+from conftest import make_day, make_frame, make_pair, make_schedule, write_workbook
+from teachers import TeacherTimetable, teacher_key
+
+
+def test_teacher_key_normalizes():
+    assert teacher_key(' Иванов  И.И. ') == 'иванов и и'
+
+
+def test_update_pivots_lessons_and_reports_changes(monday):
+    day = make_day(monday, [
+        make_pair(2, [('Математика', 'Иванов И.И.', '101'), ('Физика', 'Петров', '102')]),
+        make_pair(1, [('Алгебра', 'Иванов И.И.', '103')]),
+    ])
+    timetable = TeacherTimetable()
+    changed = timetable.update({'1-КРД-6': make_schedule([day])}, 1)
+
+    assert changed == {'иванов и и', 'петров'}
+    assert timetable.find('иван') == ['иванов и и']
+    assert timetable.weeks('иванов и и') == ['1']
+    lessons = timetable.lessons('иванов и и', '1')
+    assert [(lesson['pair'], lesson['subject']) for lesson in lessons] == [(1, 'Алгебра'), (2, 'Математика')]
+    assert timetable.lessons('петров', '1')[0]['subgroup'] == 2
+
+    moved = make_day(monday, [make_pair(2, [('Математика', 'Иванов И.И.', '101'), ('Физика', 'Петров', '105')])])
+    rendered = timetable.rendered('иванов и и', '1', lambda key, week: 'текст')
+    assert rendered == 'текст'
+    assert timetable.update({'1-КРД-6': make_schedule([moved])}, 2) == {'иванов и и', 'петров'}
+    # Кэш текстов изменившихся преподавателей сброшен
+    assert timetable.rendered('иванов и и', '1', lambda key, week: 'новый') == 'новый'
+    assert timetable.update({'1-КРД-6': make_schedule([moved])}, 2) == set()
+
+
+def test_bot_timetable_covers_every_group_of_every_sheet(tmp_path, load_bot):
+    def lesson_for(teacher):
+        def lesson(group, week, day, pair):
+            if (week, day, pair) != (0, 0, 0):
+                return None
+            return (f"Предмет {group}", teacher if group == '1-КРД-5' else 'Иванов И.И.', 'ауд. 101')
+        return lesson
+
+    frames = {'1 поток': make_frame(groups=('1-КРД-5', '1-КРД-6'), lesson=lesson_for('Орлов О.О.')),
+              '2 поток': make_frame(groups=('1-КРД-5', '1-КРД-6'), lesson=lesson_for('Орлов О.О.'))}
+    bot = load_bot(write_workbook(tmp_path / 'book.xlsx', frames))
+    bot.get_schedule_data()
+
+    timetable = bot.get_teacher_timetable()
+    assert timetable.find('орлов') == ['орлов о о']
+    assert [lesson['sheet'] for lesson in timetable.lessons('орлов о о', '1')] == [
+        '1 поток · 1-КРД-5', '2 поток · 1-КРД-5']
+    assert len(timetable.lessons('иванов и и', '1')) == 2
+    assert 'Предмет 1-КРД-5' in bot.teacher_text(['Орлов'])
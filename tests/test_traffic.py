@@ -0,0 +1,75 @@
+import asyncio
+import gzip
+import threading
+from types import SimpleNamespace
+
+import traffic
+from traffic import TrafficRecorder, load_recording
+
+
+def command(text):
+    return SimpleNamespace(callback_query=None, effective_message=SimpleNamespace(text=text))
+
+
+def test_flush_from_event_loop_runs_in_executor(tmp_path, monkeypatch):
+    monkeypatch.setattr(traffic, 'FLUSH_RECORDS', 3)
+    recorder = TrafficRecorder(str(tmp_path / 'traffic.jsonl.gz'))
+    writers = []
+    flush = recorder.flush
+
+    def record_writer():
+        writers.append(threading.get_ident())
+        flush()
+
+    recorder.flush = record_writer
+
+    async def run():
+        for n in range(2):
+            recorder.record(command('/today'), n, recorder.started + n, recorder.started + n + 0.5)
+        await asyncio.sleep(0.1)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(writers) == 1 and loop_thread not in writers
+    assert [event[1] for event in load_recording(recorder.path)] == [1, 2]
+
+
+def test_record_and_replay_round_trip(tmp_path):
+    from telegram import Update
+
+    from bench import callback_update, command_update, replay_update
+
+    path = str(tmp_path / 'traffic.jsonl.gz')
+    sessions = [
+        [(command_update(1, '/start', 501), 0.0, 0.2), (callback_update(2, 'week_2', 777), 0.5, 0.6),
+         (command_update(3, '/find секретный запрос', 501), 1.0, None)],
+        [(callback_update(4, 'day_1_3', 777), 0.3, 0.4)],
+    ]
+    for updates in sessions:
+        recorder = TrafficRecorder(path)
+        for data, arrived, finished in updates:
+            update = Update.de_json(data, None)
+            recorder.record(update, update.effective_chat.id, recorder.started + arrived,
+                            None if finished is None else recorder.started + finished)
+        recorder.flush()
+
+    events = load_recording(path)
+    # Вторая сессия идет после первой, внутри сессии — по времени поступления
+    assert [round(event[0]) for event in events] == [0, 500, 1000, 1300]
+    assert [event[2:5] for event in events] == [('c', 'start', 0), ('q', 'week_2', 0), ('c', 'find', 2),
+                                                ('q', 'day_1_3', 0)]
+    assert [event[5] for event in events] == [200.0, 100.0, -1, 100.0]
+    # Чаты обезличены порядковыми номерами в пределах сессии
+    assert [event[1] for event in events] == [1, 2, 1, 1]
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        raw = f.read()
+    assert 'секретный' not in raw and '501' not in raw and '777' not in raw
+
+    # Воспроизведенное обновление описывается так же, как записанное;
+    # аргументы команды не записаны, вместо них подставляется один типовой
+    for update_id, event in enumerate(events, 1):
+        replayed = Update.de_json(replay_update(update_id, event), None)
+        kind, value, n_args = traffic.describe(replayed)
+        assert (kind, value, bool(n_args)) == (event[2], event[3], bool(event[4]))
+        assert replayed.effective_chat.id == 1000 + event[1]
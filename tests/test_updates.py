@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+from updates import SHED_ANSWER, ChatOrderedUpdateProcessor
+
+
+def make_update(chat_id, query=None):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), callback_query=query)
+
+
+class Query:
+    id = 'q'
+
+    def __init__(self):
+        self.answers = []
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+
+def test_updates_of_one_chat_run_in_order_while_chats_overlap():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_in_flight=8)
+        log, running = [], {}
+
+        async def handler(chat_id, n):
+            running[chat_id] = running.get(chat_id, 0) + 1
+            assert running[chat_id] == 1, "два обработчика одного чата одновременно"
+            log.append(('start', chat_id, n))
+            await asyncio.sleep(0.01 * (3 - n))
+            log.append(('end', chat_id, n))
+            running[chat_id] -= 1
+
+        await asyncio.gather(*(processor.process_update(make_update(chat_id, None), handler(chat_id, n))
+                               for n in range(3) for chat_id in (1, 2)))
+        return processor, log
+
+    processor, log = asyncio.run(run())
+    for chat_id in (1, 2):
+        assert [n for event, chat, n in log if chat == chat_id and event == 'start'] == [0, 1, 2]
+    # Первый обработчик второго чата начался до конца первого обработчика первого
+    assert log.index(('start', 2, 0)) < log.index(('end', 1, 0))
+    assert processor.processed == 6 and processor.running == processor.waiting == 0
+    assert not processor._chats
+
+
+def test_in_flight_limit_caps_concurrent_handlers():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_in_flight=3)
+        state = {'now': 0, 'peak': 0}
+
+        async def handler():
+            state['now'] += 1
+            state['peak'] = max(state['peak'], state['now'])
+            await asyncio.sleep(0.01)
+            state['now'] -= 1
+
+        await asyncio.gather(*(processor.process_update(make_update(chat_id), handler())
+                               for chat_id in range(20)))
+        return processor, state
+
+    processor, state = asyncio.run(run())
+    assert state['peak'] == 3
+    assert processor.processed == 20 and processor.metrics()['max_waiting'] >= 17
+
+
+def test_overflowing_chat_is_shed_and_button_answered():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_chat_queue=2)
+        release = asyncio.Event()
+        calls = []
+
+        async def handler(n):
+            calls.append(n)
+            await release.wait()
+
+        tasks = [asyncio.create_task(processor.process_update(make_update(1), handler(n))) for n in range(2)]
+        await asyncio.sleep(0)
+        query = Query()
+        await processor.process_update(make_update(1, query), handler(2))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return processor, calls, query
+
+    processor, calls, query = asyncio.run(run())
+    assert calls == [0, 1] and processor.shed == 1
+    assert query.answers == [SHED_ANSWER]
@@ -0,0 +1,30 @@
+import asyncio
+
+from weekimage import WeekImages
+
+
+def test_file_ids_persist_and_upload_locks_are_dropped(tmp_path):
+    path = str(tmp_path / 'week_images.json')
+    images = WeekImages(path)
+
+    async def upload(key):
+        async with images.lock(7, key):
+            assert len(images._locks) == 1
+            images.remember(7, key, f"file-{key}")
+
+    for key in ('a', 'b', 'c'):
+        asyncio.run(upload(key))
+    # Замки отпускаются вместе с загрузкой и не копятся по ключам
+    assert len(images._locks) == 0
+
+    reopened = WeekImages(path)
+    assert reopened.file_id(7, 'b') == 'file-b'
+    assert reopened.metrics()['file_ids'] == 3
+
+
+def test_disable_falls_back_to_text(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEEK_IMAGES', '1')
+    images = WeekImages(str(tmp_path / 'week_images.json'))
+    images.enabled = True
+    images.disable(ImportError("No module named 'PIL'"))
+    assert not images.enabled and images.metrics()['enabled'] is False
@@ -0,0 +1,132 @@
+"""Запись трафика обновлений для воспроизведения в бенчмарке.
+
+Включается переменной TRAFFIC_RECORD=<файл>. Для каждого обновления
+пишется только обезличенная метаинформация: смещение от начала записи,
+порядковый номер чата вместо его id, вид обновления (команда, кнопка,
+сообщение), имя команды или данные кнопки, число аргументов команды (сами
+аргументы — текст пользователя — не пишутся) и время от поступления до
+конца обработки. Записи копятся в памяти и дописываются в файл gzip-блоками
+строк JSON; bench.py replay воспроизводит такую запись.
+"""
+import os
+import gzip
+import json
+import time
+import atexit
+import asyncio
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+FLUSH_RECORDS = 256
+FLUSH_SECONDS = 10.0
+
+_recorder = None
+
+
+def describe(update):
+    """(вид, значение, число аргументов) обновления: 'c' — команда, 'q' — кнопка, 'm' — другое"""
+    query = getattr(update, 'callback_query', None)
+    if query is not None:
+        return 'q', query.data or '', 0
+    message = getattr(update, 'effective_message', None)
+    text = getattr(message, 'text', None) or ''
+    if text.startswith('/'):
+        command, *args = text.split()
+        return 'c', command[1:].split('@')[0], len(args)
+    return 'm', '', 0
+
+
+class TrafficRecorder:
+    """Обезличенный журнал обновлений и времени их обработки"""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.monotonic()
+        self.recorded = 0
+        self._chats = {}  # id чата -> порядковый номер
+        self._buffer = [json.dumps({'format': FORMAT_VERSION,
+                                    'recorded': datetime.now().isoformat(timespec='seconds')})]
+        self._flushed = self.started
+        self._flush_pending = False
+        self._lock = threading.Lock()
+        # Блоки дописываются по одному и в порядке снятия с буфера
+        self._write_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, update, chat_id, arrived, finished):
+        """Записать обновление: arrived и finished — time.monotonic() поступления и конца обработки.
+
+        Отброшенное обновление записывается с временем обработки -1.
+        """
+        kind, value, n_args = describe(update)
+        with self._lock:
+            chat = self._chats.setdefault(chat_id, len(self._chats) + 1) if chat_id is not None else 0
+            self._buffer.append(json.dumps([
+                round((arrived - self.started) * 1000, 1), chat, kind, value, n_args,
+                round((finished - arrived) * 1000, 1) if finished is not None else -1,
+            ], ensure_ascii=False, separators=(',', ':')))
+            self.recorded += 1
+            due = not self._flush_pending and (
+                len(self._buffer) >= FLUSH_RECORDS or arrived - self._flushed >= FLUSH_SECONDS)
+            if due:
+                self._flush_pending = True
+        if not due:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+        else:
+            # record вызывается из цикла событий: сжатие и запись — в пуле потоков
+            loop.run_in_executor(None, self.flush)
+
+    def flush(self):
+        """Дописать накопленное одним gzip-блоком"""
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                self._flushed = time.monotonic()
+                self._flush_pending = False
+            if not lines:
+                return
+            try:
+                with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось записать трафик: {e}")
+
+
+def get_recorder():
+    """Общий для процесса журнал из TRAFFIC_RECORD или None, если запись выключена"""
+    global _recorder
+    path = os.getenv('TRAFFIC_RECORD')
+    if _recorder is None and path:
+        _recorder = TrafficRecorder(path)
+        logger.info(f"📼 Запись трафика в {path}")
+    return _recorder
+
+
+def load_recording(path):
+    """События записи: [(смещение мс, чат, вид, значение, аргументов, обработка мс)] по порядку поступления"""
+    sessions = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if isinstance(record, dict):
+                # Заголовок: дальше события следующего запуска бота со своим началом отсчета
+                sessions.append([])
+            elif sessions:
+                sessions[-1].append(tuple(record))
+
+    events, base = [], 0.0
+    for session in sessions:
+        # Блоки дописываются по мере завершения обработки, а не поступления
+        session.sort(key=lambda event: event[0])
+        events += [(offset + base, *rest) for offset, *rest in session]
+        if events:
+            base = events[-1][0]
+    return events
@@ -0,0 +1,149 @@
+"""Параллельная обработка обновлений с порядком внутри чата.
+
+Обновления разных чатов обрабатываются одновременно, обновления одного чата —
+строго по очереди. Одновременно выполняется не больше max_in_flight
+обработчиков; если пользователь накопил в очереди max_chat_queue обновлений
+(жмет кнопки, пока бот отвечает), следующие отбрасываются, а не копятся;
+на отброшенные нажатия кнопок бот отвечает, чтобы у пользователя не висели часики.
+"""
+import time
+import asyncio
+import logging
+import weakref
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Все процессоры процесса: их метрики отдает /metrics
+PROCESSORS = weakref.WeakSet()
+
+SHED_ANSWER = "⏳ Предыдущий запрос еще выполняется, нажмите чуть позже"
+
+
+def _chat_id(update):
+    """Чат обновления; None, если обновление не относится к чату"""
+    chat = getattr(update, 'effective_chat', None)
+    return chat.id if chat is not None else None
+
+
+def _percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Обработчик обновлений: параллельно между чатами, по порядку внутри чата"""
+
+    def __init__(self, max_in_flight=32, max_chat_queue=8, max_pending=1024, name='bot', recorder=None):
+        # Семафор базового класса берется до очереди чата, поэтому он только
+        # ограничивает общее число ожидающих задач, а не выполнение
+        super().__init__(max_pending)
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_chat_queue = max_chat_queue
+        # Журнал трафика для воспроизведения (traffic.TrafficRecorder) или None
+        self.recorder = recorder
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._chats = {}  # чат -> [блокировка, обновлений в очереди и в работе]
+        self.running = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.processed = 0
+        self.shed = 0
+        self._waits = deque(maxlen=1024)  # ожидание в очереди, с
+        self._warned = 0.0
+        self._answers = set()  # ответы на отброшенные нажатия кнопок
+        PROCESSORS.add(self)
+
+    async def do_process_update(self, update, coroutine):
+        chat_id = _chat_id(update)
+        arrived = time.monotonic()
+        chat = self._chats.get(chat_id) if chat_id is not None else None
+        if chat is None:
+            chat = [asyncio.Lock(), 0]
+            if chat_id is not None:
+                self._chats[chat_id] = chat
+        elif chat[1] >= self.max_chat_queue:
+            coroutine.close()
+            self.shed += 1
+            if self.recorder is not None:
+                self.recorder.record(update, chat_id, arrived, None)
+            logger.warning(f"🚦 Чат {chat_id}: в очереди {chat[1]} обновлений, новое отброшено")
+            query = getattr(update, 'callback_query', None)
+            if query is not None:
+                # Ответ — в фоне: отбрасывание не должно ждать Bot API
+                task = asyncio.create_task(self._answer_shed(query))
+                self._answers.add(task)
+                task.add_done_callback(self._answers.discard)
+            return
+
+        chat[1] += 1
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        self._report_pressure()
+        enqueued = time.perf_counter()
+        started = False
+        try:
+            async with chat[0]:
+                async with self._in_flight:
+                    self.waiting -= 1
+                    self.running += 1
+                    self._waits.append(time.perf_counter() - enqueued)
+                    started = True
+                    try:
+                        await coroutine
+                    finally:
+                        self.running -= 1
+                        self.processed += 1
+        finally:
+            if not started:
+                # Отменено в очереди: обработчик так и не запускался
+                self.waiting -= 1
+                coroutine.close()
+            chat[1] -= 1
+            if chat[1] == 0 and chat_id is not None:
+                self._chats.pop(chat_id, None)
+            if started and self.recorder is not None:
+                self.recorder.record(update, chat_id, arrived, time.monotonic())
+
+    async def _answer_shed(self, query):
+        """Снять часики с отброшенного нажатия кнопки"""
+        try:
+            await query.answer(SHED_ANSWER)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось ответить на отброшенное нажатие {query.id}: {e}")
+
+    def _report_pressure(self):
+        """Раз в 10 с предупредить, если обновлений ждет больше, чем выполняется"""
+        if self.waiting <= self.max_in_flight:
+            return
+        now = time.monotonic()
+        if now - self._warned >= 10:
+            self._warned = now
+            logger.warning(f"📈 {self.name}: ждут {self.waiting} обновлений, выполняется {self.running}, "
+                           f"чатов в очереди {len(self._chats)}")
+
+    def metrics(self):
+        """Глубина очереди и ожидание обновлений"""
+        waits = list(self._waits)
+        return {
+            'name': self.name,
+            'running': self.running,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'chats': len(self._chats),
+            'processed': self.processed,
+            'shed': self.shed,
+            'wait_p50_ms': round(_percentile(waits, 0.5) * 1000, 2),
+            'wait_p95_ms': round(_percentile(waits, 0.95) * 1000, 2),
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
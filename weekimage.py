@@ -0,0 +1,268 @@
+"""Неделя расписания картинкой.
+
+Сетка недели (дни × пары) рисуется Pillow в пуле процессов один раз на
+содержимое недели, загружается в Telegram один раз на бота, а полученный
+file_id запоминается: дальше sendPhoto отправляет картинку по ссылке без
+загрузки. Ключ картинки — хеш данных недели, поэтому file_id остаются в
+силе между перезапусками и новыми версиями книги, пока неделя не меняется.
+
+Pillow — необязательная зависимость: без нее кнопки картинки нет, а если
+рисование все же не удалось импортировать, неделя отправляется текстом.
+"""
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import weakref
+import threading
+import importlib.util
+from collections import OrderedDict
+
+from history import day_record
+from state import atomic_write, state_path
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении оформления: старые file_id перестают подходить
+RENDER_VERSION = 1
+MAX_FILE_IDS = 1000
+MAX_RENDERED = 16
+
+FONT = os.getenv('WEEK_IMAGE_FONT', 'DejaVuSans.ttf')
+BOLD_FONT = os.getenv('WEEK_IMAGE_BOLD_FONT', 'DejaVuSans-Bold.ttf')
+LABEL_WIDTH = 120
+DAY_WIDTH = 250
+PADDING = 8
+FONT_SIZE = 15
+LINE_HEIGHT = FONT_SIZE + 5
+
+_pool = None
+
+
+def week_grid(title, week):
+    """Неделя скомпилированного расписания -> простые данные для рисования (передаются в процесс)"""
+    return {
+        'title': title,
+        'week': week['week'],
+        'type': week['type'],
+        'description': week['description'],
+        'days': [[day['name'], day['date'], day_record(day)] for day in week['days']],
+    }
+
+
+def grid_key(grid):
+    """Ключ картинки: хеш данных недели и версии оформления"""
+    raw = json.dumps([RENDER_VERSION, grid], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _font(name, size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _wrap(draw, text, font, width):
+    """Разбить текст на строки не шире width пикселей"""
+    lines, line = [], ''
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if line and draw.textlength(candidate, font=font) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _cell_lines(lessons):
+    """Строки ячейки: занятие обеих подгрупп одним блоком или по подгруппам"""
+    filled = [(subgroup, lesson) for subgroup, lesson in enumerate(lessons, 1) if lesson[0]]
+    if len(filled) == 2 and lessons[0] == lessons[1]:
+        filled = filled[:1]
+        prefix = lambda subgroup: ''
+    else:
+        prefix = lambda subgroup: f"{subgroup}: " if len(lessons) > 1 else ''
+    blocks = []
+    for subgroup, (subject, teacher, room) in filled:
+        blocks.append((True, f"{prefix(subgroup)}{subject}"))
+        details = ', '.join(value for value in (teacher, room) if value)
+        if details:
+            blocks.append((False, details))
+    return blocks
+
+
+def render_week(grid):
+    """PNG сетки недели (выполняется в процессе пула)"""
+    import io
+    from PIL import Image, ImageDraw
+
+    font = _font(FONT, FONT_SIZE)
+    bold = _font(BOLD_FONT, FONT_SIZE)
+    title_font = _font(BOLD_FONT, FONT_SIZE + 5)
+    days = grid['days']
+    width = LABEL_WIDTH + DAY_WIDTH * len(days)
+    measure = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+    # Строки сетки — номера пар всех дней недели, время — из первого дня с этой парой
+    times = {}
+    for _, _, pairs in days:
+        for number, time, _ in pairs:
+            times.setdefault(number, time)
+    cells = {}
+    for column, (_, _, pairs) in enumerate(days):
+        for number, _, lessons in pairs:
+            if (number, column) in cells:
+                continue
+            cells[number, column] = [
+                (is_title, line)
+                for is_title, text in _cell_lines(lessons)
+                for line in _wrap(measure, text, bold if is_title else font, DAY_WIDTH - 2 * PADDING)
+            ]
+    rows = sorted(times)
+    heights = [
+        max([len(cells.get((number, column), ())) for column in range(len(days))] + [2]) * LINE_HEIGHT + 2 * PADDING
+        for number in rows
+    ]
+    header_height = 2 * LINE_HEIGHT + 2 * PADDING
+    top = 2 * LINE_HEIGHT + 3 * PADDING
+    height = top + header_height + sum(heights) + PADDING
+
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.text((PADDING, PADDING), f"{grid['title']} · неделя {grid['week']} ({grid['type']})",
+              font=title_font, fill='black')
+    draw.text((PADDING, PADDING + LINE_HEIGHT + 6), grid['description'] or '', font=font, fill='#555555')
+
+    y = top
+    draw.rectangle((0, y, width, y + header_height), fill='#e8eef7')
+    for column, (name, date, _) in enumerate(days):
+        x = LABEL_WIDTH + column * DAY_WIDTH + PADDING
+        draw.text((x, y + PADDING), name, font=bold, fill='black')
+        draw.text((x, y + PADDING + LINE_HEIGHT), date or '', font=font, fill='#555555')
+    y += header_height
+
+    for row, (number, row_height) in enumerate(zip(rows, heights)):
+        if row % 2:
+            draw.rectangle((0, y, width, y + row_height), fill='#f7f7f7')
+        draw.text((PADDING, y + PADDING), f"{number} пара", font=bold, fill='black')
+        draw.text((PADDING, y + PADDING + LINE_HEIGHT), times[number] or '', font=font, fill='#555555')
+        for column in range(len(days)):
+            line_y = y + PADDING
+            for is_title, line in cells.get((number, column), ()):
+                draw.text((LABEL_WIDTH + column * DAY_WIDTH + PADDING, line_y), line,
+                          font=bold if is_title else font, fill='black' if is_title else '#444444')
+                line_y += LINE_HEIGHT
+        y += row_height
+        draw.line((0, y, width, y), fill='#cccccc')
+
+    for column in range(len(days) + 1):
+        x = LABEL_WIDTH + column * DAY_WIDTH
+        draw.line((x, top, x, y), fill='#cccccc')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _get_pool(workers):
+    """Пул процессов рисования; Pillow импортируется только в нем"""
+    global _pool
+    if _pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+    return _pool
+
+
+class WeekImages:
+    """Картинки недель: рисование в пуле, file_id по ботам в JSON-файле"""
+
+    def __init__(self, path=None):
+        self.path = path or state_path('WEEK_IMAGE_CACHE', 'week_images.json')
+        self.enabled = os.getenv('WEEK_IMAGES', '0') == '1' and importlib.util.find_spec('PIL') is not None
+        self.workers = int(os.getenv('WEEK_IMAGE_WORKERS', 1))
+        self.rendered = 0
+        self.uploaded = 0
+        self.reused = 0
+        self._file_ids = None  # "бот:ключ" -> file_id
+        self._png = OrderedDict()  # ключ -> PNG, пока не загружен всеми ботами
+        self._rendering = {}  # ключ -> future рисования
+        # "бот:ключ" -> asyncio.Lock; замок живет, пока его держат или ждут
+        self._locks = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._file_ids is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._file_ids = OrderedDict(json.load(f))
+            except (OSError, ValueError):
+                self._file_ids = OrderedDict()
+        return self._file_ids
+
+    def file_id(self, bot_id, key):
+        with self._lock:
+            return self._load().get(f"{bot_id}:{key}")
+
+    def remember(self, bot_id, key, file_id):
+        with self._lock:
+            file_ids = self._load()
+            file_ids[f"{bot_id}:{key}"] = file_id
+            file_ids.move_to_end(f"{bot_id}:{key}")
+            while len(file_ids) > MAX_FILE_IDS:
+                file_ids.popitem(last=False)
+            try:
+                with atomic_write(self.path, encoding='utf-8') as f:
+                    json.dump(file_ids, f)
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось сохранить file_id картинок: {e}")
+
+    def forget(self, bot_id, key):
+        """Telegram не принял file_id: в следующий раз картинка загрузится заново"""
+        with self._lock:
+            self._load().pop(f"{bot_id}:{key}", None)
+
+    def lock(self, bot_id, key):
+        """Одна загрузка картинки на бота: остальные запросы ждут ее file_id"""
+        return self._locks.setdefault(f"{bot_id}:{key}", asyncio.Lock())
+
+    async def render(self, grid, key):
+        """PNG недели: из памяти или нарисованный в пуле (одновременные запросы ждут одно рисование)"""
+        png = self._png.get(key)
+        if png is not None:
+            return png
+        future = self._rendering.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._rendering[key] = loop.run_in_executor(_get_pool(self.workers), render_week, grid)
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+            self.rendered += 1
+        png = await asyncio.shield(future)
+        self._png[key] = png
+        while len(self._png) > MAX_RENDERED:
+            self._png.popitem(last=False)
+        return png
+
+    def disable(self, error):
+        """Рисовать нечем (нет Pillow в пуле): дальше недели только текстом"""
+        if self.enabled:
+            self.enabled = False
+            logger.warning(f"⚠️ Картинки недель выключены: {error}")
+
+    def metrics(self):
+        with self._lock:
+            file_ids = len(self._load())
+        return {
+            'enabled': self.enabled,
+            'file_ids': file_ids,
+            'rendered': self.rendered,
+            'uploaded': self.uploaded,
+            'reused': self.reused,
+        }